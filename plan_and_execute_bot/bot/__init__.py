@@ -1,2 +1,9 @@
 """Plan-and-Execute chatbot package."""
-from .graph import build_chatbot_graph
+
+
+def __getattr__(name):
+    # Perezoso (PEP 562): importar `bot` no carga el grafo ni los LLMs hasta usarlos
+    if name == "build_chatbot_graph":
+        from .graph import build_chatbot_graph
+        return build_chatbot_graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,36 @@
-"""Ejecutores especializados para diferentes tipos de tareas."""
-
-from .specialized_executor import execute_specialized_task, execute_multiple_tasks
-from .weather_executor import execute_weather_task
-from .tasks_executor import execute_tasks_task
-from .drive_executor import execute_drive_task
-from .gmail_executor import execute_gmail_task
-from .calendar_executor import execute_calendar_task
-from .router import route_task
-
-__all__ = [
-    "execute_specialized_task",
-    "execute_multiple_tasks", 
-    "execute_weather_task",
-    "execute_tasks_task",
-    "execute_drive_task",
-    "execute_gmail_task",
-    "execute_calendar_task",
-    "route_task"
-] 
\ No newline at end of file
+"""Ejecutores especializados para diferentes tipos de tareas.
+
+Los atributos se resuelven de forma perezosa (PEP 562): importar el paquete no construye
+ningún agente ni importa las herramientas de Google hasta que se usan.
+"""
+
+import importlib
+
+# Nombre exportado -> submódulo que lo define
+_EXPORTS = {
+    "execute_specialized_task": "specialized_executor",
+    "execute_multiple_tasks": "specialized_executor",
+    "warm_up_executors": "specialized_executor",
+    "EXECUTOR_MAP": "specialized_executor",
+    "execute_weather_task": "weather_executor",
+    "execute_tasks_task": "tasks_executor",
+    "execute_drive_task": "drive_executor",
+    "execute_gmail_task": "gmail_executor",
+    "execute_calendar_task": "calendar_executor",
+    "route_task": "router",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -9,7 +9,8 @@ from ..tools.calendar import (
     create_event,
     update_event,
     delete_event,
-    search_events
+    search_events,
+    search_all_calendars
 )
 
 # Configuración de fecha actual
@@ -21,6 +22,7 @@ CALENDAR_TOOLS = [
     list_calendars,
     list_events,
     search_events,
+    search_all_calendars,
     get_event,
     create_event,
     update_event,
@@ -60,14 +62,22 @@ HERRAMIENTAS DISPONIBLES Y CÓMO USARLAS:
    - Retorna: lista de eventos que coinciden con la búsqueda
    - **IMPORTANTE**: Si el usuario NO especifica fechas, usa los valores por defecto para buscar en un rango AMPLIO.
 
-4. **get_event(calendar_id, event_id)**: Obtiene detalles completos de un evento
+4. **search_all_calendars(query=None, time_min=None, time_max=None, days_back=30, days_forward=365)**: Busca o lista eventos en TODOS los calendarios a la vez.
+   - Parámetros:
+     - query (string, opcional) - término de búsqueda
+     - time_min / time_max (string, opcional) - rango en formato ISO; si no se indican se usan days_back/days_forward
+   - Ejemplo: search_all_calendars('Jack Spolski')
+   - Retorna: eventos de todos los calendarios ordenados por fecha, indicando el calendario de cada uno
+   - **IMPORTANTE**: Si el usuario pide buscar "en todos mis calendarios", usa esta herramienta UNA sola vez en lugar de llamar a search_events o list_events por cada calendario.
+
+5. **get_event(calendar_id, event_id)**: Obtiene detalles completos de un evento
    - Parámetros:
      - calendar_id (string, obligatorio) - ID del calendario
      - event_id (string, obligatorio) - ID del evento
    - Ejemplo: get_event("primary", "abc123")
    - Retorna: título, descripción, fecha inicio, fecha fin, asistentes, ubicación
 
-5. **create_event(calendar_id, summary, start, end=None, description=None, location=None, attendees=None)**: Crea un evento
+6. **create_event(calendar_id, summary, start, end=None, description=None, location=None, attendees=None)**: Crea un evento
    - Parámetros:
      - calendar_id (string, obligatorio) - ID del calendario
      - summary (string, obligatorio) - título del evento
@@ -79,7 +89,7 @@ HERRAMIENTAS DISPONIBLES Y CÓMO USARLAS:
    - Ejemplo: create_event("primary", "Reunión equipo", "2024-12-20T10:00:00Z", "2024-12-20T11:00:00Z")
    - Retorna: confirmación de creación con ID del evento
 
-6. **update_event(calendar_id, event_id, summary=None, start=None, end=None, description=None, location=None, attendees=None)**: Modifica un evento
+7. **update_event(calendar_id, event_id, summary=None, start=None, end=None, description=None, location=None, attendees=None)**: Modifica un evento
    - Parámetros:
      - calendar_id (string, obligatorio) - ID del calendario
      - event_id (string, obligatorio) - ID del evento (DEBE ser el ID real del evento)
@@ -94,7 +104,7 @@ HERRAMIENTAS DISPONIBLES Y CÓMO USARLAS:
    - IMPORTANTE: Solo usa esta herramienta cuando tengas el event_id real del evento que quieres modificar
    - **EJEMPLO COMPLETO**: Si encuentras "Reunión X" con ID "6n22fb7ju574g80tkanjnaaoh5", ejecuta: update_event("primary", "6n22fb7ju574g80tkanjnaaoh5", summary="Kickoff X")
 
-7. **delete_event(calendar_id, event_id)**: Elimina un evento
+8. **delete_event(calendar_id, event_id)**: Elimina un evento
    - Parámetros:
      - calendar_id (string, obligatorio) - ID del calendario
      - event_id (string, obligatorio) - ID del evento
@@ -163,17 +173,24 @@ FORMATO DE RESPUESTA:
 """
 
 # Configurar el agente especializado
-calendar_executor = initialize_agent(
-    CALENDAR_TOOLS,
-    LLM_EXECUTOR,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    verbose=True,
-    agent_kwargs={"system_message": CALENDAR_EXECUTOR_PREFIX},
-    max_iterations=5,
-    max_execution_time=30,
-    early_stopping_method="generate",
-    handle_parsing_errors=True,
-)
+_calendar_executor = None
+
+def get_calendar_executor():
+    """Construye el agente de calendario la primera vez que se usa y lo reutiliza."""
+    global _calendar_executor
+    if _calendar_executor is None:
+        _calendar_executor = initialize_agent(
+            CALENDAR_TOOLS,
+            LLM_EXECUTOR,
+            agent=AgentType.OPENAI_FUNCTIONS,
+            verbose=True,
+            agent_kwargs={"system_message": CALENDAR_EXECUTOR_PREFIX},
+            max_iterations=5,
+            max_execution_time=30,
+            early_stopping_method="generate",
+            handle_parsing_errors=True,
+        )
+    return _calendar_executor
 
 async def execute_calendar_task(task: str) -> str:
     """
@@ -189,7 +206,7 @@ async def execute_calendar_task(task: str) -> str:
     print(f"📅 [CALENDAR_EXECUTOR] Iniciando agente de LangChain...")
     
     try:
-        response = await calendar_executor.ainvoke({"input": task})
+        response = await get_calendar_executor().ainvoke({"input": task})
         result = response["output"]
         
         print(f"📅 [CALENDAR_EXECUTOR] Respuesta completa del agente: {result}")
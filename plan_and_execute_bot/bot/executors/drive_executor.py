@@ -7,8 +7,13 @@ from ..tools.drive import (
     get_file_metadata,
     download_file,
     upload_file,
+    upload_local_file,
+    upload_local_files,
     move_file,
-    delete_file
+    delete_file,
+    find_files,
+    resolve_drive_path,
+    search_drive_content
 )
 
 # Fecha actual (BA)
@@ -16,10 +21,15 @@ BA = timezone(timedelta(hours=-3))
 TODAY = datetime.now(BA).strftime("%-d de %B de %Y")
 
 DRIVE_TOOLS = [
+    find_files,
+    resolve_drive_path,
+    search_drive_content,
     search_files,
     get_file_metadata,
     download_file,
     upload_file,
+    upload_local_file,
+    upload_local_files,
     move_file,
     delete_file
 ]
@@ -32,48 +42,65 @@ Ignora cualquier mención anterior al día de hoy en la conversación; la fecha
 
 HERRAMIENTAS DISPONIBLES Y CÓMO USARLAS:
 
-1. **search_files(query, max_results=10)**: Busca archivos en Google Drive
+1. **find_files(query, max_results=10)** y **resolve_drive_path(path_or_id)**: Índice local de Drive (respuesta instantánea)
+   - find_files busca por nombre o comienzo del nombre y devuelve ID y ruta de carpetas
+   - resolve_drive_path convierte '/Trabajo/Informes/q1.pdf' en su ID (o un ID en su ruta)
+   - Ejemplo: find_files("presupuesto"), resolve_drive_path("/Trabajo/Informes")
+   - **PREFERENCIA**: Usa find_files para buscar por nombre
+
+2. **search_drive_content(query, max_results=5)**: Busca documentos por su contenido en un índice local (ranking BM25)
+   - Ejemplo: search_drive_content("presupuesto reunión marketing")
+   - Retorna: documentos más relevantes con ID, ruta y un extracto
+   - **PREFERENCIA**: Para "el documento donde hablamos de X" usa esta herramienta en lugar de search_files
+
+3. **search_files(query, max_results=10)**: Busca archivos en Google Drive
    - Parámetros:
      - query (string, obligatorio) - término de búsqueda (nombre, tipo, contenido)
      - max_results (integer, opcional) - número máximo de resultados
    - Ejemplo: search_files("documento proyecto", max_results=5)
    - Retorna: lista de archivos con nombre, ID, tipo, fecha de modificación
 
-2. **get_file_metadata(file_id)**: Obtiene información detallada de un archivo
+4. **get_file_metadata(file_id)**: Obtiene información detallada de un archivo
    - Parámetro: file_id (string, obligatorio) - ID del archivo
    - Ejemplo: get_file_metadata("1abc123def456")
    - Retorna: nombre, tipo, tamaño, fecha creación, permisos, propietario
 
-3. **download_file(file_id, destination_path=None)**: Descarga un archivo
+5. **download_file(file_id, export_mime_type=None, destination_path=None)**: Descarga un archivo a disco
    - Parámetros:
      - file_id (string, obligatorio) - ID del archivo
-     - destination_path (string, opcional) - ruta de destino
-   - Ejemplo: download_file("1abc123def456", "/tmp/documento.pdf")
-   - Retorna: confirmación de descarga y ruta del archivo
+     - export_mime_type (string, opcional) - tipo MIME de exportación para documentos de Google (por defecto text/plain)
+     - destination_path (string, opcional) - ruta relativa dentro de la carpeta de descargas
+   - Ejemplo: download_file("1abc123def456", destination_path="informes/documento.pdf")
+   - Retorna: confirmación de descarga, ruta y tamaño del archivo
+   - Si una descarga se interrumpe, volver a llamarla con los mismos parámetros la reanuda
 
-4. **upload_file(file_path, parent_folder_id=None, file_name=None)**: Sube un archivo
+6. **upload_local_file(file_path, parent_folder_id=None, file_name=None, mime_type=None)**: Sube un archivo que ya está en disco
    - Parámetros:
-     - file_path (string, obligatorio) - ruta del archivo local
+     - file_path (string, obligatorio) - ID de un adjunto recibido por WhatsApp tal como aparece en el mensaje ("media:<sha256>") o ruta de un archivo descargado de Drive
      - parent_folder_id (string, opcional) - ID de la carpeta padre
      - file_name (string, opcional) - nombre personalizado para el archivo
-   - Ejemplo: upload_file("/tmp/reporte.pdf", "folder123", "Reporte Final")
+     - mime_type (string, opcional) - se deduce de la extensión si no se indica
+   - Ejemplo: upload_local_file("media:9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08", "folder123", "Foto recibo.jpg")
    - Retorna: confirmación de subida con ID del archivo
+   - Para VARIOS archivos usa **upload_local_files(file_paths, parent_folder_id=None)** con las rutas separadas por comas: los sube en paralelo en una sola llamada
+   - Usa **upload_file(name, mime_type, data, parent_folder_id=None)** solo para contenido pequeño generado en la conversación (data en base64)
 
-5. **move_file(file_id, new_parent_folder_id)**: Mueve un archivo a otra carpeta
+7. **move_file(file_id, new_parent_folder_id)**: Mueve un archivo a otra carpeta
    - Parámetros:
      - file_id (string, obligatorio) - ID del archivo
      - new_parent_folder_id (string, obligatorio) - ID de la nueva carpeta
    - Ejemplo: move_file("1abc123def456", "folder456")
    - Retorna: confirmación de movimiento
 
-6. **delete_file(file_id)**: Elimina un archivo
+8. **delete_file(file_id)**: Elimina un archivo
    - Parámetro: file_id (string, obligatorio) - ID del archivo
    - Ejemplo: delete_file("1abc123def456")
    - Retorna: confirmación de eliminación
 
 INSTRUCCIONES DE EJECUCIÓN:
 - SIEMPRE especifica qué herramienta vas a usar antes de usarla
-- Para operaciones con archivos específicos, primero usa search_files para encontrar el file_id
+- Para operaciones con archivos específicos, primero usa find_files para encontrar el file_id
+- get_file_metadata, download_file, move_file y delete_file aceptan directamente una ruta de carpetas en lugar del ID (ej: move_file("/Borradores/informe.pdf", "/Trabajo/Informes")): no hace falta buscar antes
 - Para subir archivos, asegúrate de que la ruta del archivo sea correcta
 - Si una herramienta falla, explica exactamente por qué
 - Proporciona respuestas estructuradas y claras
@@ -86,22 +113,29 @@ FORMATO DE RESPUESTA:
 3. "Estado: [EXITOSO/FRACASO] - [EXPLICACIÓN]"
 """
 
-drive_executor = initialize_agent(
-    DRIVE_TOOLS,
-    LLM_EXECUTOR,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    verbose=False,
-    agent_kwargs={"system_message": DRIVE_EXECUTOR_PREFIX},
-    max_iterations=5,
-    max_execution_time=30,
-    early_stopping_method="generate",
-    handle_parsing_errors=True,
-)
+_drive_executor = None
+
+def get_drive_executor():
+    """Construye el agente de Drive la primera vez que se usa y lo reutiliza."""
+    global _drive_executor
+    if _drive_executor is None:
+        _drive_executor = initialize_agent(
+            DRIVE_TOOLS,
+            LLM_EXECUTOR,
+            agent=AgentType.OPENAI_FUNCTIONS,
+            verbose=False,
+            agent_kwargs={"system_message": DRIVE_EXECUTOR_PREFIX},
+            max_iterations=5,
+            max_execution_time=30,
+            early_stopping_method="generate",
+            handle_parsing_errors=True,
+        )
+    return _drive_executor
 
 async def execute_drive_task(task: str) -> str:
     print(f"📁 [DRIVE_EXECUTOR] Ejecutando tarea: {task}")
     try:
-        response = await drive_executor.ainvoke({"input": task})
+        response = await get_drive_executor().ainvoke({"input": task})
         result = response["output"]
         print(f"📁 [DRIVE_EXECUTOR] Resultado: {result}")
         return result
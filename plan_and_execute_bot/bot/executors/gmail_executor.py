@@ -10,6 +10,7 @@ from ..tools.gmail import (
     delete_message,
     modify_labels
 )
+from ..tools.gmail_summary import summarize_messages
 
 # Fecha actual (BA)
 BA = timezone(timedelta(hours=-3))
@@ -21,7 +22,8 @@ GMAIL_TOOLS = [
     send_message,
     reply_message,
     delete_message,
-    modify_labels
+    modify_labels,
+    summarize_messages
 ]
 
 GMAIL_EXECUTOR_PREFIX = f"""
@@ -79,6 +81,14 @@ HERRAMIENTAS DISPONIBLES Y CÓMO USARLAS:
    - Ejemplo para marcar como leído: modify_labels("18c1234567890abcdef", remove_labels="UNSEEN")
    - Retorna: confirmación de modificación
 
+7. **summarize_messages(message_ids=None, query=None, max_results=10)**: Resume varios mensajes en paralelo
+   - Parámetros:
+     - message_ids (string, opcional) - IDs de mensajes separados por comas
+     - query (string, opcional) - filtro de búsqueda si no hay IDs (por defecto "in:inbox")
+     - max_results (integer, opcional) - número máximo de mensajes a resumir
+   - Ejemplo: summarize_messages(query="is:unread", max_results=20)
+   - Retorna: resumen narrativo más un resumen por mensaje con remitente, asunto, fecha e ID
+
 CONSTRUCCIÓN DE EMAILS:
 - Para nombres y apellidos: primera_letra_nombre + apellido + "@udesa.edu.ar"
   Ejemplo: "Juan Pérez" → "jperez@udesa.edu.ar"
@@ -107,17 +117,16 @@ INSTRUCCIONES DE EJECUCIÓN:
 - Verifica que los emails estén bien formateados antes de enviar
 
 INSTRUCCIONES ESPECÍFICAS PARA RESUMENES:
-- Cuando crees un resumen consolidado, SIEMPRE incluye información específica de cada mensaje
-- Usa get_message para obtener detalles completos de cada mensaje antes de crear el resumen
+- Para resumir varios correos usa SIEMPRE summarize_messages en UNA sola llamada; NO llames a get_message uno por uno
+  * "resumen de mis correos" → summarize_messages(query="in:inbox")
+  * "resumen de los no leídos" → summarize_messages(query="is:unread")
+  * Si ya tienes los IDs (por ejemplo de list_messages), pásalos en message_ids separados por comas
+- Usa get_message solo cuando necesites el contenido de UN mensaje puntual
 - Incluye en el resumen: remitente, asunto, fecha y resumen del contenido del mensaje
 - NO uses placeholders genéricos como "[Detalles de la respuesta X]"
 - El resumen debe ser informativo y útil para el destinatario
 - NO hagas listas de mensajes, HAZ un resumen narrativo de los mensajes
-- Para crear un resumen correcto:
-  1. Obtén los message_ids de los mensajes
-  2. Usa get_message para cada message_id y extrae la información real
-  3. Incluye en el resumen: "Remitente: [nombre real]", "Asunto: [asunto real]", "Fecha: [fecha real]", "Resumen: [contenido real del mensaje]"
-  4. NO inventes información ni uses templates genéricos
+- NO inventes información ni uses templates genéricos
 
 IMPORTANTE - EJECUCIÓN AUTOMÁTICA:
 - Si la tarea incluye "enviar", "mandar", "responder", "marcar como leído", etc., EJECUTA estas acciones automáticamente
@@ -132,22 +141,29 @@ FORMATO DE RESPUESTA:
 3. "Estado: [EXITOSO/FRACASO] - [EXPLICACIÓN]"
 """
 
-gmail_executor = initialize_agent(
-    GMAIL_TOOLS,
-    LLM_EXECUTOR,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    verbose=False,
-    agent_kwargs={"system_message": GMAIL_EXECUTOR_PREFIX},
-    max_iterations=5,
-    max_execution_time=30,
-    early_stopping_method="generate",
-    handle_parsing_errors=True,
-)
+_gmail_executor = None
+
+def get_gmail_executor():
+    """Construye el agente de Gmail la primera vez que se usa y lo reutiliza."""
+    global _gmail_executor
+    if _gmail_executor is None:
+        _gmail_executor = initialize_agent(
+            GMAIL_TOOLS,
+            LLM_EXECUTOR,
+            agent=AgentType.OPENAI_FUNCTIONS,
+            verbose=False,
+            agent_kwargs={"system_message": GMAIL_EXECUTOR_PREFIX},
+            max_iterations=5,
+            max_execution_time=30,
+            early_stopping_method="generate",
+            handle_parsing_errors=True,
+        )
+    return _gmail_executor
 
 async def execute_gmail_task(task: str) -> str:
     print(f"📧 [GMAIL_EXECUTOR] Ejecutando tarea: {task}")
     try:
-        response = await gmail_executor.ainvoke({"input": task})
+        response = await get_gmail_executor().ainvoke({"input": task})
         result = response["output"]
         print(f"📧 [GMAIL_EXECUTOR] Resultado: {result}")
         return result
@@ -1,21 +1,95 @@
 """Ejecutor principal que coordina todos los ejecutores especializados."""
-from typing import Dict, Any
+import importlib
+import os
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Optional
 from .router import route_task
-from .weather_executor import execute_weather_task
-from .tasks_executor import execute_tasks_task
-from .drive_executor import execute_drive_task
-from .gmail_executor import execute_gmail_task
-from .calendar_executor import execute_calendar_task
-
-# Mapeo de ejecutores especializados
-EXECUTOR_MAP = {
-    "weather_executor": execute_weather_task,
-    "tasks_executor": execute_tasks_task,
-    "drive_executor": execute_drive_task,
-    "gmail_executor": execute_gmail_task,
-    "calendar_executor": execute_calendar_task,
+from ..tools.context import user_context
+
+# Ejecutor -> (módulo, función de ejecución, constructor del agente).
+# Los módulos (y con ellos sus herramientas y clientes de Google) se importan recién al primer uso.
+EXECUTOR_REGISTRY = {
+    "weather_executor": ("weather_executor", "execute_weather_task", "get_weather_executor"),
+    "tasks_executor": ("tasks_executor", "execute_tasks_task", "get_tasks_executor"),
+    "drive_executor": ("drive_executor", "execute_drive_task", "get_drive_executor"),
+    "gmail_executor": ("gmail_executor", "execute_gmail_task", "get_gmail_executor"),
+    "calendar_executor": ("calendar_executor", "execute_calendar_task", "get_calendar_executor"),
 }
 
+# Ejecutores a construir de antemano, separados por coma ("all" = todos). Ej: EXECUTOR_WARMUP=weather_executor,gmail_executor
+EXECUTOR_WARMUP = os.getenv("EXECUTOR_WARMUP", "")
+
+
+class LazyExecutorMap(Mapping):
+    """Mapeo nombre -> función de ejecución que importa cada módulo la primera vez que se pide."""
+
+    def __init__(self, registry: Dict[str, tuple]):
+        self._registry = registry
+        self._loaded: Dict[str, Callable] = {}
+
+    def _module(self, name: str):
+        module_name = self._registry[name][0]
+        return importlib.import_module(f".{module_name}", __package__)
+
+    def __getitem__(self, name: str) -> Callable:
+        func = self._loaded.get(name)
+        if func is None:
+            start = time.perf_counter()
+            func = self._loaded[name] = getattr(self._module(name), self._registry[name][1])
+            print(f"🔄 [SPECIALIZED_EXECUTOR] {name} cargado en {(time.perf_counter() - start) * 1000:.0f} ms")
+        return func
+
+    def __contains__(self, name) -> bool:
+        return name in self._registry
+
+    def __iter__(self):
+        return iter(self._registry)
+
+    def __len__(self) -> int:
+        return len(self._registry)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def build(self, name: str):
+        """Importa el módulo y construye el agente (lo que de otro modo pasa en la primera tarea)."""
+        self[name]
+        return getattr(self._module(name), self._registry[name][2])()
+
+
+# Mapeo de ejecutores especializados (perezoso)
+EXECUTOR_MAP = LazyExecutorMap(EXECUTOR_REGISTRY)
+
+
+def warm_up_executors(names: Optional[Iterable[str]] = None) -> list:
+    """
+    Construye de antemano los ejecutores indicados (por defecto, los de EXECUTOR_WARMUP).
+    
+    Args:
+        names: Nombres de ejecutores; None usa EXECUTOR_WARMUP
+        
+    Returns:
+        list: Ejecutores construidos
+    """
+    if names is None:
+        names = [name.strip() for name in EXECUTOR_WARMUP.split(",") if name.strip()]
+        if names == ["all"]:
+            names = list(EXECUTOR_REGISTRY)
+    warmed = []
+    for name in names:
+        if name not in EXECUTOR_MAP:
+            print(f"🔄 [SPECIALIZED_EXECUTOR] Ejecutor desconocido en warm-up: {name}")
+            continue
+        try:
+            EXECUTOR_MAP.build(name)
+            warmed.append(name)
+        except Exception as e:
+            print(f"🔄 [SPECIALIZED_EXECUTOR] Error precargando {name}: {str(e)}")
+    if warmed:
+        print(f"🔄 [SPECIALIZED_EXECUTOR] Ejecutores precargados: {', '.join(warmed)}")
+    return warmed
+
 async def execute_specialized_task(task: str, session_id: str = None) -> str:
     """
     Ejecuta una tarea usando el ejecutor especializado apropiado.
@@ -41,9 +115,10 @@ async def execute_specialized_task(task: str, session_id: str = None) -> str:
         
         executor_func = EXECUTOR_MAP[executor_name]
         
-        # 3. Ejecutar la tarea con el ejecutor especializado
+        # 3. Ejecutar la tarea con el ejecutor especializado, con las credenciales de Google de la sesión
         print(f"🔄 [SPECIALIZED_EXECUTOR] Invocando {executor_name}...")
-        result = await executor_func(task)
+        with user_context(session_id):
+            result = await executor_func(task)
         
         print(f"🔄 [SPECIALIZED_EXECUTOR] Ejecución completada con {executor_name}")
         return result
@@ -100,17 +100,24 @@ FORMATO DE RESPUESTA:
 """
 
 # Configurar el agente especializado
-tasks_executor = initialize_agent(
-    TASKS_TOOLS,
-    LLM_EXECUTOR,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    verbose=False,
-    agent_kwargs={"system_message": TASKS_EXECUTOR_PREFIX},
-    max_iterations=5,
-    max_execution_time=30,
-    early_stopping_method="generate",
-    handle_parsing_errors=True,
-)
+_tasks_executor = None
+
+def get_tasks_executor():
+    """Construye el agente de tareas la primera vez que se usa y lo reutiliza."""
+    global _tasks_executor
+    if _tasks_executor is None:
+        _tasks_executor = initialize_agent(
+            TASKS_TOOLS,
+            LLM_EXECUTOR,
+            agent=AgentType.OPENAI_FUNCTIONS,
+            verbose=False,
+            agent_kwargs={"system_message": TASKS_EXECUTOR_PREFIX},
+            max_iterations=5,
+            max_execution_time=30,
+            early_stopping_method="generate",
+            handle_parsing_errors=True,
+        )
+    return _tasks_executor
 
 async def execute_tasks_task(task: str) -> str:
     """
@@ -125,7 +132,7 @@ async def execute_tasks_task(task: str) -> str:
     print(f"📋 [TASKS_EXECUTOR] Ejecutando tarea: {task}")
     
     try:
-        response = await tasks_executor.ainvoke({"input": task})
+        response = await get_tasks_executor().ainvoke({"input": task})
         result = response["output"]
         print(f"📋 [TASKS_EXECUTOR] Resultado: {result}")
         return result
@@ -77,22 +77,29 @@ FORMATO DE RESPUESTA:
 3. "Estado: [EXITOSO/FRACASO] - [EXPLICACIÓN]"
 """
 
-weather_executor = initialize_agent(
-    WEATHER_TOOLS,
-    LLM_EXECUTOR,
-    agent=AgentType.OPENAI_FUNCTIONS,
-    verbose=False,
-    agent_kwargs={"system_message": WEATHER_EXECUTOR_PREFIX},
-    max_iterations=5,
-    max_execution_time=30,
-    early_stopping_method="generate",
-    handle_parsing_errors=True,
-)
+_weather_executor = None
+
+def get_weather_executor():
+    """Construye el agente de clima la primera vez que se usa y lo reutiliza."""
+    global _weather_executor
+    if _weather_executor is None:
+        _weather_executor = initialize_agent(
+            WEATHER_TOOLS,
+            LLM_EXECUTOR,
+            agent=AgentType.OPENAI_FUNCTIONS,
+            verbose=False,
+            agent_kwargs={"system_message": WEATHER_EXECUTOR_PREFIX},
+            max_iterations=5,
+            max_execution_time=30,
+            early_stopping_method="generate",
+            handle_parsing_errors=True,
+        )
+    return _weather_executor
 
 async def execute_weather_task(task: str) -> str:
     print(f"🌤️ [WEATHER_EXECUTOR] Ejecutando tarea: {task}")
     try:
-        response = await weather_executor.ainvoke({"input": task})
+        response = await get_weather_executor().ainvoke({"input": task})
         result = response["output"]
         print(f"🌤️ [WEATHER_EXECUTOR] Resultado: {result}")
         return result
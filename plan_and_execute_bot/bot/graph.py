@@ -4,11 +4,12 @@ from langgraph.graph import StateGraph, END
 from .schemas import PlanExecute, Response, Plan, Act, StepResult
 from .planner import make_plan
 from .executor import agent_executor
-from .executors import execute_specialized_task, execute_multiple_tasks
+from .executors import execute_specialized_task, execute_multiple_tasks, warm_up_executors
 from .prompts import REPLANNER_PROMPT
 from .config import LLM_PLANNER  # we reuse the planner LLM for replanning
 from .memory import memory
 from .responder import generate_final_response
+from .tools.circuit import UNAVAILABLE_PREFIX, get_breaker
 
 # ---------- State transition helpers ---------- #
 
@@ -129,6 +130,27 @@ async def execute_step(state: PlanExecute):
             else:
                 break
     
+    # Saltar sin ejecutar los pasos cuya dependencia tiene el circuito abierto
+    consumed_steps = len(steps_to_execute)
+    skipped_steps = []
+    for step in list(steps_to_execute):
+        unavailable = dependency_unavailable(step)
+        if unavailable:
+            print(f"🔄 [DEBUG] Omitiendo paso con dependencia caída: {step}")
+            skipped_steps.append(StepResult(
+                step=step,
+                result=unavailable,
+                executor=determine_executor_from_task(step),
+                success=False
+            ))
+            steps_to_execute.remove(step)
+    if not steps_to_execute:
+        return {
+            "past_steps": past_steps + skipped_steps,
+            "plan": plan[consumed_steps:],
+            "tool_results": tool_results
+        }
+    
     print(f"🔄 [DEBUG] Ejecutando {len(steps_to_execute)} pasos: {steps_to_execute}")
     
     # Detectar bucles de manera más inteligente
@@ -192,7 +214,7 @@ async def execute_step(state: PlanExecute):
         print(f"🔄 [DEBUG] Respuesta del ejecutor especializado: {result}")
         
         # Agregar todos los pasos completados a past_steps usando StepResult
-        new_past_steps = past_steps[:]
+        new_past_steps = past_steps + skipped_steps
         for step in steps_to_execute:
             # Determinar si el paso fue exitoso
             success = not (result and "Error" in result)
@@ -211,7 +233,7 @@ async def execute_step(state: PlanExecute):
         
         print(f"🔄 [DEBUG] tool_results acumulados: {tool_results}")
         # Remover los pasos ejecutados del plan
-        remaining_plan = plan[len(steps_to_execute):] if len(plan) > len(steps_to_execute) else []
+        remaining_plan = plan[consumed_steps:]
         
         result_dict = {
             "past_steps": new_past_steps,
@@ -259,7 +281,7 @@ async def replan_or_finish(state: PlanExecute):
                     break
         
         if not tool_result:
-            tool_result = "No se pudo obtener información específica de las herramientas ejecutadas."
+            tool_result = unavailable_summary(past_steps) or "No se pudo obtener información específica de las herramientas ejecutadas."
         
         # Generar respuesta final usando el responder
         final_response = await generate_final_response(
@@ -384,7 +406,9 @@ async def replan_or_finish(state: PlanExecute):
                                              step.lower() in current_step.lower() 
                                              for current_step in current_plan_steps)
                     
-                    if not step_completed and not step_in_current_plan:
+                    if dependency_unavailable(step):
+                        print(f"🔄 [DEBUG] Omitiendo paso con dependencia caída: {step}")
+                    elif not step_completed and not step_in_current_plan:
                         filtered_steps.append(step)
                         print(f"🔄 [DEBUG] Agregando paso nuevo: {step}")
                     else:
@@ -408,7 +432,7 @@ async def replan_or_finish(state: PlanExecute):
                                 break
                     
                     if not tool_result:
-                        tool_result = "Todos los pasos necesarios han sido completados."
+                        tool_result = unavailable_summary(past_steps) or "Todos los pasos necesarios han sido completados."
                     
                     final_response = await generate_final_response(
                         query=original_input,
@@ -504,6 +528,39 @@ def determine_executor_from_task(task: str) -> str:
     else:
         return "unknown_executor"
 
+# Dependencia externa (circuito) de cada ejecutor
+EXECUTOR_DEPENDENCIES = {
+    "weather_executor": "weather",
+    "tasks_executor": "tasks",
+    "drive_executor": "drive",
+    "gmail_executor": "gmail",
+    "calendar_executor": "calendar",
+}
+
+def dependency_unavailable(task: str):
+    """
+    Mensaje de "no disponible" si la dependencia de la tarea tiene el circuito abierto.
+    
+    Args:
+        task: La tarea a ejecutar
+        
+    Returns:
+        str | None: Mensaje para el paso omitido, o None si se puede ejecutar
+    """
+    api = EXECUTOR_DEPENDENCIES.get(determine_executor_from_task(task))
+    if api is None:
+        return None
+    breaker = get_breaker(api)
+    return breaker.unavailable_message() if breaker.is_open() else None
+
+def unavailable_summary(past_steps: List[StepResult]) -> str:
+    """Une los mensajes de los pasos omitidos por dependencias caídas (vacío si no hubo)."""
+    messages = []
+    for step_result in past_steps:
+        if step_result.result and UNAVAILABLE_PREFIX in step_result.result and step_result.result not in messages:
+            messages.append(step_result.result)
+    return "\n".join(messages)
+
 # ---------- Graph builder ---------- #
 
 def build_chatbot_graph():
@@ -520,4 +577,6 @@ def build_chatbot_graph():
 
     compiled_graph = graph.compile()
     print("🔄 [DEBUG] Grafo compilado exitosamente!")
+    # Los ejecutores se construyen al primer uso; EXECUTOR_WARMUP adelanta los más usados
+    warm_up_executors()
     return compiled_graph
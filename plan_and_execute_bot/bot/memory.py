@@ -1,52 +1,229 @@
 """Sistema de memoria para el bot conversacional."""
-import json
 import os
+import sys
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from .schemas import ConversationMessage
+from .session_store import JSONSessionStore, SessionConflictError, SessionStore, create_session_store
+
+# Reintentos cuando otro proceso modificó la sesión al mismo tiempo
+SESSION_MAX_RETRIES = int(os.getenv("SESSION_MAX_RETRIES", "5"))
+# Segundos que se confía en la copia local sin consultar nada; después se compara solo la versión
+# guardada (una lectura mínima) y los mensajes se releen únicamente si otro proceso la cambió
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+# Límites de la caché local: las sesiones que no entran se descartan y se releen al volver a usarse
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "5000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_CACHE_IDLE_TTL = float(os.getenv("SESSION_CACHE_IDLE_TTL", "1800"))
+
+
+class MessageRecord:
+    """Mensaje en memoria: rol internado, contenido y timestamp epoch en segundos."""
+    
+    __slots__ = ("role", "content", "ts")
+    
+    def __init__(self, role: str, content: str, ts: int):
+        self.role = sys.intern(role)
+        self.content = content
+        self.ts = ts
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MessageRecord":
+        timestamp = data.get('timestamp')
+        try:
+            ts = int(timestamp) if isinstance(timestamp, (int, float)) else int(datetime.fromisoformat(timestamp).timestamp())
+        except (TypeError, ValueError):
+            ts = 0
+        return cls(data.get('role', 'user'), data.get('content', ''), ts)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato público (y de almacenamiento): el mismo dict de siempre con timestamp ISO."""
+        return {
+            'role': self.role,
+            'content': self.content,
+            'timestamp': datetime.fromtimestamp(self.ts).isoformat()
+        }
+    
+    def size(self) -> int:
+        """Bytes aproximados que ocupa en memoria."""
+        return sys.getsizeof(self) + sys.getsizeof(self.content)
+
+
+class SessionEntry:
+    """Sesión en la caché local."""
+    
+    __slots__ = ("messages", "version", "loaded_at", "used_at", "size")
+    
+    def __init__(self, messages: Tuple[MessageRecord, ...], version: int, now: float):
+        self.messages = messages
+        self.version = version
+        self.loaded_at = now
+        self.used_at = now
+        self.size = sum(message.size() for message in messages) + sys.getsizeof(messages)
+
+
+class SessionCache:
+    """Caché LRU de sesiones con límite de cantidad, de memoria y de inactividad.
+    
+    Las escrituras ya están en el almacenamiento compartido, así que desalojar una sesión
+    no pierde nada: la próxima vez que se use se vuelve a leer.
+    """
+    
+    def __init__(self, max_sessions: int = SESSION_CACHE_MAX_SESSIONS, max_bytes: int = SESSION_CACHE_MAX_BYTES,
+                 idle_ttl: float = SESSION_CACHE_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._bytes = 0
+        self._last_idle_sweep = time.monotonic()
+        
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+    
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry.used_at = time.monotonic()
+            self._entries.move_to_end(session_id)
+        return entry
+    
+    def put(self, session_id: str, messages: Tuple[MessageRecord, ...], version: int):
+        now = time.monotonic()
+        self.pop(session_id)
+        entry = SessionEntry(messages, version, now)
+        self._entries[session_id] = entry
+        self._bytes += entry.size
+        self._evict(now)
+    
+    def pop(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+    
+    def _evict(self, now: float):
+        """Desaloja por tamaño (las menos usadas primero) y, cada minuto, las inactivas."""
+        while self._entries and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+        if now - self._last_idle_sweep < 60:
+            return
+        self._last_idle_sweep = now
+        # El orden LRU garantiza que las inactivas están al principio
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.used_at < self.idle_ttl:
+                break
+            self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+    
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'sessions': len(self._entries),
+            'bytes': self._bytes,
+            'max_sessions': self.max_sessions,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'revalidated': self.revalidated,
+            'evictions': self.evictions,
+        }
 
 
 class ConversationMemory:
-    """Gestiona la memoria de conversaciones del bot."""
+    """Gestiona la memoria de conversaciones del bot.
+    
+    Las sesiones viven en un almacenamiento compartido (ver session_store.py), así varios
+    procesos del servidor pueden atender al mismo usuario sin pisarse. En cada proceso se
+    guarda una copia local acotada de las sesiones usadas recientemente (ver SessionCache);
+    nada se carga al arrancar.
+    """
     
-    def __init__(self, memory_file: str = "conversation_memory.json"):
+    def __init__(self, memory_file: Optional[str] = None, store: Optional[SessionStore] = None,
+                 cache: Optional[SessionCache] = None):
         """Inicializar el sistema de memoria.
         
         Args:
-            memory_file: Archivo donde se guardará la memoria
+            memory_file: Archivo JSON donde guardar la memoria (fuerza el backend json)
+            store: Almacenamiento de sesiones; por defecto el de SESSION_BACKEND
+            cache: Caché local de sesiones; por defecto con los límites SESSION_CACHE_*
         """
-        self.memory_file = memory_file
-        self.sessions: Dict[str, List[Dict[str, Any]]] = {}
-        self.load_memory()
+        if store is None:
+            store = JSONSessionStore(memory_file) if memory_file else create_session_store()
+        self.store = store
+        self.sessions = cache if cache is not None else SessionCache()
     
-    def load_memory(self):
-        """Cargar memoria desde archivo."""
-        if os.path.exists(self.memory_file):
+    def _load(self, session_id: str) -> Optional[Tuple[MessageRecord, ...]]:
+        """Mensajes de la sesión (copia local si es reciente), o None si no existe."""
+        entry = self.sessions.get(session_id)
+        if entry is not None:
+            now = time.monotonic()
+            if now - entry.loaded_at < SESSION_CACHE_TTL:
+                self.sessions.hits += 1
+                return entry.messages
             try:
-                with open(self.memory_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.sessions = data.get('sessions', {})
-                print(f"🧠 [MEMORY] Memoria cargada desde {self.memory_file}")
+                version = self.store.version(session_id)
             except Exception as e:
-                print(f"⚠️ [MEMORY] Error cargando memoria: {e}")
-                self.sessions = {}
-        else:
-            print(f"🧠 [MEMORY] Archivo de memoria no existe, iniciando con memoria vacía")
-            self.sessions = {}
-    
-    def save_memory(self):
-        """Guardar memoria en archivo."""
+                print(f"⚠️ [MEMORY] Error consultando sesión {session_id[:8]}...: {e}")
+                return entry.messages
+            if version == entry.version:
+                # Nadie la modificó: la copia local sigue valiendo
+                entry.loaded_at = now
+                self.sessions.hits += 1
+                self.sessions.revalidated += 1
+                return entry.messages
+        self.sessions.misses += 1
         try:
-            data = {
-                'sessions': self.sessions,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            print(f"🧠 [MEMORY] Memoria guardada en {self.memory_file}")
+            loaded = self.store.load(session_id)
         except Exception as e:
-            print(f"⚠️ [MEMORY] Error guardando memoria: {e}")
+            print(f"⚠️ [MEMORY] Error cargando sesión {session_id[:8]}...: {e}")
+            return entry.messages if entry is not None else None
+        if loaded is None:
+            self.sessions.pop(session_id)
+            return None
+        messages = tuple(MessageRecord.from_dict(message) for message in loaded[0])
+        self.sessions.put(session_id, messages, loaded[1])
+        return messages
+    
+    def _update(self, session_id: str, mutate: Callable[[List[MessageRecord]], List[MessageRecord]]):
+        """Lee, modifica y guarda la sesión con concurrencia optimista (reintenta si hubo conflicto)."""
+        for attempt in range(SESSION_MAX_RETRIES):
+            if attempt > 0:
+                self.sessions.pop(session_id)
+            self._load(session_id)
+            entry = self.sessions.get(session_id)
+            messages, version = (list(entry.messages), entry.version) if entry is not None else ([], 0)
+            messages = mutate(messages)
+            try:
+                version = self.store.save(session_id, [message.to_dict() for message in messages], version)
+            except SessionConflictError:
+                print(f"🧠 [MEMORY] Conflicto en sesión {session_id[:8]}..., reintentando ({attempt + 1})")
+                continue
+            except Exception as e:
+                print(f"⚠️ [MEMORY] Error guardando memoria: {e}")
+                return
+            self.sessions.put(session_id, tuple(messages), version)
+            return
+        print(f"⚠️ [MEMORY] No se pudo guardar la sesión {session_id[:8]}... tras {SESSION_MAX_RETRIES} conflictos")
+    
+    def cache_metrics(self) -> Dict[str, Any]:
+        """Métricas de la caché local de sesiones."""
+        return self.sessions.metrics()
     
     def create_session(self, session_id: str = None) -> str:
         """Crear una nueva sesión de conversación.
@@ -60,8 +237,8 @@ class ConversationMemory:
         if session_id is None:
             session_id = str(uuid.uuid4())
         
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
+        if self._load(session_id) is None:
+            self._update(session_id, lambda messages: messages)
             print(f"🧠 [MEMORY] Nueva sesión creada: {session_id}")
         else:
             print(f"🧠 [MEMORY] Sesión existente reutilizada: {session_id}")
@@ -87,26 +264,19 @@ class ConversationMemory:
             role: 'user' o 'assistant'
             content: Contenido del mensaje
         """
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
-        
-        message = {
-            'role': role,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        }
+        message = MessageRecord(role, content, int(time.time()))
         
-        self.sessions[session_id].append(message)
-        
-        # Mantener solo los últimos 5 mensajes
-        if len(self.sessions[session_id]) > 5:
-            self.sessions[session_id] = self.sessions[session_id][-5:]
-            print(f"🧠 [MEMORY] Historial limitado a 5 mensajes en sesión {session_id[:8]}...")
+        def append(messages: List[MessageRecord]) -> List[MessageRecord]:
+            messages.append(message)
+            # Mantener solo los últimos 5 mensajes
+            if len(messages) > 5:
+                print(f"🧠 [MEMORY] Historial limitado a 5 mensajes en sesión {session_id[:8]}...")
+                return messages[-5:]
+            return messages
         
+        # Se guarda en el almacenamiento compartido después de cada mensaje
+        self._update(session_id, append)
         print(f"🧠 [MEMORY] Mensaje agregado a sesión {session_id[:8]}...")
-        
-        # Guardar automáticamente después de cada mensaje
-        self.save_memory()
     
     def get_conversation_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Obtener el historial de conversación de una sesión.
@@ -118,14 +288,14 @@ class ConversationMemory:
         Returns:
             Lista de mensajes de la conversación
         """
-        if session_id not in self.sessions:
+        history = self._load(session_id)
+        if not history:
             return []
         
-        history = self.sessions[session_id]
         if limit:
             history = history[-limit:]  # Obtener los últimos N mensajes
         
-        return history
+        return [message.to_dict() for message in history]
     
     def get_context_for_planning(self, session_id: str, max_messages: int = 5) -> str:
         """Obtener contexto de conversación para el planificador.
@@ -137,15 +307,15 @@ class ConversationMemory:
         Returns:
             Contexto formateado para el planificador
         """
-        history = self.get_conversation_history(session_id, limit=max_messages)
+        history = self._load(session_id)
         
         if not history:
             return "Esta es una nueva conversación."
         
         context_lines = ["Historial de conversación reciente:"]
-        for msg in history:
-            role_display = "Usuario" if msg['role'] == 'user' else "Asistente"
-            context_lines.append(f"{role_display}: {msg['content']}")
+        for msg in history[-max_messages:] if max_messages else history:
+            role_display = "Usuario" if msg.role == 'user' else "Asistente"
+            context_lines.append(f"{role_display}: {msg.content}")
         
         return "\n".join(context_lines)
     
@@ -155,10 +325,13 @@ class ConversationMemory:
         Args:
             session_id: ID de la sesión a limpiar
         """
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            self.save_memory()
-            print(f"🧠 [MEMORY] Sesión {session_id[:8]}... limpiada")
+        self.sessions.pop(session_id)
+        try:
+            self.store.delete(session_id)
+        except Exception as e:
+            print(f"⚠️ [MEMORY] Error limpiando sesión {session_id[:8]}...: {e}")
+            return
+        print(f"🧠 [MEMORY] Sesión {session_id[:8]}... limpiada")
     
     def list_sessions(self) -> List[str]:
         """Listar todas las sesiones disponibles.
@@ -166,7 +339,7 @@ class ConversationMemory:
         Returns:
             Lista de IDs de sesiones
         """
-        return list(self.sessions.keys())
+        return self.store.list_ids()
     
     def get_session_summary(self, session_id: str) -> Dict[str, Any]:
         """Obtener resumen de una sesión.
@@ -177,22 +350,22 @@ class ConversationMemory:
         Returns:
             Diccionario con información de la sesión
         """
-        if session_id not in self.sessions:
+        history = self._load(session_id)
+        if history is None:
             return {}
         
-        history = self.sessions[session_id]
         if not history:
             return {'session_id': session_id, 'message_count': 0}
         
-        first_message = history[0]
-        last_message = history[-1]
+        first_message = history[0].to_dict()
+        last_message = history[-1].to_dict()
         
         return {
             'session_id': session_id,
             'message_count': len(history),
             'first_message_time': first_message['timestamp'],
             'last_message_time': last_message['timestamp'],
-            'first_user_message': next((msg['content'] for msg in history if msg['role'] == 'user'), None)
+            'first_user_message': next((msg.content for msg in history if msg.role == 'user'), None)
         }
 
 
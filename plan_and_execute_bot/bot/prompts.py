@@ -27,10 +27,15 @@ AVAILABLE_TOOLS = """
 - add_subtask(parent_task_title, subtask_title): Añadir subtarea a una tarea existente
 
 📁 GOOGLE DRIVE:
+- find_files(query, max_results=10): Buscar archivos/carpetas por nombre en el índice local (instantáneo)
+- resolve_drive_path(path_or_id): Convertir una ruta de carpetas en ID (o ID en ruta)
+- search_drive_content(query, max_results=5): Buscar documentos por su contenido (ej: "el doc donde hablamos del presupuesto")
 - search_files(query, page_size=10): Buscar archivos/carpetas
 - get_file_metadata(file_id): Obtener metadatos de archivo
-- download_file(file_id, export_mime_type=None): Descargar archivo
-- upload_file(name, mime_type, data, parent_folder_id=None): Subir archivo
+- download_file(file_id, export_mime_type=None, destination_path=None): Descargar archivo a disco (reanuda descargas interrumpidas)
+- upload_file(name, mime_type, data, parent_folder_id=None): Subir contenido pequeño en base64
+- upload_local_file(file_path, parent_folder_id=None, file_name=None): Subir un adjunto de WhatsApp (por su ID media:<sha256>) o un archivo descargado
+- upload_local_files(file_paths, parent_folder_id=None): Subir varios archivos locales en paralelo
 - move_file(file_id, new_parent_id): Mover archivo a otra carpeta
 - delete_file(file_id, permanent=False): Eliminar archivo (papelera o permanente)
 
@@ -41,10 +46,12 @@ AVAILABLE_TOOLS = """
 - reply_message(thread_id, body_html, quote_original=True): Responder a mensaje
 - delete_message(message_id, permanent=False): Eliminar mensaje
 - modify_labels(message_id, add_labels=None, remove_labels=None): Modificar etiquetas
+- summarize_messages(message_ids=None, query=None, max_results=10): Resumir varios correos a la vez (ej: "resumen de mis correos")
 
 📅 GOOGLE CALENDAR:
 - list_calendars(): Listar calendarios disponibles
 - list_events(calendar_id, time_min, time_max, query=None): Listar eventos
+- search_all_calendars(query=None, time_min=None, time_max=None): Buscar/listar eventos en todos los calendarios a la vez
 - get_event(calendar_id, event_id): Obtener evento específico
 - create_event(calendar_id, summary, start, end=None, description=None, location=None, attendees=None): Crear evento
 - update_event(calendar_id, event_id, summary=None, start=None, end=None, description=None, location=None, attendees=None): Actualizar evento
@@ -0,0 +1,306 @@
+"""Almacenamiento compartido del estado de las sesiones (varios procesos del servidor).
+
+Cada sesión se guarda con un número de versión. `save` solo escribe si la versión no cambió
+desde que se leyó (concurrencia optimista); si otro proceso escribió antes, lanza
+`SessionConflictError` y quien llama vuelve a leer y reintenta.
+
+Backends (SESSION_BACKEND):
+- sqlite: archivo local en modo WAL, compartido por los workers de una misma máquina (por defecto)
+- redis: servidor Redis (o compatible) en SESSION_REDIS_URL, para varias máquinas
+- json: el archivo conversation_memory.json de siempre (solo un proceso)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "conversation_memory.sqlite3")
+SESSION_JSON_PATH = os.getenv("SESSION_JSON_PATH", "conversation_memory.json")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_REDIS_PREFIX = os.getenv("SESSION_REDIS_PREFIX", "chatbot:session:")
+
+Messages = List[Dict[str, Any]]
+
+
+class SessionConflictError(RuntimeError):
+    """Otro proceso modificó la sesión desde que se leyó."""
+
+
+class SessionStore(ABC):
+    """Interfaz común: mensajes de una sesión + versión para concurrencia optimista."""
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Tuple[Messages, int]]:
+        """(mensajes, versión) de la sesión, o None si no existe."""
+
+    def version(self, session_id: str) -> Optional[int]:
+        """Versión actual de la sesión sin leer sus mensajes (None si no existe)."""
+        loaded = self.load(session_id)
+        return loaded[1] if loaded is not None else None
+
+    @abstractmethod
+    def save(self, session_id: str, messages: Messages, expected_version: int) -> int:
+        """Guarda si la versión actual es `expected_version` (0 = sesión nueva) y devuelve la nueva.
+
+        Raises:
+            SessionConflictError: La versión guardada es otra
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def list_ids(self) -> List[str]:
+        ...
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sesiones en SQLite (WAL): varios procesos leen en paralelo y las escrituras se serializan."""
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                messages TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def load(self, session_id: str) -> Optional[Tuple[Messages, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT messages, version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def version(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save(self, session_id: str, messages: Messages, expected_version: int) -> int:
+        data = json.dumps(messages, ensure_ascii=False)
+        with self._lock:
+            if expected_version == 0:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, messages, version, updated_at) VALUES (?, ?, 1, ?)",
+                    (session_id, data, time.time())
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE sessions SET messages = ?, version = version + 1, updated_at = ? "
+                    "WHERE session_id = ? AND version = ?",
+                    (data, time.time(), session_id, expected_version)
+                )
+        if cursor.rowcount == 0:
+            raise SessionConflictError(f"La sesión {session_id} cambió (versión esperada {expected_version})")
+        return expected_version + 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def list_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT session_id FROM sessions ORDER BY updated_at")]
+
+    def import_legacy_json(self, json_path: str) -> int:
+        """Importa una sola vez el conversation_memory.json anterior; devuelve las sesiones importadas."""
+        if not os.path.exists(json_path):
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_json_imported'").fetchone()
+                if done is not None:
+                    self._conn.execute("COMMIT")
+                    return 0
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    sessions = json.load(f).get('sessions', {})
+                now = time.time()
+                for session_id, messages in sessions.items():
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO sessions (session_id, messages, version, updated_at) VALUES (?, ?, 1, ?)",
+                        (session_id, json.dumps(messages, ensure_ascii=False), now)
+                    )
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)", (json_path,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        print(f"🧠 [MEMORY] {len(sessions)} sesiones importadas desde {json_path}")
+        return len(sessions)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionStore(SessionStore):
+    """Sesiones en Redis (o un servidor compatible): un hash por sesión con WATCH/MULTI para la versión."""
+
+    def __init__(self, url: str = SESSION_REDIS_URL, prefix: str = SESSION_REDIS_PREFIX):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("SESSION_BACKEND=redis requiere el paquete 'redis' (pip install redis)") from e
+        self._redis_module = redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.index_key = f"{prefix}ids"
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def load(self, session_id: str) -> Optional[Tuple[Messages, int]]:
+        data = self.client.hmget(self._key(session_id), "messages", "version")
+        if data[0] is None:
+            return None
+        return json.loads(data[0]), int(data[1])
+
+    def version(self, session_id: str) -> Optional[int]:
+        version = self.client.hget(self._key(session_id), "version")
+        return int(version) if version is not None else None
+
+    def save(self, session_id: str, messages: Messages, expected_version: int) -> int:
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, "version")
+                if int(current or 0) != expected_version:
+                    raise SessionConflictError(f"La sesión {session_id} cambió (versión esperada {expected_version})")
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    "messages": json.dumps(messages, ensure_ascii=False),
+                    "version": expected_version + 1,
+                })
+                pipe.sadd(self.index_key, session_id)
+                pipe.execute()
+            except self._redis_module.WatchError as e:
+                raise SessionConflictError(f"La sesión {session_id} cambió durante la escritura") from e
+        return expected_version + 1
+
+    def delete(self, session_id: str):
+        with self.client.pipeline() as pipe:
+            pipe.delete(self._key(session_id))
+            pipe.srem(self.index_key, session_id)
+            pipe.execute()
+
+    def list_ids(self) -> List[str]:
+        return sorted(self.client.smembers(self.index_key))
+
+    def close(self):
+        self.client.close()
+
+
+class JSONSessionStore(SessionStore):
+    """El archivo JSON original. Con fcntl (POSIX) bloquea el archivo, pero reescribe todo en cada cambio."""
+
+    def __init__(self, path: str = SESSION_JSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            try:
+                import fcntl
+            except ImportError:
+                yield
+                return
+            with open(f"{self.path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {'sessions': {}, 'versions': {}}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ [MEMORY] Error cargando memoria: {e}")
+            return {'sessions': {}, 'versions': {}}
+        data.setdefault('sessions', {})
+        data.setdefault('versions', {})
+        return data
+
+    def _write(self, data: Dict[str, Any]):
+        data['last_updated'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def load(self, session_id: str) -> Optional[Tuple[Messages, int]]:
+        with self._locked():
+            data = self._read()
+        if session_id not in data['sessions']:
+            return None
+        # Archivos anteriores al versionado: las sesiones existentes cuentan como versión 1
+        return data['sessions'][session_id], data['versions'].get(session_id, 1)
+
+    def save(self, session_id: str, messages: Messages, expected_version: int) -> int:
+        with self._locked():
+            data = self._read()
+            current = data['versions'].get(session_id, 1) if session_id in data['sessions'] else 0
+            if current != expected_version:
+                raise SessionConflictError(f"La sesión {session_id} cambió (versión esperada {expected_version})")
+            data['sessions'][session_id] = messages
+            data['versions'][session_id] = expected_version + 1
+            self._write(data)
+        return expected_version + 1
+
+    def delete(self, session_id: str):
+        with self._locked():
+            data = self._read()
+            if data['sessions'].pop(session_id, None) is not None:
+                data['versions'].pop(session_id, None)
+                self._write(data)
+
+    def list_ids(self) -> List[str]:
+        with self._locked():
+            return list(self._read()['sessions'].keys())
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """Crea el backend configurado (con SQLite importa una vez el JSON anterior)."""
+    if backend == "redis":
+        print(f"🧠 [MEMORY] Sesiones en Redis ({SESSION_REDIS_URL})")
+        return RedisSessionStore()
+    if backend == "json":
+        print(f"🧠 [MEMORY] Sesiones en {SESSION_JSON_PATH} (un solo proceso)")
+        return JSONSessionStore()
+    if backend != "sqlite":
+        print(f"⚠️ [MEMORY] SESSION_BACKEND '{backend}' desconocido, usando sqlite")
+    store = SQLiteSessionStore()
+    try:
+        store.import_legacy_json(SESSION_JSON_PATH)
+    except Exception as e:
+        print(f"⚠️ [MEMORY] No se pudo importar {SESSION_JSON_PATH}: {e}")
+    print(f"🧠 [MEMORY] Sesiones en {SESSION_DB_PATH} (SQLite WAL)")
+    return store
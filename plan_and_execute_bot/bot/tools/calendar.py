@@ -1,50 +1,148 @@
 import os
+import contextvars
+import heapq
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Any
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from urllib.parse import quote
+from googleapiclient.errors import HttpError
 from langchain.tools import tool
 
+from .google_async import AsyncGoogleClient
+from .credentials import credential_manager
+from .pools import bind_tools_to_pool
+
 
 # Configuración
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 # Configurar rutas relativas al directorio raíz del proyecto
 _CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/calendar.py
-CREDS_FILE = str(_CURRENT_DIR / 'credentials.json')
 TOKEN_FILE = str(_CURRENT_DIR / 'calendar_token.json')
 
+credential_manager.register_api('calendar', SCOPES, TOKEN_FILE, 'calendar', 'v3')
+
+# Zona horaria usada para eventos de todo el día y rangos relativos
+BA = timezone(timedelta(hours=-3))
+
+# Campos mínimos pedidos a la API al listar eventos
+EVENT_LIST_FIELDS = 'nextPageToken,items(id,etag,summary,start,end)'
+# Calendarios consultados en paralelo como máximo
+CALENDAR_MAX_CONCURRENCY = int(os.getenv("CALENDAR_MAX_CONCURRENCY", "8"))
+# Eventos recordados (título + ETag) para escribir sin leer antes
+CALENDAR_EVENT_CACHE_SIZE = int(os.getenv("CALENDAR_EVENT_CACHE_SIZE", "1000"))
+
+_EVENT_CACHE: "OrderedDict[tuple, Dict[str, str]]" = OrderedDict()
+_EVENT_CACHE_LOCK = threading.Lock()
+
 
 def get_calendar_service():
-    """Obtiene el servicio de Google Calendar con manejo mejorado de errores."""
+    """Devuelve el servicio de Google Calendar del usuario actual para este hilo (httplib2 no es thread-safe)."""
     try:
-        # Verificar si existe el archivo de credenciales
-        if not Path(CREDS_FILE).exists():
-            raise FileNotFoundError(f"No se encontró el archivo {CREDS_FILE}. Por favor, configura las credenciales de Google Calendar.")
-        
-        creds = None
-        # Cargar credenciales guardadas si existen
-        if Path(TOKEN_FILE).exists():
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-        # Si no hay creds o no son válidas, ejecutar el flujo de OAuth
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(CREDS_FILE, SCOPES)
-                creds = flow.run_local_server(port=0)
-            # Guardar para próximas ejecuciones
-            with open(TOKEN_FILE, 'w', encoding='utf-8') as token:
-                token.write(creds.to_json())
-        # Construir el servicio
-        return build('calendar', 'v3', credentials=creds)
+        return credential_manager.get_service('calendar')
+    except FileNotFoundError:
+        raise
     except Exception as e:
         raise Exception(f"Error al configurar Google Calendar: {str(e)}")
 
 
+def _remember_event(calendar_id: str, event: Dict[str, Any]):
+    """Guarda título y ETag de un evento en el caché LRU local."""
+    if not event.get('id'):
+        return
+    key = (credential_manager.effective_user('calendar'), calendar_id, event['id'])
+    with _EVENT_CACHE_LOCK:
+        _EVENT_CACHE[key] = {'summary': event.get('summary', 'Sin título'), 'etag': event.get('etag')}
+        _EVENT_CACHE.move_to_end(key)
+        while len(_EVENT_CACHE) > CALENDAR_EVENT_CACHE_SIZE:
+            _EVENT_CACHE.popitem(last=False)
+
+
+def _cached_event(calendar_id: str, event_id: str) -> Optional[Dict[str, str]]:
+    """Devuelve título y ETag conocidos de un evento, o None si no está en caché."""
+    with _EVENT_CACHE_LOCK:
+        return _EVENT_CACHE.get((credential_manager.effective_user('calendar'), calendar_id, event_id))
+
+
+def _forget_event(calendar_id: str, event_id: str):
+    """Elimina un evento del caché local."""
+    with _EVENT_CACHE_LOCK:
+        _EVENT_CACHE.pop((credential_manager.effective_user('calendar'), calendar_id, event_id), None)
+
+
+def _conditional(request, calendar_id: str, event_id: str):
+    """Agrega If-Match con el ETag conocido para que la escritura falle si el evento cambió."""
+    cached = _cached_event(calendar_id, event_id)
+    if cached and cached.get('etag'):
+        request.headers['If-Match'] = cached['etag']
+    return request
+
+
+def _list_events_paginated(service, calendar_id: str, time_min: str, time_max: str,
+                           query: str = None) -> List[Dict[str, Any]]:
+    """Lista todos los eventos de un calendario siguiendo `nextPageToken`."""
+    events = []
+    page_token = None
+    while True:
+        response = service.events().list(
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            q=query,
+            singleEvents=True,
+            orderBy='startTime',
+            pageToken=page_token,
+            fields=EVENT_LIST_FIELDS
+        ).execute()
+        for event in response.get('items', []):
+            _remember_event(calendar_id, event)
+            events.append(event)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+def _event_start_key(event: Dict[str, Any]) -> datetime:
+    """Clave de orden por inicio, comparable entre eventos con hora y de todo el día."""
+    start = event.get('start', {})
+    if 'dateTime' in start:
+        return datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
+    return datetime.fromisoformat(start.get('date', '1970-01-01')).replace(tzinfo=BA)
+
+
+def _new_event_body(summary: str, start: str, end: str, attendees: str = None,
+                    location: str = None, description: str = None) -> Dict[str, Any]:
+    """Cuerpo de un evento nuevo para la API."""
+    event_body = {
+        'summary': summary,
+        'start': {'dateTime': start, 'timeZone': 'America/Argentina/Buenos_Aires'},
+        'end': {'dateTime': end, 'timeZone': 'America/Argentina/Buenos_Aires'},
+    }
+    
+    if description:
+        event_body['description'] = description
+    
+    if location:
+        event_body['location'] = location
+    
+    if attendees:
+        # Convertir string a lista
+        attendees_list = [email.strip() for email in attendees.split(',')]
+        event_body['attendees'] = [{'email': email} for email in attendees_list]
+    return event_body
+
+
+def _format_event_line(event: Dict[str, Any], calendar_name: str = None) -> str:
+    """Formatea un evento en una línea para la respuesta de las herramientas."""
+    start = event['start'].get('dateTime', event['start'].get('date'))
+    summary = event.get('summary', 'Sin título')
+    calendar_info = f" [Calendario: {calendar_name}]" if calendar_name else ""
+    return f"- {summary} ({start}) [ID: {event['id']}]{calendar_info}"
+
+
 @tool
 def list_calendars() -> str:
     """Devuelve los calendarios visibles del usuario.
@@ -86,25 +184,14 @@ def list_events(calendar_id: str, time_min: str, time_max: str, query: str = Non
     """
     try:
         service = get_calendar_service()
-        events_result = service.events().list(
-            calendarId=calendar_id,
-            timeMin=time_min,
-            timeMax=time_max,
-            q=query,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+        events = _list_events_paginated(service, calendar_id, time_min, time_max, query)
         
         if not events:
             return f"No se encontraron eventos en el rango especificado{' para la búsqueda: ' + query if query else ''}."
         
         result = f"Eventos encontrados ({len(events)}):\n"
         for event in events:
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            summary = event.get('summary', 'Sin título')
-            result += f"- {summary} ({start}) [ID: {event['id']}]\n"
+            result += _format_event_line(event) + "\n"
         
         return result.strip()
     except FileNotFoundError as e:
@@ -127,6 +214,7 @@ def get_event(calendar_id: str, event_id: str) -> str:
     try:
         service = get_calendar_service()
         event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+        _remember_event(calendar_id, event)
         
         result = f"Detalles del evento:\n"
         result += f"Título: {event.get('summary', 'Sin título')}\n"
@@ -173,24 +261,14 @@ def create_event(calendar_id: str, summary: str, start: str, end: str,
     try:
         service = get_calendar_service()
         
-        event_body = {
-            'summary': summary,
-            'start': {'dateTime': start, 'timeZone': 'America/Argentina/Buenos_Aires'},
-            'end': {'dateTime': end, 'timeZone': 'America/Argentina/Buenos_Aires'},
-        }
-        
-        if description:
-            event_body['description'] = description
-        
-        if location:
-            event_body['location'] = location
-        
-        if attendees:
-            # Convertir string a lista
-            attendees_list = [email.strip() for email in attendees.split(',')]
-            event_body['attendees'] = [{'email': email} for email in attendees_list]
+        event_body = _new_event_body(summary, start, end, attendees, location, description)
         
-        event = service.events().insert(calendarId=calendar_id, body=event_body).execute()
+        event = service.events().insert(
+            calendarId=calendar_id,
+            body=event_body,
+            fields='id,etag,summary'
+        ).execute()
+        _remember_event(calendar_id, event)
         
         return f"Evento creado exitosamente: «{summary}» (ID: {event['id']})"
     except FileNotFoundError as e:
@@ -219,40 +297,47 @@ def update_event(calendar_id: str, event_id: str, summary: str = None, start: st
         Confirmación de la actualización del evento
     """
     try:
-        service = get_calendar_service()
-        
-        # Obtener el evento actual
-        event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
-        
-        # Aplicar los cambios solo si se proporcionan
+        # Solo se envían los campos que cambian (PATCH), sin leer el evento antes
+        patch_body = {}
         if summary is not None:
-            event['summary'] = summary
+            patch_body['summary'] = summary
         
         if start is not None:
-            event['start'] = {'dateTime': start, 'timeZone': 'America/Argentina/Buenos_Aires'}
+            patch_body['start'] = {'dateTime': start, 'timeZone': 'America/Argentina/Buenos_Aires'}
         
         if end is not None:
-            event['end'] = {'dateTime': end, 'timeZone': 'America/Argentina/Buenos_Aires'}
+            patch_body['end'] = {'dateTime': end, 'timeZone': 'America/Argentina/Buenos_Aires'}
         
         if description is not None:
-            event['description'] = description
+            patch_body['description'] = description
         
         if location is not None:
-            event['location'] = location
+            patch_body['location'] = location
         
         if attendees is not None:
             # Convertir string a lista
             attendees_list = [email.strip() for email in attendees.split(',')]
-            event['attendees'] = [{'email': email} for email in attendees_list]
+            patch_body['attendees'] = [{'email': email} for email in attendees_list]
         
-        # Actualizar el evento
-        updated_event = service.events().update(
-            calendarId=calendar_id, 
-            eventId=event_id, 
-            body=event
-        ).execute()
+        if not patch_body:
+            return "❌ No se especificaron cambios para el evento."
+        
+        service = get_calendar_service()
+        request = service.events().patch(
+            calendarId=calendar_id,
+            eventId=event_id,
+            body=patch_body,
+            fields='id,etag,summary'
+        )
+        updated_event = _conditional(request, calendar_id, event_id).execute()
+        _remember_event(calendar_id, updated_event)
         
         return f"Evento actualizado exitosamente: «{updated_event.get('summary', 'Sin título')}»"
+    except HttpError as e:
+        if e.resp.status == 412:
+            _forget_event(calendar_id, event_id)
+            return "❌ El evento cambió desde la última vez que se consultó. Usa get_event para obtener su estado actual y vuelve a intentar."
+        return f"❌ Error al actualizar el evento: {str(e)}"
     except FileNotFoundError as e:
         return f"❌ Google Calendar no está configurado: {str(e)}"
     except Exception as e:
@@ -273,14 +358,23 @@ def delete_event(calendar_id: str, event_id: str) -> str:
     try:
         service = get_calendar_service()
         
-        # Obtener detalles del evento antes de eliminarlo
-        event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
-        event_title = event.get('summary', 'Sin título')
+        # El título sale del caché local: no hace falta leer el evento antes de eliminarlo
+        cached = _cached_event(calendar_id, event_id)
+        event_title = cached['summary'] if cached else event_id
         
-        # Eliminar el evento
-        service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+        request = service.events().delete(calendarId=calendar_id, eventId=event_id)
+        _conditional(request, calendar_id, event_id).execute()
+        _forget_event(calendar_id, event_id)
         
         return f"Evento eliminado exitosamente: «{event_title}»"
+    except HttpError as e:
+        if e.resp.status == 412:
+            _forget_event(calendar_id, event_id)
+            return "❌ El evento cambió desde la última vez que se consultó. Usa get_event para verificarlo antes de eliminarlo."
+        if e.resp.status == 410:
+            _forget_event(calendar_id, event_id)
+            return f"❌ El evento {event_id} ya había sido eliminado."
+        return f"❌ Error al eliminar el evento: {str(e)}"
     except FileNotFoundError as e:
         return f"❌ Google Calendar no está configurado: {str(e)}"
     except Exception as e:
@@ -309,28 +403,176 @@ def search_events(calendar_id: str, query: str, days_back: int = 30, days_forwar
         time_max = (now + timedelta(days=days_forward)).isoformat() + 'Z'
         
         service = get_calendar_service()
-        events_result = service.events().list(
-            calendarId=calendar_id,
-            timeMin=time_min,
-            timeMax=time_max,
-            q=query,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
+        events = _list_events_paginated(service, calendar_id, time_min, time_max, query)
         
         if not events:
             return f"No se encontraron eventos con '{query}' en el rango de búsqueda (desde hace {days_back} días hasta {days_forward} días en el futuro)."
         
         result = f"Eventos encontrados con '{query}' ({len(events)}):\n"
         for event in events:
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            summary = event.get('summary', 'Sin título')
-            result += f"- {summary} ({start}) [ID: {event['id']}]\n"
+            result += _format_event_line(event) + "\n"
         
         return result.strip()
     except FileNotFoundError as e:
         return f"❌ Google Calendar no está configurado: {str(e)}"
     except Exception as e:
         return f"❌ Error al buscar eventos: {str(e)}"
+
+
+@tool
+def search_all_calendars(query: str = None, time_min: str = None, time_max: str = None,
+                         days_back: int = 30, days_forward: int = 365) -> str:
+    """Busca o lista eventos en TODOS los calendarios del usuario en una sola llamada.
+    
+    Args:
+        query: Término de búsqueda opcional (nombre del evento, asistentes, etc.)
+        time_min: Fecha/hora de inicio en formato ISO (opcional, por defecto hoy - days_back)
+        time_max: Fecha/hora de fin en formato ISO (opcional, por defecto hoy + days_forward)
+        days_back: Días hacia atrás desde hoy si no se indica time_min (por defecto 30)
+        days_forward: Días hacia adelante desde hoy si no se indica time_max (por defecto 365)
+        
+    Returns:
+        Eventos de todos los calendarios ordenados por fecha de inicio
+    """
+    try:
+        now = datetime.now(BA)
+        time_min = time_min or (now - timedelta(days=days_back)).isoformat()
+        time_max = time_max or (now + timedelta(days=days_forward)).isoformat()
+        
+        service = get_calendar_service()
+        calendars = []
+        page_token = None
+        while True:
+            response = service.calendarList().list(
+                pageToken=page_token,
+                fields='nextPageToken,items(id,summary)'
+            ).execute()
+            calendars.extend(response.get('items', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        if not calendars:
+            return "No se encontraron calendarios."
+        
+        def fetch(calendar):
+            # Cada hilo construye su propio servicio: los clientes httplib2 no son thread-safe
+            calendar_service = get_calendar_service()
+            events = _list_events_paginated(calendar_service, calendar['id'], time_min, time_max, query)
+            return [(_event_start_key(event), event, calendar.get('summary', calendar['id'])) for event in events]
+        
+        # Cada tarea corre en una copia del contexto: así los hilos ven al usuario actual
+        with ThreadPoolExecutor(max_workers=min(CALENDAR_MAX_CONCURRENCY, len(calendars))) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fetch, calendar) for calendar in calendars]
+        
+        per_calendar = []
+        failed = []
+        for calendar, future in zip(calendars, futures):
+            try:
+                per_calendar.append(future.result())
+            except Exception as e:
+                failed.append(f"{calendar.get('summary', calendar['id'])}: {str(e)}")
+        
+        # Cada lista ya viene ordenada por inicio: se combinan sin reordenar todo
+        merged = list(heapq.merge(*per_calendar, key=lambda item: item[0]))
+        
+        search_info = f" con '{query}'" if query else ""
+        if not merged:
+            result = f"No se encontraron eventos{search_info} en {len(calendars)} calendarios."
+        else:
+            lines = [f"Eventos encontrados{search_info} en {len(calendars)} calendarios ({len(merged)}):"]
+            lines.extend(_format_event_line(event, calendar_name) for _, event, calendar_name in merged)
+            result = "\n".join(lines)
+        
+        if failed:
+            result += "\n⚠️ No se pudieron consultar algunos calendarios:\n" + "\n".join(f"- {f}" for f in failed)
+        
+        return result
+    except FileNotFoundError as e:
+        return f"❌ Google Calendar no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al buscar en todos los calendarios: {str(e)}"
+
+
+# --- IMPLEMENTACIONES ASÍNCRONAS (sin hilos) ---
+
+calendar_api = AsyncGoogleClient('calendar', 'https://www.googleapis.com/calendar/v3/')
+
+
+async def _alist_calendars() -> str:
+    try:
+        calendars = [item async for item in calendar_api.paginate('users/me/calendarList', 'items')]
+        
+        if not calendars:
+            return "No se encontraron calendarios."
+        
+        result = "Calendarios disponibles:\n"
+        for calendar in calendars:
+            result += f"- {calendar['summary']} (ID: {calendar['id']})\n"
+        
+        return result.strip()
+    except FileNotFoundError as e:
+        return f"❌ Google Calendar no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al listar calendarios: {str(e)}"
+
+
+async def _alist_events(calendar_id: str, time_min: str, time_max: str, query: str = None) -> str:
+    try:
+        events = []
+        async for event in calendar_api.paginate(
+            f"calendars/{quote(calendar_id, safe='')}/events",
+            'items',
+            params={
+                'timeMin': time_min,
+                'timeMax': time_max,
+                'q': query,
+                'singleEvents': True,
+                'orderBy': 'startTime',
+                'fields': EVENT_LIST_FIELDS,
+            }
+        ):
+            _remember_event(calendar_id, event)
+            events.append(event)
+        
+        if not events:
+            return f"No se encontraron eventos en el rango especificado{' para la búsqueda: ' + query if query else ''}."
+        
+        result = f"Eventos encontrados ({len(events)}):\n"
+        for event in events:
+            result += _format_event_line(event) + "\n"
+        
+        return result.strip()
+    except FileNotFoundError as e:
+        return f"❌ Google Calendar no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al listar eventos: {str(e)}"
+
+
+async def _acreate_event(calendar_id: str, summary: str, start: str, end: str,
+                         attendees: str = None, location: str = None, description: str = None) -> str:
+    try:
+        event = await calendar_api.request(
+            'POST',
+            f"calendars/{quote(calendar_id, safe='')}/events",
+            params={'fields': 'id,etag,summary'},
+            json_body=_new_event_body(summary, start, end, attendees, location, description)
+        )
+        _remember_event(calendar_id, event)
+        
+        return f"Evento creado exitosamente: «{summary}» (ID: {event['id']})"
+    except FileNotFoundError as e:
+        return f"❌ Google Calendar no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al crear el evento: {str(e)}"
+
+
+list_calendars.coroutine = _alist_calendars
+list_events.coroutine = _alist_events
+create_event.coroutine = _acreate_event
+
+# El resto de las invocaciones asíncronas (ainvoke) corren en el pool de hilos de Calendar
+bind_tools_to_pool('calendar', [
+    list_calendars, list_events, get_event, create_event, update_event,
+    delete_event, search_events, search_all_calendars
+])
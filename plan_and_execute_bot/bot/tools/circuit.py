@@ -0,0 +1,203 @@
+# circuit.py
+"""Circuit breakers por dependencia externa (Gmail, Calendar, Drive, Tasks, OpenWeather).
+
+Tras varias fallas seguidas (timeouts, errores de red, 5xx) el circuito se abre y las
+llamadas a esa dependencia fallan al instante con un resultado "no disponible", en lugar
+de esperar timeouts. Pasado el tiempo de recuperación se deja pasar una sola llamada de
+prueba (half-open): si sale bien el circuito se cierra, si no vuelve a abrirse.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+# Fallas consecutivas que abren el circuito
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Segundos que el circuito queda abierto antes de la llamada de prueba
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+
+# Prefijo de los resultados de dependencias caídas (lo reconocen el grafo y el responder)
+UNAVAILABLE_PREFIX = "⛔ Servicio no disponible"
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito de la dependencia está abierto."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(unavailable_message(name, retry_in))
+        self.name = name
+        self.retry_in = retry_in
+
+
+def unavailable_message(name: str, retry_in: float) -> str:
+    return f"{UNAVAILABLE_PREFIX} ({name}): falla temporal, reintenta en {max(int(retry_in), 1)} segundos."
+
+
+def is_dependency_failure(error: Exception) -> bool:
+    """True si el error indica que la dependencia está caída (y no un error de la petición).
+
+    No cuentan los errores de un solo usuario: cuenta sin vincular o token vencido
+    (FileNotFoundError/PermissionError, RefreshError) y cuota agotada (429), que ya frena el
+    planificador de ratelimit. Si contaran, unos pocos usuarios abrirían el circuito para todos.
+    """
+    if isinstance(error, (FileNotFoundError, PermissionError)):
+        return False
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is not None:
+        return int(status) >= 500
+    # Importados acá para que el grafo pueda consultar los circuitos sin cargar los clientes HTTP
+    import httplib2
+    import httpx
+    from google.auth.exceptions import RefreshError
+    if isinstance(error, RefreshError):
+        return False
+    return isinstance(error, (OSError, TimeoutError, httplib2.HttpLib2Error, httpx.TransportError))
+
+
+class CircuitBreaker:
+    """Circuito closed/open/half-open de una dependencia."""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT):
+        """Inicializar el circuito.
+
+        Args:
+            name: Nombre de la dependencia (gmail, weather, ...)
+            failure_threshold: Fallas consecutivas que abren el circuito
+            recovery_timeout: Segundos abierto antes de probar de nuevo
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.short_circuited = 0
+
+    def _refresh_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def is_open(self) -> bool:
+        """True mientras no se admiten llamadas (abierto, o half-open con la prueba en curso)."""
+        with self._lock:
+            self._refresh_state()
+            return self._state == OPEN or (self._state == HALF_OPEN and self._probe_in_flight)
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow(self) -> bool:
+        """Decide si una llamada puede pasar (en half-open solo la de prueba)."""
+        with self._lock:
+            self._refresh_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def check(self):
+        """Como `allow`, pero lanza CircuitOpenError si la llamada no puede pasar."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"✅ [CIRCUIT] {self.name} respondió de nuevo, circuito cerrado")
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                print(f"⛔ [CIRCUIT] {self.name} abierto tras {self._failures} fallas; "
+                      f"reintento en {int(self.recovery_timeout)}s")
+
+    def release_probe(self):
+        """Libera la llamada de prueba sin registrar resultado (la llamada no llegó a la dependencia)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @contextmanager
+    def protect(self):
+        """Envuelve una llamada a la dependencia: la rechaza si el circuito está abierto y registra el resultado."""
+        self.check()
+        try:
+            yield
+        except Exception as e:
+            if is_dependency_failure(e):
+                self.record_failure()
+            else:
+                # La dependencia respondió (p. ej. un 404): está disponible
+                self.record_success()
+            raise
+        except BaseException:
+            # Cancelación: no dice nada de la dependencia, pero libera la llamada de prueba
+            self.release_probe()
+            raise
+        else:
+            self.record_success()
+
+    def unavailable_message(self) -> str:
+        return unavailable_message(self.name, self.retry_in())
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh_state()
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'trips': self.trips,
+                'short_circuited': self.short_circuited,
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Devuelve (creándolo la primera vez) el circuito de una dependencia."""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(name)
+        if breaker is None:
+            breaker = _BREAKERS[name] = CircuitBreaker(name)
+        return breaker
+
+
+def circuit_metrics() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos los circuitos creados."""
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return {breaker.name: breaker.metrics() for breaker in breakers}
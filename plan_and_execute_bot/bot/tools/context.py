@@ -0,0 +1,25 @@
+# context.py
+"""Usuario de Google de la petición en curso.
+
+Módulo liviano (sin dependencias de Google) para que el ejecutor especializado pueda fijar
+el usuario sin importar las herramientas; `credentials` lo reexporta.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+DEFAULT_USER = 'default'
+
+# Usuario de la petición en curso
+current_user: contextvars.ContextVar[str] = contextvars.ContextVar('google_user', default=DEFAULT_USER)
+
+
+@contextmanager
+def user_context(user_id: Optional[str]):
+    """Fija el usuario de Google para el bloque (None = usuario por defecto)."""
+    token = current_user.set(user_id or DEFAULT_USER)
+    try:
+        yield
+    finally:
+        current_user.reset(token)
@@ -0,0 +1,296 @@
+# credentials.py
+"""Credenciales OAuth de Google por usuario y caché LRU de servicios construidos.
+
+Cada sesión (hash del número de WhatsApp) puede tener sus propios tokens. El usuario
+actual viaja en una ContextVar que fija el ejecutor especializado; los pools de hilos
+copian el contexto, así que las herramientas siempre ven al usuario correcto. Los
+archivos de token históricos (`gmail_token.json`, etc.) son los del usuario por defecto.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from cryptography.fernet import Fernet, InvalidToken
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+
+from .context import DEFAULT_USER, current_user, user_context
+from .ratelimit import rate_limited_request_builder
+
+# Configurar rutas relativas al directorio raíz del proyecto
+_CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/credentials.py
+CREDS_FILE = str(_CURRENT_DIR / 'credentials.json')
+TOKEN_DIR = os.getenv("GOOGLE_TOKEN_DIR", str(_CURRENT_DIR / 'tokens'))
+
+# Clave Fernet para cifrar los tokens en disco (Fernet.generate_key())
+TOKEN_ENCRYPTION_KEY = os.getenv("GOOGLE_TOKEN_ENCRYPTION_KEY")
+# Sin clave, los tokens por usuario solo se guardan si esto es "true" (quedan en texto plano)
+GOOGLE_ALLOW_PLAINTEXT_TOKENS = os.getenv("GOOGLE_ALLOW_PLAINTEXT_TOKENS", "false").lower() == "true"
+# Servicios construidos que se mantienen en memoria (uno por usuario, API e hilo)
+GOOGLE_SERVICE_CACHE_SIZE = int(os.getenv("GOOGLE_SERVICE_CACHE_SIZE", "64"))
+# Si es "true", un usuario sin tokens propios NO usa la cuenta por defecto
+GOOGLE_PER_USER_ONLY = os.getenv("GOOGLE_PER_USER_ONLY", "false").lower() == "true"
+# Margen antes del vencimiento en el que ya se refresca el token
+TOKEN_REFRESH_MARGIN = timedelta(seconds=60)
+
+
+class CredentialManager:
+    """Carga, refresca y guarda tokens OAuth por (usuario, API) y construye los servicios."""
+
+    def __init__(self, token_dir: str = TOKEN_DIR, encryption_key: Optional[str] = TOKEN_ENCRYPTION_KEY,
+                 max_services: int = GOOGLE_SERVICE_CACHE_SIZE,
+                 allow_plaintext: bool = GOOGLE_ALLOW_PLAINTEXT_TOKENS):
+        """Inicializar el gestor.
+
+        Args:
+            token_dir: Carpeta con los tokens de cada usuario
+            encryption_key: Clave Fernet para cifrar los tokens
+            max_services: Máximo de servicios construidos en memoria
+            allow_plaintext: Guardar tokens por usuario sin cifrar cuando no hay clave
+        """
+        self.token_dir = Path(token_dir)
+        self.max_services = max_services
+        self.allow_plaintext = allow_plaintext
+        # api -> {'scopes', 'legacy_token_file', 'service_name', 'version'}
+        self._apis: Dict[str, Dict[str, Any]] = {}
+        self._creds: Dict[Tuple[str, str], Credentials] = {}
+        self._services: "OrderedDict[Tuple[str, str, int], Any]" = OrderedDict()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        self._fernet = Fernet(encryption_key.encode()) if encryption_key else None
+        if self._fernet is None:
+            if allow_plaintext:
+                print("⚠️ [CREDENTIALS] ATENCIÓN: sin GOOGLE_TOKEN_ENCRYPTION_KEY los tokens de cada usuario "
+                      "se guardan SIN CIFRAR (GOOGLE_ALLOW_PLAINTEXT_TOKENS=true)")
+            else:
+                print("⚠️ [CREDENTIALS] ATENCIÓN: sin GOOGLE_TOKEN_ENCRYPTION_KEY no se guardan tokens por usuario; "
+                      "solo funciona la cuenta por defecto")
+
+    def register_api(self, api: str, scopes: List[str], legacy_token_file: str, service_name: str, version: str):
+        """Registra una API de Google (lo hace cada módulo de herramientas al importarse)."""
+        self._apis[api] = {
+            'scopes': scopes,
+            'legacy_token_file': legacy_token_file,
+            'service_name': service_name,
+            'version': version,
+        }
+
+    # --- Almacenamiento ---
+
+    def _token_paths(self, api: str, user: str) -> List[Path]:
+        """Rutas posibles del token; la primera es donde se escribe."""
+        if user == DEFAULT_USER:
+            return [Path(self._apis[api]['legacy_token_file'])]
+        plain = self.token_dir / user / f"{api}_token.json"
+        # Con cifrado activo se siguen leyendo los tokens guardados antes en texto plano
+        return [plain.with_name(plain.name + '.enc'), plain] if self._fernet else [plain]
+
+    def _has_token(self, api: str, user: str) -> bool:
+        return any(path.exists() for path in self._token_paths(api, user))
+
+    def _read_token(self, api: str, user: str) -> Optional[Dict[str, Any]]:
+        path = next((path for path in self._token_paths(api, user) if path.exists()), None)
+        if path is None:
+            return None
+        data = path.read_bytes()
+        if path.suffix == '.enc':
+            try:
+                data = self._fernet.decrypt(data)
+            except InvalidToken:
+                print(f"⚠️ [CREDENTIALS] No se pudo descifrar el token de {api} del usuario {user}")
+                return None
+        return json.loads(data)
+
+    def _write_token(self, api: str, user: str, creds: Credentials):
+        if user != DEFAULT_USER and self._fernet is None and not self.allow_plaintext:
+            raise PermissionError("Los tokens por usuario requieren GOOGLE_TOKEN_ENCRYPTION_KEY "
+                                  "(o GOOGLE_ALLOW_PLAINTEXT_TOKENS=true)")
+        path, *legacy_paths = self._token_paths(api, user)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = creds.to_json().encode('utf-8')
+        if path.suffix == '.enc':
+            data = self._fernet.encrypt(data)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+        for legacy_path in legacy_paths:
+            legacy_path.unlink(missing_ok=True)
+
+    def store_credentials(self, api: str, user: str, creds: Credentials):
+        """Guarda (cifradas si hay clave) las credenciales de un usuario."""
+        with self._key_lock(api, user):
+            self._write_token(api, user, creds)
+            self._creds[(api, user)] = creds
+
+    # --- Credenciales ---
+
+    def _key_lock(self, api: str, user: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault((api, user), threading.Lock())
+
+    def effective_user(self, api: str, user: Optional[str] = None) -> str:
+        """Usuario cuyos tokens se usan (el propio o, si no tiene, el por defecto).
+
+        Los cachés e índices locales se separan por este usuario, no por la sesión.
+        """
+        user = user or current_user.get()
+        if user == DEFAULT_USER or (api, user) in self._creds or self._has_token(api, user):
+            return user
+        if GOOGLE_PER_USER_ONLY:
+            raise FileNotFoundError(f"Tu cuenta de Google no está vinculada para {api}.")
+        return DEFAULT_USER
+
+    def is_linked(self, api: str, user: Optional[str] = None) -> bool:
+        """True si el usuario ya tiene un token de la API (consultarlo nunca dispara el flujo OAuth)."""
+        user = user or current_user.get()
+        return (api, user) in self._creds or self._has_token(api, user)
+
+    @staticmethod
+    def _is_fresh(creds: Credentials) -> bool:
+        if not creds.token:
+            return False
+        return creds.expiry is None or datetime.utcnow() + TOKEN_REFRESH_MARGIN < creds.expiry
+
+    def cached_credentials(self, api: str, user: Optional[str] = None) -> Optional[Credentials]:
+        """Credenciales ya cargadas y vigentes, sin tocar disco ni red (o None)."""
+        creds = self._creds.get((api, self.effective_user(api, user)))
+        return creds if creds is not None and self._is_fresh(creds) else None
+
+    def get_credentials(self, api: str, user: Optional[str] = None, force_refresh: bool = False,
+                        stale_token: Optional[str] = None) -> Credentials:
+        """Credenciales vigentes del usuario.
+
+        El refresco es single-flight: con muchas llamadas concurrentes del mismo usuario,
+        solo una refresca y las demás reutilizan el token nuevo.
+        """
+        user = self.effective_user(api, user)
+        key = (api, user)
+        creds = self._creds.get(key)
+        if creds is not None and not force_refresh and self._is_fresh(creds):
+            return creds
+
+        with self._key_lock(api, user):
+            creds = self._creds.get(key)
+            if creds is None:
+                creds = self._load(api, user)
+            # Otro hilo ya lo refrescó mientras esperábamos
+            if force_refresh and stale_token is not None and creds.token != stale_token:
+                return creds
+            if force_refresh or not self._is_fresh(creds):
+                if creds.refresh_token:
+                    creds.refresh(Request())
+                    print(f"🔑 [CREDENTIALS] Token de {api} refrescado (usuario {user[:8]})")
+                elif user == DEFAULT_USER:
+                    creds = self._run_oauth_flow(api)
+                else:
+                    raise FileNotFoundError(f"El token de {api} venció y no tiene refresh token; vuelve a vincular la cuenta.")
+                self._write_token(api, user, creds)
+            self._creds[key] = creds
+            return creds
+
+    def _load(self, api: str, user: str) -> Credentials:
+        info = self._read_token(api, user)
+        if info is not None:
+            return Credentials.from_authorized_user_info(info, self._apis[api]['scopes'])
+        if user != DEFAULT_USER:
+            raise FileNotFoundError(f"Tu cuenta de Google no está vinculada para {api}.")
+        creds = self._run_oauth_flow(api)
+        self._write_token(api, user, creds)
+        return creds
+
+    def _run_oauth_flow(self, api: str) -> Credentials:
+        """Flujo OAuth interactivo (solo para el usuario por defecto, como antes)."""
+        if not Path(CREDS_FILE).exists():
+            raise FileNotFoundError(f"No se encontró el archivo {CREDS_FILE}. Por favor, configura las credenciales de Google.")
+        flow = InstalledAppFlow.from_client_secrets_file(CREDS_FILE, self._apis[api]['scopes'])
+        return flow.run_local_server(port=0)
+
+    def authorize_user(self, api: str, user: str) -> Credentials:
+        """Vincula la cuenta de Google de un usuario ejecutando el flujo OAuth y guardando su token.
+
+        Usa `run_local_server`: abre el navegador en la máquina del servidor, así que solo sirve para
+        vincular cuentas a mano desde una consola local (no hay flujo por redirección web).
+        """
+        creds = self._run_oauth_flow(api)
+        self.store_credentials(api, user, creds)
+        return creds
+
+    # --- Servicios ---
+
+    def get_service(self, api: str, user: Optional[str] = None):
+        """Servicio de googleapiclient del usuario para el hilo actual (httplib2 no es thread-safe)."""
+        user = self.effective_user(api, user)
+        # Asegura un token vigente; el servicio comparte el mismo objeto Credentials
+        creds = self.get_credentials(api, user)
+        key = (user, api, threading.get_ident())
+        with self._lock:
+            service = self._services.get(key)
+            if service is not None:
+                self._services.move_to_end(key)
+                return service
+
+        config = self._apis[api]
+        # Cada execute() del servicio respeta la cuota del usuario y reintenta ante 429/5xx
+        request_builder = rate_limited_request_builder(api, lambda: user)
+        service = build(config['service_name'], config['version'], credentials=creds, cache_discovery=False,
+                        requestBuilder=request_builder)
+        with self._lock:
+            self._services[key] = service
+            while len(self._services) > self.max_services:
+                self._services.popitem(last=False)
+        return service
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'credentials_loaded': len(self._creds),
+                'services_cached': len(self._services),
+                'max_services': self.max_services,
+            }
+
+
+# Instancia global del gestor de credenciales
+credential_manager = CredentialManager()
+
+
+def user_scoped_path(path: str, user: str) -> str:
+    """Archivo propio de un usuario: 'drive_index.json' -> 'drive_index.<usuario>.json' (igual para el por defecto)."""
+    if user == DEFAULT_USER:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.{user}{ext}"
+
+
+class UserScoped:
+    """Proxy que delega en una instancia distinta por usuario efectivo de la API.
+
+    Permite que singletons de módulo como `drive_index` sigan usándose igual, pero
+    sin mezclar los datos de distintas cuentas de Google.
+    """
+
+    def __init__(self, api: str, factory):
+        self._api = api
+        self._factory = factory
+        self._instances: Dict[str, Any] = {}
+        self._instances_lock = threading.Lock()
+
+    def for_user(self, user: Optional[str] = None):
+        user = credential_manager.effective_user(self._api, user)
+        with self._instances_lock:
+            instance = self._instances.get(user)
+            if instance is None:
+                instance = self._instances[user] = self._factory(user)
+            return instance
+
+    def __getattr__(self, name):
+        return getattr(self.for_user(), name)
@@ -1,14 +1,26 @@
 # drive.py
 
 import io
+import os
 import base64
+import contextvars
+import hashlib
+import mimetypes
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload, MediaIoBaseUpload
+from urllib.parse import quote
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from langchain.tools import tool
+from .drive_index import drive_index, FOLDER_MIME_TYPE
+from .drive_content_index import DRIVE_CONTENT_REFRESH_BUDGET, drive_content_index
+from .google_async import AsyncGoogleClient
+from .credentials import credential_manager
+from .pools import bind_tools_to_pool, run_in_pool
+from .ratelimit import call_with_retries
 
 # --- CONFIGURACIÓN OAuth ---
 SCOPES = [
@@ -18,24 +30,208 @@ SCOPES = [
 
 # Configurar rutas relativas al directorio raíz del proyecto
 _CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/drive.py
-CREDS_FILE = str(_CURRENT_DIR / 'credentials.json')
 TOKEN_FILE = str(_CURRENT_DIR / 'drive_token.json')
 
+credential_manager.register_api('drive', SCOPES, TOKEN_FILE, 'drive', 'v3')
+
+FILE_METADATA_FIELDS = 'id,name,mimeType,size,createdTime,modifiedTime,parents,owners,shared'
+
+# --- DESCARGAS ---
+# Carpeta de las descargas. Es propia (no el directorio actual) porque también limita qué
+# archivos locales se pueden subir: el directorio del proyecto tiene los tokens OAuth
+DRIVE_DOWNLOAD_DIR = os.getenv("DRIVE_DOWNLOAD_DIR", "drive_downloads")
+# Tamaño de cada rango pedido a la API; la memoria usada no depende del tamaño del archivo
+DRIVE_DOWNLOAD_CHUNK_SIZE = int(os.getenv("DRIVE_DOWNLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# Descargas simultáneas permitidas en el proceso
+DRIVE_MAX_CONCURRENT_DOWNLOADS = int(os.getenv("DRIVE_MAX_CONCURRENT_DOWNLOADS", "2"))
+
+_DOWNLOAD_SLOTS = threading.BoundedSemaphore(DRIVE_MAX_CONCURRENT_DOWNLOADS)
+
+# --- SUBIDAS ---
+# Tamaño de cada fragmento de la subida reanudable (múltiplo de 256 KB, como exige la API)
+DRIVE_UPLOAD_CHUNK_SIZE = int(os.getenv("DRIVE_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# Archivos subidos en paralelo por upload_local_files
+DRIVE_MAX_CONCURRENT_UPLOADS = int(os.getenv("DRIVE_MAX_CONCURRENT_UPLOADS", "3"))
+# Adjuntos de WhatsApp (la misma variable que usa server/config.py)
+MEDIA_DIR = os.getenv("MEDIA_DIR", os.path.join(tempfile.gettempdir(), "whatsapp_media"))
+# Cómo ve el modelo un adjunto: 'media:<sha256>' (ver server/media.py)
+_MEDIA_ID = re.compile(r'^media:([0-9a-f]{64})$')
+
 
 def get_drive_service():
-    """Inicializa y devuelve el servicio de Google Drive."""
-    creds = None
-    if Path(TOKEN_FILE).exists():
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, 'w', encoding='utf-8') as token:
-            token.write(creds.to_json())
-    return build('drive', 'v3', credentials=creds)
+    """Devuelve el servicio de Google Drive del usuario actual para este hilo (httplib2 no es thread-safe)."""
+    try:
+        return credential_manager.get_service('drive')
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error al configurar Google Drive: {str(e)}")
+
+
+def _content_range_total(content_range: str):
+    """Extrae el tamaño total de un encabezado 'bytes 0-99/1234' (None si no se conoce)."""
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def _stream_to_file(request, part_path: Path, chunk_size: int) -> int:
+    """Descarga `request` por rangos de bytes y los agrega a `part_path`.
+    
+    Si `part_path` ya existe (descarga interrumpida), se continúa desde su tamaño actual.
+    Cada rango pasa por el planificador de cuotas de Drive (no usa `execute()`).
+    Devuelve la cantidad total de bytes escritos en el archivo.
+    """
+    user = credential_manager.effective_user('drive')
+    offset = part_path.stat().st_size if part_path.exists() else 0
+
+    def fetch_range(headers):
+        resp, content = request.http.request(request.uri, method='GET', headers=headers)
+        if resp.status not in (200, 206, 416):
+            raise HttpError(resp, content, uri=request.uri)
+        return resp, content
+
+    with open(part_path, 'ab') as fh:
+        while True:
+            headers = dict(request.headers)
+            headers['range'] = f'bytes={offset}-{offset + chunk_size - 1}'
+            resp, content = call_with_retries('drive', user, lambda: fetch_range(headers))
+            if resp.status == 416:
+                # Rango fuera del archivo: el parcial ya estaba completo
+                return offset
+            if resp.status == 200 and offset:
+                # El servidor ignoró el rango (p. ej. exportaciones): se reescribe desde cero
+                fh.seek(0)
+                fh.truncate()
+                offset = 0
+            fh.write(content)
+            offset += len(content)
+            total = _content_range_total(resp.get('content-range'))
+            if resp.status == 200 or total is None or offset >= total:
+                return offset
+
+
+def _md5_of_file(path: Path, chunk_size: int) -> str:
+    """Calcula el MD5 de un archivo leyéndolo por bloques."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _confined_path(file_path: str, roots) -> Path:
+    """Resuelve `file_path` (symlinks y '..' incluidos) y exige que quede dentro de alguna de `roots`."""
+    path = Path(file_path).resolve()
+    for root in roots:
+        root = Path(root).resolve()
+        if path == root or root in path.parents:
+            return path
+    raise PermissionError(f"La ruta '{file_path}' está fuera de las carpetas permitidas")
+
+
+def _local_file(file_ref: str) -> Path:
+    """Archivo local de un adjunto ('media:<sha256>') o de una ruta dentro de las carpetas permitidas."""
+    match = _MEDIA_ID.match(file_ref.strip())
+    if match is None:
+        return _confined_path(file_ref, (MEDIA_DIR, DRIVE_DOWNLOAD_DIR))
+    sha256 = match.group(1)
+    found = sorted(Path(MEDIA_DIR, sha256[:2]).glob(f"{sha256}*"))
+    if not found:
+        raise FileNotFoundError(f"No existe el adjunto '{file_ref}' (puede haber vencido)")
+    return found[0]
+
+
+def _upload_path(service, file_path: str, parent_folder_id: str = None,
+                 file_name: str = None, mime_type: str = None) -> dict:
+    """Sube un archivo local por fragmentos reanudables sin cargarlo entero en memoria.
+
+    Solo se suben adjuntos recibidos (por su ID 'media:<sha256>') o archivos de las descargas
+    de Drive (DRIVE_DOWNLOAD_DIR): el modelo no puede elegir cualquier archivo del servidor.
+    """
+    path = _local_file(file_path)
+    if not path.is_file():
+        raise FileNotFoundError(f"No existe el archivo local '{file_path}'")
+    
+    name = file_name or path.name
+    mime_type = mime_type or mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    metadata = {'name': name}
+    if parent_folder_id:
+        metadata['parents'] = [parent_folder_id]
+    
+    media = MediaFileUpload(str(path), mimetype=mime_type, chunksize=DRIVE_UPLOAD_CHUNK_SIZE, resumable=True)
+    request = service.files().create(
+        body=metadata,
+        media_body=media,
+        fields='id,name,mimeType,parents,modifiedTime,md5Checksum'
+    )
+    
+    # Los fragmentos no usan `execute()`: cada uno pasa por el planificador de cuotas de Drive
+    user = credential_manager.effective_user('drive')
+    response = None
+    while response is None:
+        status, response = call_with_retries('drive', user, request.next_chunk)
+        if status:
+            print(f"📁 [DRIVE] Subiendo '{name}': {int(status.progress() * 100)}%")
+    print(f"📁 [DRIVE] Subida completa: '{name}'")
+    drive_index.upsert(response)
+    return response
+
+
+def _resolve_ref(service, ref: str) -> str:
+    """Acepta un ID de Drive o una ruta de carpetas ('/Trabajo/Informes') y devuelve el ID."""
+    if '/' not in ref:
+        return ref
+    drive_index.sync(service)
+    file_id = drive_index.resolve_path(ref)
+    if not file_id:
+        raise FileNotFoundError(f"No se encontró la ruta '{ref}' en Drive")
+    return file_id
+
+
+def _format_index_entry(item: dict) -> str:
+    """Formatea una entrada del índice local en una línea."""
+    file_type = "📁" if item['mimeType'] == FOLDER_MIME_TYPE else "📄"
+    modified = (item.get('modifiedTime') or 'N/A')[:10]
+    path = drive_index.path_of(item['id']) or item['name']
+    return f"{file_type} **{item['name']}** (ID: {item['id']}) - Ruta: {path}, Modificado: {modified}"
+
+
+def _search_params(query: str, page_size: int) -> dict:
+    """Parámetros de files.list para search_files."""
+    return {
+        'q': f"name contains '{query}' or fullText contains '{query}'",
+        'spaces': 'drive',
+        'fields': 'files(id,name,mimeType,parents,modifiedTime,size)',
+        'pageSize': min(page_size, 50)  # Limitar a máximo 50
+    }
+
+
+def _format_search_results(query: str, files: list) -> str:
+    """Respuesta de search_files."""
+    file_list = [f"🔍 Resultados de búsqueda para '{query}' ({len(files)} encontrados):\n"]
+    for file in files:
+        file_type = "📁" if file['mimeType'] == FOLDER_MIME_TYPE else "📄"
+        modified = file.get('modifiedTime', 'N/A')[:10]
+        size = file.get('size', 'N/A')
+        file_list.append(f"{file_type} **{file['name']}** (ID: {file['id']}) - Tamaño: {size}, Modificado: {modified}")
+    return "\n".join(file_list)
+
+
+def _format_file_metadata(file_metadata: dict) -> str:
+    """Respuesta de get_file_metadata."""
+    metadata_info = [
+        f"📄 **Metadatos del archivo:**\n",
+        f"• **Nombre:** {file_metadata.get('name', 'N/A')}",
+        f"• **ID:** {file_metadata.get('id', 'N/A')}",
+        f"• **Tipo MIME:** {file_metadata.get('mimeType', 'N/A')}",
+        f"• **Tamaño:** {file_metadata.get('size', 'N/A')} bytes",
+        f"• **Creado:** {file_metadata.get('createdTime', 'N/A')[:19]}",
+        f"• **Modificado:** {file_metadata.get('modifiedTime', 'N/A')[:19]}",
+        f"• **Compartido:** {'Sí' if file_metadata.get('shared', False) else 'No'}"
+    ]
+    return "\n".join(metadata_info)
 
 
 @tool
@@ -52,29 +248,14 @@ def search_files(query: str, page_size: int = 10) -> str:
     try:
         service = get_drive_service()
         
-        # Construir query de búsqueda
-        search_query = f"name contains '{query}' or fullText contains '{query}'"
-        
-        results = service.files().list(
-            q=search_query,
-            spaces='drive',
-            fields='files(id,name,mimeType,parents,modifiedTime,size)',
-            pageSize=min(page_size, 50)  # Limitar a máximo 50
-        ).execute()
+        results = service.files().list(**_search_params(query, page_size)).execute()
         
         files = results.get('files', [])
         
         if not files:
             return f"🔍 No se encontraron archivos que coincidan con '{query}'"
         
-        file_list = [f"🔍 Resultados de búsqueda para '{query}' ({len(files)} encontrados):\n"]
-        for file in files:
-            file_type = "📁" if file['mimeType'] == 'application/vnd.google-apps.folder' else "📄"
-            modified = file.get('modifiedTime', 'N/A')[:10]
-            size = file.get('size', 'N/A')
-            file_list.append(f"{file_type} **{file['name']}** (ID: {file['id']}) - Tamaño: {size}, Modificado: {modified}")
-        
-        return "\n".join(file_list)
+        return _format_search_results(query, files)
     except Exception as e:
         return f"❌ Error al buscar archivos: {str(e)}"
 
@@ -84,57 +265,51 @@ def get_file_metadata(file_id: str) -> str:
     """Devuelve metadatos de un archivo (tamaño, mime-type, etc.).
     
     Args:
-        file_id: ID del archivo en Google Drive
+        file_id: ID del archivo en Google Drive o su ruta de carpetas (ej: '/Trabajo/informe.pdf')
         
     Returns:
         Metadatos detallados del archivo
     """
     try:
         service = get_drive_service()
+        file_id = _resolve_ref(service, file_id)
         
-        file_metadata = service.files().get(
-            fileId=file_id,
-            fields='id,name,mimeType,size,createdTime,modifiedTime,parents,owners,shared'
-        ).execute()
+        file_metadata = service.files().get(fileId=file_id, fields=FILE_METADATA_FIELDS).execute()
         
-        metadata_info = [
-            f"📄 **Metadatos del archivo:**\n",
-            f"• **Nombre:** {file_metadata.get('name', 'N/A')}",
-            f"• **ID:** {file_metadata.get('id', 'N/A')}",
-            f"• **Tipo MIME:** {file_metadata.get('mimeType', 'N/A')}",
-            f"• **Tamaño:** {file_metadata.get('size', 'N/A')} bytes",
-            f"• **Creado:** {file_metadata.get('createdTime', 'N/A')[:19]}",
-            f"• **Modificado:** {file_metadata.get('modifiedTime', 'N/A')[:19]}",
-            f"• **Compartido:** {'Sí' if file_metadata.get('shared', False) else 'No'}"
-        ]
-        
-        return "\n".join(metadata_info)
+        return _format_file_metadata(file_metadata)
     except Exception as e:
         return f"❌ Error al obtener metadatos del archivo: {str(e)}"
 
 
 @tool
-def download_file(file_id: str, export_mime_type: str = None) -> str:
-    """Descarga el contenido de un archivo.
+def download_file(file_id: str, export_mime_type: str = None, destination_path: str = None) -> str:
+    """Descarga el contenido de un archivo directamente a disco.
     
     Args:
-        file_id: ID del archivo en Google Drive
+        file_id: ID del archivo en Google Drive o su ruta de carpetas
         export_mime_type: Tipo MIME para exportar archivos de Google (opcional)
+        destination_path: Ruta de destino dentro de DRIVE_DOWNLOAD_DIR (opcional, por defecto <nombre>)
         
     Returns:
         Confirmación de descarga con información del archivo
     """
     try:
         service = get_drive_service()
+        file_id = _resolve_ref(service, file_id)
         
         # Obtener metadatos del archivo
-        file_metadata = service.files().get(fileId=file_id, fields='name,mimeType').execute()
+        file_metadata = service.files().get(
+            fileId=file_id,
+            fields='name,mimeType,size,md5Checksum,modifiedTime'
+        ).execute()
         file_name = file_metadata.get('name')
         mime_type = file_metadata.get('mimeType')
+        expected_md5 = file_metadata.get('md5Checksum')
         
         # Determinar si necesita exportación
         if mime_type.startswith('application/vnd.google-apps'):
-            # Archivo nativo de Google - necesita exportación
+            # Archivo nativo de Google - necesita exportación. La API no acepta rangos al exportar
+            # y limita la exportación a 10 MB: esa respuesta se recibe entera en memoria
             if not export_mime_type:
                 export_mime_type = 'text/plain'  # Por defecto
             request = service.files().export_media(fileId=file_id, mimeType=export_mime_type)
@@ -143,21 +318,35 @@ def download_file(file_id: str, export_mime_type: str = None) -> str:
         else:
             # Archivo regular
             request = service.files().get_media(fileId=file_id)
+            export_mime_type = None
             local_filename = file_name
         
-        # Descargar el archivo
-        buffer = io.BytesIO()
-        downloader = MediaIoBaseDownload(buffer, request)
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
+        # Siempre dentro de la carpeta de descargas (el nombre en Drive también puede traer '/' o '..')
+        local_path = _confined_path(Path(DRIVE_DOWNLOAD_DIR) / (destination_path or local_filename),
+                                    (DRIVE_DOWNLOAD_DIR,))
+        local_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Guardar archivo localmente
-        buffer.seek(0)
-        with open(local_filename, 'wb') as f:
-            f.write(buffer.read())
+        # El parcial queda atado a la versión del archivo y al formato de exportación: si cambia
+        # alguno no se mezcla con el anterior
+        version_key = f"{file_id}:{file_metadata.get('modifiedTime')}:{export_mime_type or ''}"
+        version = hashlib.sha1(version_key.encode()).hexdigest()[:10]
+        part_path = local_path.with_name(f"{local_path.name}.{version}.part")
         
-        return f"✅ Archivo '{file_name}' descargado exitosamente como '{local_filename}'"
+        with _DOWNLOAD_SLOTS:
+            resumed_from = part_path.stat().st_size if part_path.exists() else 0
+            size = _stream_to_file(request, part_path, DRIVE_DOWNLOAD_CHUNK_SIZE)
+        
+        if expected_md5:
+            actual_md5 = _md5_of_file(part_path, DRIVE_DOWNLOAD_CHUNK_SIZE)
+            if actual_md5 != expected_md5:
+                part_path.unlink()
+                return f"❌ Error al descargar el archivo: el checksum no coincide (esperado {expected_md5}, obtenido {actual_md5})"
+        
+        os.replace(part_path, local_path)
+        
+        resume_info = f", reanudada desde el byte {resumed_from}" if resumed_from else ""
+        checksum_info = ", checksum MD5 verificado" if expected_md5 else ""
+        return f"✅ Archivo '{file_name}' descargado exitosamente como '{local_path}' ({size} bytes{resume_info}{checksum_info})"
     except Exception as e:
         return f"❌ Error al descargar el archivo: {str(e)}"
 
@@ -197,40 +386,107 @@ def upload_file(name: str, mime_type: str, data: str, parent_folder_id: str = No
         file_result = service.files().create(
             body=metadata,
             media_body=media,
-            fields='id,name,mimeType'
+            fields='id,name,mimeType,parents,modifiedTime,md5Checksum'
         ).execute()
+        drive_index.upsert(file_result)
+        
+        return f"✅ Archivo '{file_result['name']}' subido exitosamente (ID: {file_result['id']})"
+    except Exception as e:
+        return f"❌ Error al subir el archivo: {str(e)}"
+
+
+@tool
+def upload_local_file(file_path: str, parent_folder_id: str = None, file_name: str = None,
+                      mime_type: str = None) -> str:
+    """Sube a Drive un archivo que ya está en disco (p. ej. una imagen recibida por WhatsApp).
+    
+    Args:
+        file_path: ID de un adjunto recibido ('media:<sha256>') o ruta de un archivo descargado de Drive
+        parent_folder_id: ID de la carpeta padre (opcional)
+        file_name: Nombre a usar en Drive (opcional, por defecto el nombre del archivo local)
+        mime_type: Tipo MIME (opcional, se deduce de la extensión)
         
+    Returns:
+        Confirmación de la subida del archivo
+    """
+    try:
+        service = get_drive_service()
+        file_result = _upload_path(service, file_path, parent_folder_id, file_name, mime_type)
         return f"✅ Archivo '{file_result['name']}' subido exitosamente (ID: {file_result['id']})"
     except Exception as e:
         return f"❌ Error al subir el archivo: {str(e)}"
 
 
+@tool
+def upload_local_files(file_paths: str, parent_folder_id: str = None) -> str:
+    """Sube varios archivos locales a Drive en paralelo.
+    
+    Args:
+        file_paths: IDs de adjuntos ('media:<sha256>') o rutas de archivos descargados, separados por comas
+        parent_folder_id: ID de la carpeta padre (opcional)
+        
+    Returns:
+        Resultado de la subida de cada archivo
+    """
+    paths = [path.strip() for path in file_paths.split(',') if path.strip()]
+    if not paths:
+        return "❌ No se indicaron archivos para subir"
+    
+    def upload(path):
+        # Un servicio por hilo: los clientes httplib2 no son thread-safe
+        return _upload_path(get_drive_service(), path, parent_folder_id)
+    
+    # Cada tarea corre en una copia del contexto: así los hilos ven al usuario actual
+    with ThreadPoolExecutor(max_workers=min(DRIVE_MAX_CONCURRENT_UPLOADS, len(paths))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, upload, path) for path in paths]
+    
+    lines = []
+    uploaded = 0
+    for path, future in zip(paths, futures):
+        try:
+            file_result = future.result()
+            uploaded += 1
+            lines.append(f"✅ '{file_result['name']}' subido exitosamente (ID: {file_result['id']})")
+        except Exception as e:
+            lines.append(f"❌ Error al subir '{path}': {str(e)}")
+    
+    return f"📁 Subidos {uploaded}/{len(paths)} archivos:\n" + "\n".join(lines)
+
+
 @tool
 def move_file(file_id: str, new_parent_id: str) -> str:
     """Cambia de carpeta o reubica un archivo.
     
     Args:
-        file_id: ID del archivo a mover
-        new_parent_id: ID de la nueva carpeta padre
+        file_id: ID del archivo a mover o su ruta de carpetas (ej: '/Borradores/informe.pdf')
+        new_parent_id: ID de la nueva carpeta padre o su ruta (ej: '/Trabajo/Informes')
         
     Returns:
         Confirmación del movimiento del archivo
     """
     try:
         service = get_drive_service()
+        file_id = _resolve_ref(service, file_id)
+        new_parent_id = _resolve_ref(service, new_parent_id)
         
-        # Obtener los padres actuales
-        file_metadata = service.files().get(fileId=file_id, fields='parents,name').execute()
-        current_parents = file_metadata.get('parents', [])
-        file_name = file_metadata.get('name')
+        # Los padres actuales salen del índice local si el archivo ya está indexado
+        indexed = drive_index.get(file_id)
+        if indexed:
+            current_parents = indexed.get('parents', [])
+            file_name = indexed.get('name')
+        else:
+            file_metadata = service.files().get(fileId=file_id, fields='parents,name').execute()
+            current_parents = file_metadata.get('parents', [])
+            file_name = file_metadata.get('name')
         
         # Mover el archivo
-        service.files().update(
+        moved = service.files().update(
             fileId=file_id,
             addParents=new_parent_id,
             removeParents=','.join(current_parents),
-            fields='id,parents'
+            fields='id,name,parents,mimeType,modifiedTime'
         ).execute()
+        drive_index.upsert(moved)
         
         return f"✅ Archivo '{file_name}' movido exitosamente a la nueva ubicación (ID: {file_id})"
     except Exception as e:
@@ -242,7 +498,7 @@ def delete_file(file_id: str, permanent: bool = False) -> str:
     """Envía un archivo a la papelera o lo elimina permanentemente.
     
     Args:
-        file_id: ID del archivo a eliminar
+        file_id: ID del archivo a eliminar o su ruta de carpetas
         permanent: Si es True, elimina permanentemente; si es False, envía a papelera
         
     Returns:
@@ -250,10 +506,15 @@ def delete_file(file_id: str, permanent: bool = False) -> str:
     """
     try:
         service = get_drive_service()
+        file_id = _resolve_ref(service, file_id)
         
-        # Obtener nombre del archivo antes de eliminarlo
-        file_metadata = service.files().get(fileId=file_id, fields='name').execute()
-        file_name = file_metadata.get('name')
+        # Obtener nombre del archivo antes de eliminarlo (del índice si está disponible)
+        indexed = drive_index.get(file_id)
+        if indexed:
+            file_name = indexed.get('name')
+        else:
+            file_metadata = service.files().get(fileId=file_id, fields='name').execute()
+            file_name = file_metadata.get('name')
         
         if permanent:
             # Eliminación permanente
@@ -263,10 +524,134 @@ def delete_file(file_id: str, permanent: bool = False) -> str:
             # Enviar a papelera
             service.files().update(fileId=file_id, body={'trashed': True}).execute()
             action = "enviado a la papelera"
+        drive_index.remove(file_id)
         
         return f"✅ Archivo '{file_name}' {action} exitosamente"
     except Exception as e:
         return f"❌ Error al eliminar el archivo: {str(e)}"
 
 
+@tool
+def find_files(query: str, max_results: int = 10) -> str:
+    """Busca archivos y carpetas por nombre en el índice local de Drive (instantáneo).
+    
+    Args:
+        query: Nombre o comienzo del nombre del archivo/carpeta
+        max_results: Número máximo de resultados (opcional, por defecto 10)
+        
+    Returns:
+        Archivos que coinciden, con su ID y ruta de carpetas
+    """
+    try:
+        drive_index.sync(get_drive_service())
+        matches = drive_index.search(query, limit=min(max_results, 50))
+        
+        if not matches:
+            return f"🔍 No se encontraron archivos con nombre '{query}' en el índice de Drive"
+        
+        lines = [f"🔍 Archivos con nombre '{query}' ({len(matches)} encontrados):\n"]
+        lines.extend(_format_index_entry(item) for item in matches)
+        return "\n".join(lines)
+    except Exception as e:
+        return f"❌ Error al buscar en el índice de Drive: {str(e)}"
+
+
+@tool
+def resolve_drive_path(path_or_id: str) -> str:
+    """Convierte una ruta de carpetas en ID de Drive, o un ID en su ruta.
+    
+    Args:
+        path_or_id: Ruta (ej: '/Trabajo/Informes/q1.pdf') o ID de archivo
+        
+    Returns:
+        ID y ruta del archivo o carpeta
+    """
+    try:
+        drive_index.sync(get_drive_service())
+        if '/' in path_or_id:
+            file_id = drive_index.resolve_path(path_or_id)
+            if not file_id:
+                return f"❌ No se encontró la ruta '{path_or_id}' en Drive"
+        else:
+            file_id = path_or_id
+        
+        item = drive_index.get(file_id)
+        if not item:
+            return f"❌ El archivo {file_id} no está en el índice de Drive"
+        return _format_index_entry(item)
+    except Exception as e:
+        return f"❌ Error al resolver la ruta en Drive: {str(e)}"
+
+
+@tool
+def search_drive_content(query: str, max_results: int = 5) -> str:
+    """Busca documentos de Drive por su CONTENIDO (ej: "el doc donde hablamos del presupuesto").
+    
+    Args:
+        query: Palabras o frase a buscar dentro de los documentos
+        max_results: Número máximo de resultados (opcional, por defecto 5)
+        
+    Returns:
+        Documentos más relevantes ordenados por puntaje BM25, con un extracto
+    """
+    try:
+        # Unos segundos de indexación acá; lo que falte sigue en segundo plano
+        if drive_content_index.is_refreshing():
+            pending_note = " (el índice se está actualizando)"
+        else:
+            remaining = drive_content_index.refresh(get_drive_service(), time_budget=DRIVE_CONTENT_REFRESH_BUDGET)
+            if remaining:
+                drive_content_index.refresh_in_background()
+            pending_note = f" ({remaining} documentos aún indexándose)" if remaining else ""
+        matches = drive_content_index.search(query, limit=min(max_results, 20))
+        
+        if not matches:
+            return f"🔍 No se encontraron documentos cuyo contenido coincida con '{query}'{pending_note}"
+        
+        lines = [f"🔍 Documentos relacionados con '{query}' ({len(matches)} encontrados){pending_note}:\n"]
+        for match in matches:
+            path = drive_index.path_of(match['id']) or match['name']
+            lines.append(f"📄 **{match['name']}** (ID: {match['id']}) - Ruta: {path}, Relevancia: {match['score']:.2f}")
+            lines.append(f"   «{match['preview']}»")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"❌ Error al buscar en el contenido de Drive: {str(e)}"
+
+
+# --- IMPLEMENTACIONES ASÍNCRONAS (sin hilos) ---
+
+drive_api = AsyncGoogleClient('drive', 'https://www.googleapis.com/drive/v3/')
+
+
+async def _asearch_files(query: str, page_size: int = 10) -> str:
+    try:
+        results = await drive_api.get('files', **_search_params(query, page_size))
+        files = results.get('files', [])
+        
+        if not files:
+            return f"🔍 No se encontraron archivos que coincidan con '{query}'"
+        
+        return _format_search_results(query, files)
+    except Exception as e:
+        return f"❌ Error al buscar archivos: {str(e)}"
+
+
+async def _aget_file_metadata(file_id: str) -> str:
+    try:
+        if '/' in file_id:
+            # Las rutas se resuelven con el índice local, que se sincroniza con el cliente síncrono
+            file_id = await run_in_pool('drive', lambda: _resolve_ref(get_drive_service(), file_id))
+        file_metadata = await drive_api.get(f"files/{quote(file_id, safe='')}", fields=FILE_METADATA_FIELDS)
+        return _format_file_metadata(file_metadata)
+    except Exception as e:
+        return f"❌ Error al obtener metadatos del archivo: {str(e)}"
+
+
+search_files.coroutine = _asearch_files
+get_file_metadata.coroutine = _aget_file_metadata
 
+# El resto de las invocaciones asíncronas (ainvoke) corren en el pool de hilos de Drive
+bind_tools_to_pool('drive', [
+    search_files, get_file_metadata, download_file, upload_file, upload_local_file, upload_local_files,
+    move_file, delete_file, find_files, resolve_drive_path, search_drive_content
+])
@@ -0,0 +1,276 @@
+# drive_content_index.py
+"""Índice invertido local (BM25) sobre el texto de los documentos de Google Drive."""
+
+import contextvars
+import json
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .circuit import is_dependency_failure
+from .credentials import UserScoped, credential_manager, user_scoped_path
+from .drive_index import drive_index
+
+# Configurar rutas relativas al directorio raíz del proyecto
+_CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/drive_content_index.py
+CONTENT_INDEX_FILE = str(_CURRENT_DIR / 'drive_content_index.json')
+
+# Archivos más grandes que esto no se descargan para indexar
+DRIVE_CONTENT_MAX_BYTES = int(os.getenv("DRIVE_CONTENT_MAX_BYTES", str(2 * 1024 * 1024)))
+# Documentos (re)indexados como máximo en cada refresco
+DRIVE_CONTENT_MAX_PER_REFRESH = int(os.getenv("DRIVE_CONTENT_MAX_PER_REFRESH", "50"))
+# Segundos de extracción dentro de la herramienta (el resto sigue en segundo plano), para no
+# acercarse al max_execution_time del ejecutor
+DRIVE_CONTENT_REFRESH_BUDGET = float(os.getenv("DRIVE_CONTENT_REFRESH_BUDGET", "5"))
+# Segundos de cada refresco en segundo plano (y en el warm-up)
+DRIVE_CONTENT_BACKGROUND_BUDGET = float(os.getenv("DRIVE_CONTENT_BACKGROUND_BUDGET", "60"))
+
+# Documentos nativos de Google: se exportan a texto
+EXPORT_MIME_TYPES = {
+    'application/vnd.google-apps.document': 'text/plain',
+    'application/vnd.google-apps.presentation': 'text/plain',
+    'application/vnd.google-apps.spreadsheet': 'text/csv',
+}
+# Archivos binarios cuyo contenido ya es texto
+TEXT_MIME_TYPES = ('text/', 'application/json', 'application/xml', 'application/csv')
+
+# Parámetros de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'no', 'o', 'para',
+    'por', 'que', 'se', 'su', 'sus', 'un', 'una', 'y', 'como', 'mas', 'pero', 'este', 'esta',
+    'the', 'and', 'of', 'to', 'in', 'is', 'for', 'on', 'with', 'it', 'an', 'or',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Normaliza (minúsculas, sin tildes) y separa en términos, sin stopwords."""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    normalized = ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+    return [term for term in re.findall(r'\w+', normalized) if len(term) > 1 and term not in STOPWORDS]
+
+
+def is_indexable(item: Dict[str, Any]) -> bool:
+    """Indica si se puede extraer texto del archivo sin dependencias adicionales."""
+    mime_type = item.get('mimeType', '')
+    if mime_type in EXPORT_MIME_TYPES:
+        return True
+    if not mime_type.startswith(TEXT_MIME_TYPES):
+        return False
+    size = item.get('size')
+    # Sin tamaño conocido se confirma con los metadatos antes de descargar (ver `_extract_text`)
+    return size is None or size <= DRIVE_CONTENT_MAX_BYTES
+
+
+class DriveContentIndex:
+    """Índice invertido con ranking BM25 sobre documentos exportados de Drive."""
+
+    def __init__(self, index_file: str = CONTENT_INDEX_FILE):
+        """Inicializar el índice de contenido.
+
+        Args:
+            index_file: Archivo donde se persisten las frecuencias de términos por documento
+        """
+        self.index_file = index_file
+        # file_id -> {'name', 'modifiedTime', 'length', 'preview', 'terms': {término: frecuencia}}
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        # término -> {file_id: frecuencia}; se reconstruye a partir de `docs`
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # file_id -> modifiedTime de la versión que no se pudo extraer (no se reintenta hasta que cambie)
+        self.failed: Dict[str, Optional[str]] = {}
+        self._lock = threading.RLock()
+        self._background: Optional[threading.Thread] = None
+        self.load_index()
+
+    def load_index(self):
+        """Cargar el índice desde archivo y reconstruir las listas invertidas."""
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.docs = data.get('docs', {})
+            self.failed = data.get('failed', {})
+            for file_id, doc in self.docs.items():
+                self._add_postings(file_id, doc['terms'])
+            print(f"📁 [DRIVE_CONTENT] Índice de contenido cargado con {len(self.docs)} documentos")
+        except Exception as e:
+            print(f"⚠️ [DRIVE_CONTENT] Error cargando índice de contenido: {e}")
+            self.docs, self.postings, self.failed = {}, {}, {}
+
+    def save_index(self):
+        """Guardar el índice en archivo."""
+        try:
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'docs': self.docs, 'failed': self.failed}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            print(f"⚠️ [DRIVE_CONTENT] Error guardando índice de contenido: {e}")
+
+    def _add_postings(self, file_id: str, terms: Dict[str, int]):
+        for term, freq in terms.items():
+            self.postings.setdefault(term, {})[file_id] = freq
+
+    def _remove_doc(self, file_id: str):
+        doc = self.docs.pop(file_id, None)
+        if not doc:
+            return
+        for term in doc['terms']:
+            entries = self.postings.get(term)
+            if entries is not None:
+                entries.pop(file_id, None)
+                if not entries:
+                    del self.postings[term]
+
+    def add_document(self, item: Dict[str, Any], text: str):
+        """Indexa (o reemplaza) el texto de un archivo."""
+        terms = tokenize(text)
+        with self._lock:
+            self._remove_doc(item['id'])
+            doc = {
+                'name': item.get('name', ''),
+                'modifiedTime': item.get('modifiedTime'),
+                'length': len(terms),
+                'preview': ' '.join(text.split())[:200],
+                'terms': dict(Counter(terms)),
+            }
+            self.docs[item['id']] = doc
+            self._add_postings(item['id'], doc['terms'])
+
+    # --- Sincronización con Drive ---
+
+    def refresh(self, service, time_budget: Optional[float] = None) -> int:
+        """Reindexa solo los documentos cuyo `modifiedTime` cambió. Devuelve cuántos quedan pendientes.
+
+        Args:
+            service: Servicio de Drive del usuario
+            time_budget: Segundos máximos de extracción (None = hasta DRIVE_CONTENT_MAX_PER_REFRESH documentos)
+        """
+        drive_index.sync(service)
+        with self._lock:
+            # Documentos que ya no existen en Drive
+            for file_id in [fid for fid in self.docs if drive_index.get(fid) is None]:
+                self._remove_doc(file_id)
+            for file_id in [fid for fid in self.failed if drive_index.get(fid) is None]:
+                del self.failed[file_id]
+
+            pending = [
+                item for item in list(drive_index.files.values())
+                if is_indexable(item)
+                and self.docs.get(item['id'], {}).get('modifiedTime') != item.get('modifiedTime')
+                and (item['id'] not in self.failed or self.failed[item['id']] != item.get('modifiedTime'))
+            ]
+
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        indexed = failed = 0
+        for item in pending[:DRIVE_CONTENT_MAX_PER_REFRESH]:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            try:
+                text = self._extract_text(service, item)
+            except Exception as e:
+                print(f"⚠️ [DRIVE_CONTENT] No se pudo extraer texto de '{item.get('name')}': {e}")
+                failed += 1
+                # Las fallas propias del archivo no se reintentan hasta que cambie; las de red sí
+                if not is_dependency_failure(e):
+                    with self._lock:
+                        self.failed[item['id']] = item.get('modifiedTime')
+                continue
+            with self._lock:
+                self.failed.pop(item['id'], None)
+            self.add_document(item, text)
+            indexed += 1
+
+        remaining = len(pending) - indexed - failed
+        if indexed or failed or remaining:
+            print(f"📁 [DRIVE_CONTENT] {indexed} documentos indexados, {failed} fallidos ({remaining} pendientes)")
+        with self._lock:
+            self.save_index()
+        return remaining
+
+    def is_refreshing(self) -> bool:
+        """True mientras hay un refresco en segundo plano en curso."""
+        return self._background is not None and self._background.is_alive()
+
+    def refresh_in_background(self) -> bool:
+        """Continúa el refresco en un hilo propio (uno por índice). Devuelve False si ya había uno en curso."""
+        with self._lock:
+            if self.is_refreshing():
+                return False
+            # El hilo ve al mismo usuario que quien lo lanzó
+            context = contextvars.copy_context()
+            self._background = threading.Thread(
+                target=context.run, args=(self._background_refresh,), name="drive-content-refresh", daemon=True
+            )
+            self._background.start()
+            return True
+
+    def _background_refresh(self):
+        try:
+            # Un servicio propio: los clientes httplib2 no son thread-safe
+            self.refresh(credential_manager.get_service('drive'), time_budget=DRIVE_CONTENT_BACKGROUND_BUDGET)
+        except Exception as e:
+            print(f"⚠️ [DRIVE_CONTENT] Error en el refresco en segundo plano: {e}")
+
+    @staticmethod
+    def _extract_text(service, item: Dict[str, Any]) -> str:
+        """Descarga el texto del archivo: exportación para documentos de Google, contenido para texto plano."""
+        export_mime_type = EXPORT_MIME_TYPES.get(item['mimeType'])
+        if export_mime_type:
+            content = service.files().export_media(fileId=item['id'], mimeType=export_mime_type).execute()
+        else:
+            if item.get('size') is None:
+                # El índice no trae el tamaño: se confirma antes de descargar el archivo entero
+                size = service.files().get(fileId=item['id'], fields='size').execute().get('size')
+                if size is None or int(size) > DRIVE_CONTENT_MAX_BYTES:
+                    raise ValueError(f"tamaño desconocido o mayor a {DRIVE_CONTENT_MAX_BYTES} bytes")
+            content = service.files().get_media(fileId=item['id']).execute()
+        return content[:DRIVE_CONTENT_MAX_BYTES].decode('utf-8', errors='ignore')
+
+    # --- Consultas ---
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Ranking BM25 de los documentos para la consulta."""
+        query_terms = tokenize(query)
+        with self._lock:
+            total_docs = len(self.docs)
+            if not total_docs or not query_terms:
+                return []
+            avg_length = sum(doc['length'] for doc in self.docs.values()) / total_docs or 1
+
+            scores: Dict[str, float] = {}
+            for term in set(query_terms):
+                entries = self.postings.get(term)
+                if not entries:
+                    continue
+                idf = math.log(1 + (total_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+                for file_id, freq in entries.items():
+                    length = self.docs[file_id]['length']
+                    norm = freq + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[file_id] = scores.get(file_id, 0.0) + idf * freq * (BM25_K1 + 1) / norm
+
+            ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:limit]
+            return [
+                {'id': file_id, 'name': self.docs[file_id]['name'], 'score': score,
+                 'preview': self.docs[file_id]['preview']}
+                for file_id, score in ranked
+            ]
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Entrada indexada de un documento."""
+        return self.docs.get(file_id)
+
+
+# Instancia global del índice de contenido (una por cuenta de Google)
+drive_content_index = UserScoped(
+    'drive', lambda user: DriveContentIndex(user_scoped_path(CONTENT_INDEX_FILE, user))
+)
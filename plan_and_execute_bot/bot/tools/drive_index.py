@@ -0,0 +1,247 @@
+# drive_index.py
+"""Índice local de metadatos de Google Drive sincronizado con el feed `changes.list`."""
+
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .credentials import UserScoped, user_scoped_path
+
+# Configurar rutas relativas al directorio raíz del proyecto
+_CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/drive_index.py
+INDEX_FILE = str(_CURRENT_DIR / 'drive_index.json')
+
+# Segundos mínimos entre dos consultas al feed de cambios
+DRIVE_INDEX_SYNC_INTERVAL = float(os.getenv("DRIVE_INDEX_SYNC_INTERVAL", "60"))
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_FIELDS = 'id,name,parents,mimeType,modifiedTime,md5Checksum,size,trashed'
+
+
+class DriveMetadataIndex:
+    """Mantiene un espejo local (id, nombre, padres, tipo, fecha, md5, tamaño) de los archivos de Drive."""
+
+    def __init__(self, index_file: str = INDEX_FILE):
+        """Inicializar el índice.
+
+        Args:
+            index_file: Archivo donde se persiste el índice
+        """
+        self.index_file = index_file
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.page_token: Optional[str] = None
+        self.root_id: Optional[str] = None
+        self.last_sync = 0.0
+        self._lock = threading.RLock()
+        self._names: Optional[List[tuple]] = None
+        self._children: Optional[Dict[str, Dict[str, List[str]]]] = None
+        self.load_index()
+
+    def load_index(self):
+        """Cargar el índice desde archivo."""
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get('files', {})
+            self.page_token = data.get('page_token')
+            self.root_id = data.get('root_id')
+            print(f"📁 [DRIVE_INDEX] Índice cargado con {len(self.files)} archivos")
+        except Exception as e:
+            print(f"⚠️ [DRIVE_INDEX] Error cargando índice: {e}")
+            self.files, self.page_token, self.root_id = {}, None, None
+
+    def save_index(self):
+        """Guardar el índice en archivo."""
+        try:
+            data = {'files': self.files, 'page_token': self.page_token, 'root_id': self.root_id}
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            print(f"⚠️ [DRIVE_INDEX] Error guardando índice: {e}")
+
+    # --- Sincronización ---
+
+    def sync(self, service, force: bool = False) -> int:
+        """Trae los cambios pendientes desde Drive.
+
+        La primera vez lista todos los archivos; luego solo consume `changes.list`
+        desde el page token guardado. Devuelve la cantidad de entradas modificadas.
+        """
+        with self._lock:
+            if not force and self.page_token and time.time() - self.last_sync < DRIVE_INDEX_SYNC_INTERVAL:
+                return 0
+            changed = self._full_sync(service) if not self.page_token else self._incremental_sync(service)
+            self.last_sync = time.time()
+            if changed:
+                self._invalidate()
+            self.save_index()
+            return changed
+
+    def _full_sync(self, service) -> int:
+        """Listado completo inicial."""
+        # El token se pide ANTES de listar para no perder cambios ocurridos durante el listado
+        start_token = service.changes().getStartPageToken().execute()['startPageToken']
+        self.root_id = service.files().get(fileId='root', fields='id').execute()['id']
+        files = {}
+        page_token = None
+        while True:
+            response = service.files().list(
+                q='trashed = false',
+                spaces='drive',
+                pageSize=1000,
+                pageToken=page_token,
+                fields=f'nextPageToken,files({FILE_FIELDS})'
+            ).execute()
+            for item in response.get('files', []):
+                files[item['id']] = self._compact(item)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        self.files = files
+        self.page_token = start_token
+        print(f"📁 [DRIVE_INDEX] Sincronización completa: {len(files)} archivos")
+        return len(files)
+
+    def _incremental_sync(self, service) -> int:
+        """Aplica el feed de cambios desde el último page token."""
+        changed = 0
+        page_token = self.page_token
+        while page_token:
+            response = service.changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                pageSize=1000,
+                fields=f'nextPageToken,newStartPageToken,changes(fileId,removed,file({FILE_FIELDS}))'
+            ).execute()
+            for change in response.get('changes', []):
+                item = change.get('file')
+                if change.get('removed') or not item or item.get('trashed'):
+                    self.files.pop(change['fileId'], None)
+                else:
+                    self.files[item['id']] = self._compact(item)
+                changed += 1
+            if 'newStartPageToken' in response:
+                self.page_token = response['newStartPageToken']
+            page_token = response.get('nextPageToken')
+        if changed:
+            print(f"📁 [DRIVE_INDEX] {changed} cambios aplicados desde el feed")
+        return changed
+
+    @staticmethod
+    def _compact(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Se guardan solo los campos que usa el índice."""
+        return {
+            'id': item['id'],
+            'name': item.get('name', ''),
+            'parents': item.get('parents', []),
+            'mimeType': item.get('mimeType', ''),
+            'modifiedTime': item.get('modifiedTime'),
+            'md5Checksum': item.get('md5Checksum'),
+            'size': int(item['size']) if item.get('size') else None,
+        }
+
+    # --- Actualizaciones locales (tras escrituras hechas por las herramientas) ---
+
+    def upsert(self, item: Dict[str, Any]):
+        """Registra o actualiza un archivo recién creado o modificado."""
+        with self._lock:
+            current = self.files.get(item['id'], {})
+            self.files[item['id']] = self._compact({**current, **item})
+            self._invalidate()
+
+    def remove(self, file_id: str):
+        """Quita un archivo del índice."""
+        with self._lock:
+            if self.files.pop(file_id, None) is not None:
+                self._invalidate()
+
+    def _invalidate(self):
+        self._names = None
+        self._children = None
+
+    # --- Consultas ---
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Metadatos indexados de un archivo."""
+        return self.files.get(file_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Busca por nombre: primero coincidencias por prefijo, luego por subcadena."""
+        with self._lock:
+            if self._names is None:
+                self._names = sorted((f['name'].lower(), f['id']) for f in self.files.values())
+            names = self._names
+
+        needle = query.lower().strip()
+        results, seen = [], set()
+        start = bisect.bisect_left(names, (needle, ''))
+        for name, file_id in names[start:]:
+            if not name.startswith(needle) or len(results) >= limit:
+                break
+            if file_id in self.files:
+                results.append(self.files[file_id])
+                seen.add(file_id)
+        if len(results) < limit:
+            for name, file_id in names:
+                if needle in name and file_id not in seen and file_id in self.files:
+                    results.append(self.files[file_id])
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def _children_map(self) -> Dict[str, Dict[str, List[str]]]:
+        """Árbol padre → {nombre en minúsculas: [ids]} construido bajo demanda."""
+        with self._lock:
+            if self._children is None:
+                children: Dict[str, Dict[str, List[str]]] = {}
+                for item in self.files.values():
+                    for parent in item.get('parents', []):
+                        children.setdefault(parent, {}).setdefault(item['name'].lower(), []).append(item['id'])
+                self._children = children
+            return self._children
+
+    def resolve_path(self, path: str) -> Optional[str]:
+        """Convierte una ruta de carpetas ('Trabajo/Informes/q1.pdf') en el ID del archivo."""
+        parts = [part for part in path.strip().strip('/').split('/') if part]
+        if not self.root_id:
+            return None
+        if not parts:
+            return self.root_id
+        children = self._children_map()
+        current = self.root_id
+        for part in parts:
+            candidates = children.get(current, {}).get(part.lower())
+            if not candidates:
+                return None
+            current = candidates[0]
+        return current
+
+    def path_of(self, file_id: str) -> Optional[str]:
+        """Ruta de carpetas de un archivo a partir del árbol de padres."""
+        if file_id not in self.files:
+            return None
+        parts = []
+        current = file_id
+        visited = set()
+        while current and current != self.root_id and current not in visited:
+            visited.add(current)
+            item = self.files.get(current)
+            if not item:
+                # Padre fuera del índice (p. ej. carpeta compartida)
+                parts.append('…')
+                break
+            parts.append(item['name'])
+            current = item['parents'][0] if item.get('parents') else None
+        return '/' + '/'.join(reversed(parts))
+
+
+# Instancia global del índice (una por cuenta de Google)
+drive_index = UserScoped('drive', lambda user: DriveMetadataIndex(user_scoped_path(INDEX_FILE, user)))
@@ -1,17 +1,24 @@
 # gmail.py
 
+import asyncio
 import base64
 import email
+import os
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from pathlib import Path
 from typing import List, Optional
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
 from langchain.tools import tool
 
+from .gmail_cache import message_cache
+from .google_async import AsyncGoogleClient
+from .credentials import credential_manager
+from .pools import bind_tools_to_pool, run_in_pool
+
 # --- CONFIGURACIÓN OAuth ---
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.modify',  # Leer, modificar y gestionar mensajes
@@ -21,29 +28,33 @@ SCOPES = [
 
 # Configurar rutas relativas al directorio raíz del proyecto
 _CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/gmail.py
-CREDS_FILE = str(_CURRENT_DIR / 'credentials.json')
 TOKEN_FILE = str(_CURRENT_DIR / 'gmail_token.json')
 
+credential_manager.register_api('gmail', SCOPES, TOKEN_FILE, 'gmail', 'v1')
+
+# Tamaño máximo (aprox. en tokens) del resumen del cuerpo que se le pasa al LLM
+GMAIL_DIGEST_MAX_TOKENS = int(os.getenv("GMAIL_DIGEST_MAX_TOKENS", "250"))
+
+# Entradas del caché en memoria de encabezados (lecturas en formato metadata)
+GMAIL_HEADER_CACHE_SIZE = int(os.getenv("GMAIL_HEADER_CACHE_SIZE", "512"))
+
+# Encabezados que se guardan en caché (nombre en minúsculas -> nombre canónico)
+CACHED_HEADERS = {
+    name.lower(): name
+    for name in ('From', 'To', 'Cc', 'Bcc', 'Subject', 'Date', 'Reply-To', 'Message-ID', 'References')
+}
+
+# (usuario, message_id) -> encabezados; los mensajes son inmutables, así que no hace falta invalidar
+_HEADER_CACHE: "OrderedDict[tuple, dict]" = OrderedDict()
+_HEADER_CACHE_LOCK = threading.Lock()
+
 
 def get_gmail_service():
-    """Inicializa y devuelve el servicio de Gmail."""
+    """Devuelve el servicio de Gmail del usuario actual para este hilo (httplib2 no es thread-safe)."""
     try:
-        creds = None
-        if Path(TOKEN_FILE).exists():
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                # Verificar si existe el archivo de credenciales
-                if not Path(CREDS_FILE).exists():
-                    raise FileNotFoundError(f"No se encontró el archivo {CREDS_FILE}. Por favor, configura las credenciales de Gmail.")
-                
-                flow = InstalledAppFlow.from_client_secrets_file(CREDS_FILE, SCOPES)
-                creds = flow.run_local_server(port=0)
-            with open(TOKEN_FILE, 'w', encoding='utf-8') as token:
-                token.write(creds.to_json())
-        return build('gmail', 'v1', credentials=creds)
+        return credential_manager.get_service('gmail')
+    except FileNotFoundError:
+        raise
     except Exception as e:
         raise Exception(f"Error al configurar Gmail: {str(e)}")
 
@@ -96,15 +107,7 @@ def list_messages(query: str = None, label_ids: str = None, max_results: int = 1
                 ).execute()
                 
                 headers = {h['name']: h['value'] for h in msg_detail.get('payload', {}).get('headers', [])}
-                
-                from_addr = headers.get('From', 'Desconocido')
-                subject = headers.get('Subject', 'Sin asunto')
-                date = headers.get('Date', 'Fecha desconocida')[:16]  # Solo fecha y hora
-                
-                message_list.append(f"📧 **{subject}**")
-                message_list.append(f"   De: {from_addr}")
-                message_list.append(f"   Fecha: {date}")
-                message_list.append(f"   ID: {msg['id']}\n")
+                message_list.extend(_message_list_entry(msg['id'], headers))
                 
             except Exception as e:
                 message_list.append(f"❌ Error al obtener detalles del mensaje {msg['id']}: {str(e)}\n")
@@ -130,38 +133,30 @@ def get_message(message_id: str, format: str = 'full') -> str:
     try:
         service = get_gmail_service()
         
-        # Obtener mensaje completo
-        message = service.users().messages().get(
-            userId='me',
-            id=message_id,
-            format=format
-        ).execute()
-        
-        # Extraer encabezados
-        headers = {}
-        if 'payload' in message and 'headers' in message['payload']:
-            headers = {h['name']: h['value'] for h in message['payload']['headers']}
-        
-        # Extraer contenido del cuerpo
-        body_content = ""
-        if 'payload' in message:
-            body_content = extract_message_body(message['payload'])
-        
-        # Formatear respuesta
-        result = [
-            f"📧 **Detalles del mensaje:**\n",
-            f"**ID:** {message.get('id', 'N/A')}",
-            f"**Thread ID:** {message.get('threadId', 'N/A')}",
-            f"**De:** {headers.get('From', 'Desconocido')}",
-            f"**Para:** {headers.get('To', 'Desconocido')}",
-            f"**Asunto:** {headers.get('Subject', 'Sin asunto')}",
-            f"**Fecha:** {headers.get('Date', 'Fecha desconocida')}",
-            f"**CC:** {headers.get('Cc', 'Ninguno')}",
-            f"**BCC:** {headers.get('Bcc', 'Ninguno')}",
-            f"\n**Contenido del mensaje:**\n{body_content[:1000]}{'...' if len(body_content) > 1000 else ''}"
-        ]
-        
-        return "\n".join(result)
+        if format == 'full':
+            # Los mensajes son inmutables: el cuerpo procesado se reutiliza desde el caché
+            message = get_cached_message(service, message_id)
+            headers = message['headers']
+            # El cuerpo completo (se recorta al mostrarlo); el digest es para listados y resúmenes
+            body_content = message['body']
+        else:
+            message = service.users().messages().get(
+                userId='me',
+                id=message_id,
+                format=format
+            ).execute()
+            
+            # Extraer encabezados
+            headers = {}
+            if 'payload' in message and 'headers' in message['payload']:
+                headers = {h['name']: h['value'] for h in message['payload']['headers']}
+            
+            # Extraer contenido del cuerpo
+            body_content = ""
+            if 'payload' in message:
+                body_content = extract_message_body(message['payload'])
+        
+        return _format_message_details(message, headers, body_content)
     except FileNotFoundError as e:
         return f"❌ Gmail no está configurado: {str(e)}"
     except Exception as e:
@@ -185,35 +180,7 @@ def send_message(to: str, subject: str, body_html: str, cc: str = None, bcc: str
     try:
         service = get_gmail_service()
         
-        # Crear mensaje MIME
-        message = MIMEMultipart('mixed')
-        message['To'] = to
-        message['Subject'] = subject
-        
-        if cc:
-            message['Cc'] = cc
-        if bcc:
-            message['Bcc'] = bcc
-        
-        # Crear parte alternativa para HTML y texto plano
-        msg_alternative = MIMEMultipart('alternative')
-        message.attach(msg_alternative)
-        
-        # Convertir HTML a texto plano simple
-        import re
-        text_content = re.sub(r'<[^>]+>', '', body_html)
-        text_content = re.sub(r'\s+', ' ', text_content).strip()
-        
-        # Adjuntar contenido de texto plano
-        text_part = MIMEText(text_content, 'plain', 'utf-8')
-        msg_alternative.attach(text_part)
-        
-        # Adjuntar contenido HTML
-        html_part = MIMEText(body_html, 'html', 'utf-8')
-        msg_alternative.attach(html_part)
-        
-        # Codificar mensaje
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+        raw_message = _build_raw_message(to, subject, body_html, cc, bcc)
         
         # Enviar mensaje
         send_result = service.users().messages().send(
@@ -243,19 +210,20 @@ def reply_message(thread_id: str, body_html: str, quote_original: bool = True) -
     try:
         service = get_gmail_service()
         
-        # Obtener el hilo original para extraer información
-        thread = service.users().threads().get(userId='me', id=thread_id).execute()
+        # Del hilo solo se piden los IDs: los cuerpos (y adjuntos) de todo el hilo no se descargan
+        thread = service.users().threads().get(
+            userId='me',
+            id=thread_id,
+            format='minimal',
+            fields='messages(id)'
+        ).execute()
         
         if not thread.get('messages'):
             return f"❌ No se encontraron mensajes en el hilo {thread_id}"
         
-        # Obtener el último mensaje del hilo
-        last_message = thread['messages'][-1]
-        
-        # Extraer encabezados del mensaje original
-        headers = {}
-        if 'payload' in last_message and 'headers' in last_message['payload']:
-            headers = {h['name']: h['value'] for h in last_message['payload']['headers']}
+        # Encabezados del último mensaje del hilo (desde caché si ya se leyó)
+        last_message_id = thread['messages'][-1]['id']
+        headers = get_message_headers(service, last_message_id)
         
         # Preparar respuesta
         original_subject = headers.get('Subject', '')
@@ -269,12 +237,12 @@ def reply_message(thread_id: str, body_html: str, quote_original: bool = True) -
         message['To'] = reply_to
         message['Subject'] = reply_subject
         message['In-Reply-To'] = headers.get('Message-ID', '')
-        message['References'] = headers.get('References', headers.get('Message-ID', ''))
+        message['References'] = ' '.join(filter(None, [headers.get('References'), headers.get('Message-ID')]))
         
         # Contenido de la respuesta
         final_body = body_html
         if quote_original:
-            original_body = extract_message_body(last_message['payload'])
+            original_body = get_cached_message(service, last_message_id)['body']
             quoted_body = '\n'.join(f"> {line}" for line in original_body.split('\n'))
             final_body += f"\n\n--- Mensaje original ---\n{quoted_body}"
         
@@ -406,29 +374,218 @@ def modify_labels(message_id: str, add_labels: str = None, remove_labels: str =
 
 # --- FUNCIONES AUXILIARES ---
 
+class _HTMLTextExtractor(HTMLParser):
+    """Convierte HTML en texto plano descartando estilos, scripts y etiquetas."""
+
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote'}
+    SKIP_TAGS = {'script', 'style', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.chunks.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.chunks.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Convierte un cuerpo HTML en texto plano legible."""
+    parser = _HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = ''.join(parser.chunks)
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    return re.sub(r'\n\s*\n+', '\n\n', text).strip()
+
+
+def _decode_part(part) -> str:
+    return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='replace')
+
+
 def extract_message_body(payload):
-    """Extrae el contenido del cuerpo del mensaje desde el payload."""
-    body = ""
-    
-    if 'parts' in payload:
-        # Mensaje con múltiples partes
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain':
-                if 'data' in part['body']:
-                    body += base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            elif part['mimeType'] == 'text/html':
-                if 'data' in part['body']:
-                    # Para HTML, podrías querer procesarlo, por ahora lo devolvemos como está
-                    body += base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            elif 'parts' in part:
-                # Recursivo para partes anidadas
-                body += extract_message_body(part)
+    """Extrae el contenido del cuerpo del mensaje desde el payload.
+
+    Se queda con la primera parte text/plain; solo si no existe convierte la
+    primera parte text/html a texto. Únicamente se decodifica la parte elegida.
+    """
+    html_part = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if 'parts' in part:
+            # Orden original de las partes (se apilan al revés)
+            stack.extend(reversed(part['parts']))
+            continue
+        if 'data' not in part.get('body', {}):
+            continue
+        mime_type = part.get('mimeType', '')
+        if mime_type == 'text/plain':
+            return _decode_part(part)
+        if mime_type == 'text/html' and html_part is None:
+            html_part = part
+        elif html_part is None and part is payload:
+            # Mensaje simple sin tipo de texto reconocido
+            return _decode_part(part)
+
+    return html_to_text(_decode_part(html_part)) if html_part else ""
+
+
+def make_digest(body: str, max_tokens: int = GMAIL_DIGEST_MAX_TOKENS) -> str:
+    """Versión compacta del cuerpo para el LLM: sin citas previas y acotada en tokens (~4 caracteres por token)."""
+    lines = []
+    for line in body.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('>'):
+            continue
+        # Los clientes de correo introducen la cita del hilo con esta línea
+        if re.match(r'^(On|El) .+(wrote|escribió):$', stripped):
+            break
+        lines.append(stripped)
+    text = re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(' ', 0, max_chars - 3)
+    return text[:cut if cut > 0 else max_chars - 3] + '...'
+
+
+def _canonical_headers(raw_headers) -> dict:
+    headers = {}
+    for header in raw_headers:
+        canonical = CACHED_HEADERS.get(header['name'].lower())
+        if canonical:
+            headers[canonical] = header['value']
+    return headers
+
+
+def get_message_headers(service, message_id: str) -> dict:
+    """Devuelve los encabezados de un mensaje sin descargar su cuerpo.
+
+    Usa el caché de mensajes completos si existe; si no, hace una lectura en formato
+    metadata y la guarda en un LRU en memoria.
+    """
+    key = (credential_manager.effective_user('gmail'), message_id)
+    with _HEADER_CACHE_LOCK:
+        if key in _HEADER_CACHE:
+            _HEADER_CACHE.move_to_end(key)
+            return _HEADER_CACHE[key]
+
+    cached = message_cache.get(message_id)
+    if cached is not None:
+        headers = cached['headers']
     else:
-        # Mensaje simple
-        if 'body' in payload and 'data' in payload['body']:
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+        message = service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='metadata',
+            metadataHeaders=list(CACHED_HEADERS.values()),
+            fields='payload/headers'
+        ).execute()
+        headers = _canonical_headers(message.get('payload', {}).get('headers', []))
+
+    with _HEADER_CACHE_LOCK:
+        _HEADER_CACHE[key] = headers
+        while len(_HEADER_CACHE) > GMAIL_HEADER_CACHE_SIZE:
+            _HEADER_CACHE.popitem(last=False)
+    return headers
+
+
+def get_cached_message(service, message_id: str) -> dict:
+    """Devuelve {id, threadId, headers, body, digest} de un mensaje, usando el caché en disco."""
+    cached = message_cache.get(message_id)
+    if cached is not None:
+        return cached
+
+    message = service.users().messages().get(userId='me', id=message_id, format='full').execute()
+    entry = _cache_entry(message_id, message)
+    message_cache.put(message_id, entry)
+    return entry
+
+
+def _cache_entry(message_id: str, message: dict) -> dict:
+    """Convierte un mensaje en formato full en la entrada que se guarda en caché."""
+    payload = message.get('payload', {})
+    headers = _canonical_headers(payload.get('headers', []))
+    body = extract_message_body(payload) if payload else ""
+
+    entry = {
+        'id': message.get('id', message_id),
+        'threadId': message.get('threadId'),
+        'headers': headers,
+        'body': body,
+        'digest': make_digest(body),
+    }
+    return entry
+
+
+def _message_list_entry(message_id: str, headers: dict) -> List[str]:
+    """Líneas de un mensaje en el listado de list_messages."""
+    from_addr = headers.get('From', 'Desconocido')
+    subject = headers.get('Subject', 'Sin asunto')
+    date = headers.get('Date', 'Fecha desconocida')[:16]  # Solo fecha y hora
+    return [
+        f"📧 **{subject}**",
+        f"   De: {from_addr}",
+        f"   Fecha: {date}",
+        f"   ID: {message_id}\n",
+    ]
+
+
+def _format_message_details(message: dict, headers: dict, body_content: str) -> str:
+    """Respuesta de get_message."""
+    result = [
+        f"📧 **Detalles del mensaje:**\n",
+        f"**ID:** {message.get('id', 'N/A')}",
+        f"**Thread ID:** {message.get('threadId', 'N/A')}",
+        f"**De:** {headers.get('From', 'Desconocido')}",
+        f"**Para:** {headers.get('To', 'Desconocido')}",
+        f"**Asunto:** {headers.get('Subject', 'Sin asunto')}",
+        f"**Fecha:** {headers.get('Date', 'Fecha desconocida')}",
+        f"**CC:** {headers.get('Cc', 'Ninguno')}",
+        f"**BCC:** {headers.get('Bcc', 'Ninguno')}",
+        f"\n**Contenido del mensaje:**\n{body_content[:1000]}{'...' if len(body_content) > 1000 else ''}"
+    ]
+    return "\n".join(result)
+
+
+def _build_raw_message(to: str, subject: str, body_html: str, cc: str = None, bcc: str = None) -> str:
+    """Arma el MIME (texto plano + HTML) de un correo nuevo y lo codifica para la API."""
+    message = MIMEMultipart('mixed')
+    message['To'] = to
+    message['Subject'] = subject
+    
+    if cc:
+        message['Cc'] = cc
+    if bcc:
+        message['Bcc'] = bcc
     
-    return body
+    # Crear parte alternativa para HTML y texto plano
+    msg_alternative = MIMEMultipart('alternative')
+    message.attach(msg_alternative)
+    
+    # Convertir HTML a texto plano simple
+    text_content = re.sub(r'<[^>]+>', '', body_html)
+    text_content = re.sub(r'\s+', ' ', text_content).strip()
+    
+    msg_alternative.attach(MIMEText(text_content, 'plain', 'utf-8'))
+    msg_alternative.attach(MIMEText(body_html, 'html', 'utf-8'))
+    
+    return base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
 
 def get_label_id_by_name(label_name: str) -> Optional[str]:
     """
@@ -446,3 +603,79 @@ def get_label_id_by_name(label_name: str) -> Optional[str]:
             return label['id']
     print(f"[DEBUG][get_label_id_by_name] No se encontró la etiqueta '{label_name}'")
     return None
+
+
+# --- IMPLEMENTACIONES ASÍNCRONAS (sin hilos) ---
+
+gmail_api = AsyncGoogleClient('gmail', 'https://gmail.googleapis.com/gmail/v1/users/me/')
+
+
+async def _alist_messages(query: str = None, label_ids: str = None, max_results: int = 10) -> str:
+    try:
+        results = await gmail_api.get(
+            'messages',
+            q=query,
+            labelIds=[label.strip() for label in label_ids.split(',')] if label_ids else None,
+            maxResults=min(max_results, 50)
+        )
+        messages = results.get('messages', [])
+        
+        if not messages:
+            return "📬 No se encontraron mensajes que coincidan con los criterios de búsqueda."
+        
+        # Los detalles de todos los mensajes se piden a la vez
+        details = await asyncio.gather(*(
+            gmail_api.get(f"messages/{msg['id']}", format='metadata', metadataHeaders=['From', 'Subject', 'Date'],
+                          fields='payload/headers')
+            for msg in messages
+        ), return_exceptions=True)
+        
+        message_list = [f"📬 Mensajes encontrados ({len(messages)}):\n"]
+        for msg, msg_detail in zip(messages, details):
+            if isinstance(msg_detail, Exception):
+                message_list.append(f"❌ Error al obtener detalles del mensaje {msg['id']}: {str(msg_detail)}\n")
+                continue
+            headers = {h['name']: h['value'] for h in msg_detail.get('payload', {}).get('headers', [])}
+            message_list.extend(_message_list_entry(msg['id'], headers))
+        
+        return "\n".join(message_list)
+    except FileNotFoundError as e:
+        return f"❌ Gmail no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al listar mensajes: {str(e)}"
+
+
+async def _aget_message(message_id: str, format: str = 'full') -> str:
+    if format != 'full':
+        # Formatos poco usados: versión síncrona en el pool de Gmail
+        return await run_in_pool('gmail', get_message.func, message_id, format)
+    try:
+        entry = await asyncio.to_thread(message_cache.get, message_id)
+        if entry is None:
+            message = await gmail_api.get(f"messages/{message_id}", format='full')
+            entry = _cache_entry(message_id, message)
+            await asyncio.to_thread(message_cache.put, message_id, entry)
+        return _format_message_details(entry, entry['headers'], entry['body'])
+    except FileNotFoundError as e:
+        return f"❌ Gmail no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al recuperar el mensaje: {str(e)}"
+
+
+async def _asend_message(to: str, subject: str, body_html: str, cc: str = None, bcc: str = None) -> str:
+    try:
+        raw_message = _build_raw_message(to, subject, body_html, cc, bcc)
+        send_result = await gmail_api.request('POST', 'messages/send', json_body={'raw': raw_message})
+        return f"✅ Mensaje enviado exitosamente a {to} (ID: {send_result['id']})"
+    except FileNotFoundError as e:
+        return f"❌ Gmail no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al enviar el mensaje: {str(e)}"
+
+
+list_messages.coroutine = _alist_messages
+get_message.coroutine = _aget_message
+send_message.coroutine = _asend_message
+
+# El resto de las invocaciones asíncronas (ainvoke) corren en el pool de hilos de Gmail
+bind_tools_to_pool('gmail', [list_messages, get_message, send_message, reply_message, delete_message, modify_labels])
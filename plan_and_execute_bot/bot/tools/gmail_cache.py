@@ -0,0 +1,123 @@
+# gmail_cache.py
+"""Caché en disco, con límite de tamaño y desalojo LRU, de mensajes de Gmail ya procesados."""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .credentials import credential_manager
+
+# Configurar rutas relativas al directorio raíz del proyecto
+_CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/gmail_cache.py
+CACHE_DIR = os.getenv("GMAIL_CACHE_DIR", str(_CURRENT_DIR / 'gmail_cache'))
+
+# Tamaño máximo del caché en disco
+GMAIL_CACHE_MAX_BYTES = int(os.getenv("GMAIL_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Los IDs de Gmail son hexadecimales; cualquier otra cosa no debe llegar a una ruta en disco
+_MESSAGE_ID = re.compile(r'^[A-Za-z0-9]+$')
+
+
+class MessageCache:
+    """Guarda un JSON por mensaje, indexado por ID (en una subcarpeta por cuenta de Google).
+
+    Los mensajes de Gmail son inmutables, así que una entrada nunca se invalida:
+    solo se desaloja la menos usada cuando el caché supera su tamaño máximo.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = GMAIL_CACHE_MAX_BYTES):
+        """Inicializar el caché.
+
+        Args:
+            cache_dir: Carpeta donde se guardan las entradas
+            max_bytes: Tamaño total máximo en disco
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # clave ('<usuario>/<id>') -> tamaño en bytes, del menos al más recientemente usado
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+
+    def _load_entries(self):
+        """Reconstruye el orden LRU a partir de la fecha de modificación de los archivos."""
+        if self._entries is not None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.cache_dir.rglob('*.json'), key=lambda path: path.stat().st_mtime)
+        self._entries = OrderedDict(
+            (path.relative_to(self.cache_dir).with_suffix('').as_posix(), path.stat().st_size) for path in files
+        )
+        self._total_bytes = sum(self._entries.values())
+
+    @staticmethod
+    def _key(message_id: str) -> str:
+        """Los IDs son por buzón: la clave incluye la cuenta (también la por defecto) para no cruzar
+        datos entre usuarios.
+
+        Raises:
+            ValueError: El ID no tiene el formato de Gmail
+        """
+        if not _MESSAGE_ID.match(message_id or ''):
+            raise ValueError(f"ID de mensaje inválido: '{message_id}'")
+        return f"{credential_manager.effective_user('gmail')}/{message_id}"
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la entrada guardada o None si no está en caché."""
+        key = self._key(message_id)
+        with self._lock:
+            self._load_entries()
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                os.utime(path)  # Marca de uso para el orden LRU entre reinicios
+            except Exception:
+                self._total_bytes -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, message_id: str, entry: Dict[str, Any]):
+        """Guarda (o reemplaza) una entrada y desaloja las más viejas si hace falta."""
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        key = self._key(message_id)
+        with self._lock:
+            self._load_entries()
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                try:
+                    self._path(oldest_key).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def update(self, message_id: str, **fields):
+        """Agrega campos a una entrada existente (p. ej. un resumen calculado después)."""
+        entry = self.get(message_id)
+        if entry is not None:
+            entry.update(fields)
+            self.put(message_id, entry)
+
+
+# Instancia global del caché
+message_cache = MessageCache()
@@ -0,0 +1,160 @@
+# gmail_summary.py
+"""Resumen map-reduce de varios correos: descarga y resúmenes por mensaje en paralelo, una sola síntesis final."""
+
+import asyncio
+import os
+from langchain.prompts import PromptTemplate
+from langchain.tools import tool
+
+from ..config import LLM_EXECUTOR
+from .gmail import get_gmail_service, get_cached_message
+from .gmail_cache import message_cache
+from .pools import bind_tools_to_pool, run_in_pool
+
+# Descargas simultáneas por resumen, para no ocupar todo el pool de Gmail (cada hilo usa su propio servicio)
+GMAIL_FETCH_CONCURRENCY = int(os.getenv("GMAIL_FETCH_CONCURRENCY", "8"))
+# Llamadas simultáneas al LLM durante la fase de resumen por mensaje
+GMAIL_SUMMARY_CONCURRENCY = int(os.getenv("GMAIL_SUMMARY_CONCURRENCY", "5"))
+# Máximo de mensajes por resumen
+GMAIL_SUMMARY_MAX_MESSAGES = int(os.getenv("GMAIL_SUMMARY_MAX_MESSAGES", "30"))
+
+
+MAP_PROMPT = PromptTemplate.from_template("""
+Resume el siguiente correo en 1 o 2 oraciones en español. Incluye lo esencial: qué se pide, informa o decide,
+y cualquier fecha, monto o acción pendiente. No inventes información.
+
+De: {sender}
+Asunto: {subject}
+Fecha: {date}
+
+{body}
+
+Resumen:""")
+
+REDUCE_PROMPT = PromptTemplate.from_template("""
+A partir de los resúmenes individuales de correos que siguen, escribe un resumen narrativo en español
+(no una lista) de lo que hay en la bandeja. Menciona remitentes y asuntos reales, agrupa los correos
+relacionados y destaca primero lo urgente o lo que requiere una acción del usuario. No inventes información.
+
+{summaries}
+
+Resumen general:""")
+
+
+def _fetch_message(message_id: str) -> dict:
+    """Se ejecuta en el pool de Gmail; el servicio se construye solo si el mensaje no está en caché."""
+    cached = message_cache.get(message_id)
+    if cached is not None:
+        return cached
+    return get_cached_message(get_gmail_service(), message_id)
+
+
+def _list_message_ids(query: str, max_results: int) -> list:
+    results = get_gmail_service().users().messages().list(
+        userId='me',
+        q=query,
+        maxResults=max_results,
+        fields='messages(id)'
+    ).execute()
+    return [msg['id'] for msg in results.get('messages', [])]
+
+
+async def _summarize_one(message: dict, semaphore: asyncio.Semaphore) -> str:
+    """Fase map: resumen de un mensaje, reutilizado desde el caché si ya se calculó."""
+    if message.get('summary'):
+        return message['summary']
+    headers = message['headers']
+    async with semaphore:
+        response = await (MAP_PROMPT | LLM_EXECUTOR).ainvoke({
+            'sender': headers.get('From', 'Desconocido'),
+            'subject': headers.get('Subject', 'Sin asunto'),
+            'date': headers.get('Date', 'Fecha desconocida'),
+            'body': message['digest'],
+        })
+    summary = response.content.strip()
+    await asyncio.to_thread(message_cache.update, message['id'], summary=summary)
+    return summary
+
+
+@tool
+async def summarize_messages(message_ids: str = None, query: str = None, max_results: int = 10) -> str:
+    """Resume varios correos a la vez (ideal para "resumen de mis correos").
+
+    Args:
+        message_ids: IDs de mensajes separados por comas (opcional)
+        query: Consulta de búsqueda de Gmail si no se pasan IDs (opcional, por defecto "in:inbox")
+        max_results: Número máximo de mensajes a resumir (opcional, por defecto 10)
+
+    Returns:
+        Resumen narrativo de los mensajes seguido del resumen individual de cada uno
+    """
+    try:
+        limit = max(1, min(max_results, GMAIL_SUMMARY_MAX_MESSAGES))
+        if message_ids:
+            ids = [message_id.strip() for message_id in message_ids.split(',') if message_id.strip()][:limit]
+        else:
+            ids = await run_in_pool('gmail', _list_message_ids, query or 'in:inbox', limit)
+
+        if not ids:
+            return "📬 No se encontraron mensajes para resumir."
+
+        print(f"📧 [GMAIL_SUMMARY] Resumiendo {len(ids)} mensajes")
+
+        # Descarga concurrente (acotada) de los mensajes
+        fetch_slots = asyncio.Semaphore(GMAIL_FETCH_CONCURRENCY)
+
+        async def fetch(message_id):
+            async with fetch_slots:
+                return await run_in_pool('gmail', _fetch_message, message_id)
+
+        fetched = await asyncio.gather(*(fetch(message_id) for message_id in ids), return_exceptions=True)
+        messages = [message for message in fetched if not isinstance(message, Exception)]
+        failed = len(fetched) - len(messages)
+        if not messages:
+            return f"❌ Error al resumir los mensajes: {str(fetched[0])}"
+
+        # Map: un resumen por mensaje con concurrencia acotada; un fallo no descarta los demás
+        llm_slots = asyncio.Semaphore(GMAIL_SUMMARY_CONCURRENCY)
+        summaries = await asyncio.gather(*(_summarize_one(message, llm_slots) for message in messages),
+                                         return_exceptions=True)
+
+        entries = []
+        summarized = []
+        for message, summary in zip(messages, summaries):
+            headers = message['headers']
+            entry = (
+                f"- De: {headers.get('From', 'Desconocido')} | Asunto: {headers.get('Subject', 'Sin asunto')} | "
+                f"Fecha: {headers.get('Date', 'Fecha desconocida')[:16]} | ID: {message['id']}"
+            )
+            if isinstance(summary, Exception):
+                print(f"⚠️ [GMAIL_SUMMARY] No se pudo resumir el mensaje {message['id']}: {summary}")
+                entries.append(f"{entry}\n  ⚠️ No se pudo resumir este mensaje")
+                continue
+            entries.append(f"{entry}\n  {summary}")
+            summarized.append((entries[-1], summary))
+        if not summarized:
+            return f"❌ Error al resumir los mensajes: {str(summaries[0])}"
+
+        # Reduce: una sola llamada para la síntesis, solo con los mensajes resumidos
+        if len(summarized) == 1:
+            overview = summarized[0][1]
+        else:
+            response = await (REDUCE_PROMPT | LLM_EXECUTOR).ainvoke(
+                {'summaries': "\n".join(entry for entry, _ in summarized)}
+            )
+            overview = response.content.strip()
+
+        result = [f"📧 **Resumen de {len(messages)} mensajes:**\n", overview, "\n**Detalle por mensaje:**", *entries]
+        if failed:
+            result.append(f"\n⚠️ No se pudieron leer {failed} mensajes")
+        if len(summarized) < len(messages):
+            result.append(f"⚠️ No se pudieron resumir {len(messages) - len(summarized)} mensajes")
+        return "\n".join(result)
+    except FileNotFoundError as e:
+        return f"❌ Gmail no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al resumir los mensajes: {str(e)}"
+
+
+# Como el resto de las herramientas de Gmail: responde "no disponible" al instante con el circuito abierto
+bind_tools_to_pool('gmail', [summarize_messages])
@@ -0,0 +1,180 @@
+# google_async.py
+"""Cliente HTTP asíncrono (httpx) para las APIs REST de Google.
+
+Las herramientas más usadas tienen además una implementación nativa con corrutinas sobre
+este cliente, de modo que `ainvoke` no ocupa hilos: firma de peticiones con el token OAuth
+del usuario, decodificación JSON y paginación se resuelven en el event loop.
+"""
+
+import asyncio
+import json
+import os
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from .circuit import get_breaker
+from .credentials import credential_manager
+from .pools import run_in_pool
+from .ratelimit import RATE_LIMIT_MAX_RETRIES, is_retryable_response, rate_limiter, throttle
+
+# Timeout de cada petición (segundos)
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "20"))
+# Conexiones simultáneas del cliente compartido (todas las APIs de Google)
+GOOGLE_HTTP_MAX_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_MAX_CONNECTIONS", "100"))
+
+# Un cliente httpx por event loop: sus conexiones quedan atadas al loop que las abrió
+_HTTP_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+class GoogleApiError(Exception):
+    """Respuesta de error (4xx/5xx) de una API de Google."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+    @classmethod
+    def from_response(cls, response: httpx.Response) -> "GoogleApiError":
+        try:
+            message = response.json().get('error', {}).get('message') or response.text
+        except (ValueError, AttributeError):
+            message = response.text
+        return cls(response.status_code, message)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Cliente httpx compartido (pool de conexiones keep-alive) del event loop actual."""
+    loop = asyncio.get_running_loop()
+    client = _HTTP_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(GOOGLE_HTTP_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=GOOGLE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=GOOGLE_HTTP_MAX_CONNECTIONS // 2
+            ),
+        )
+        _HTTP_CLIENTS[loop] = client
+    return client
+
+
+async def close_http_clients():
+    """Cierra el cliente del event loop actual (al apagar el servidor)."""
+    client = _HTTP_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _clean_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Quita los None y convierte booleanos al formato que espera la API."""
+    cleaned = {}
+    for key, value in (params or {}).items():
+        if value is None:
+            continue
+        cleaned[key] = ('true' if value else 'false') if isinstance(value, bool) else value
+    return cleaned
+
+
+class AsyncGoogleClient:
+    """Cliente de una API de Google que firma con las credenciales del usuario actual."""
+
+    def __init__(self, api: str, base_url: str):
+        """Inicializar el cliente.
+
+        Args:
+            api: Nombre de la API registrada en el gestor de credenciales
+            base_url: URL base de la API, terminada en '/'
+        """
+        self.api = api
+        self.base_url = base_url
+
+    async def _access_token(self, user: str, stale_token: Optional[str] = None) -> str:
+        """Token vigente de `user`.
+
+        En el caso común sale de memoria sin bloquear; cargarlo o refrescarlo (una vez por
+        usuario, single-flight) se hace en el pool de hilos de la API.
+        """
+        if stale_token is None:
+            creds = credential_manager.cached_credentials(self.api, user)
+            if creds is not None:
+                return creds.token
+        creds = await run_in_pool(
+            self.api, credential_manager.get_credentials, self.api, user,
+            force_refresh=stale_token is not None, stale_token=stale_token
+        )
+        return creds.token
+
+    async def request(self, method: str, path: str, *, params: Dict[str, Any] = None,
+                      json_body: Any = None, headers: Dict[str, str] = None) -> Dict[str, Any]:
+        """Petición firmada y sujeta a la cuota y al circuito de la API.
+
+        Reintenta una vez con un token nuevo si la API responde 401, y con backoff ante 429/5xx.
+        """
+        # Las credenciales se resuelven antes del circuito: una cuenta sin vincular es un
+        # problema de ese usuario, no una falla de la API
+        user = credential_manager.effective_user(self.api)
+        token = await self._access_token(user)
+        with get_breaker(self.api).protect():
+            return await self._request(method, path, user, token, params=params, json_body=json_body,
+                                       headers=headers)
+
+    async def _request(self, method: str, path: str, user: str, token: str, *, params: Dict[str, Any] = None,
+                       json_body: Any = None, headers: Dict[str, str] = None) -> Dict[str, Any]:
+        url = path if path.startswith('http') else self.base_url + path
+        response = None
+        stale_token = None
+        refreshed = False
+        attempt = 0
+        while True:
+            await rate_limiter.aacquire(self.api, user)
+            if stale_token is not None:
+                token = await self._access_token(user, stale_token=stale_token)
+                stale_token = None
+            response = await get_http_client().request(
+                method,
+                url,
+                params=_clean_params(params),
+                json=json_body,
+                headers={**(headers or {}), 'Authorization': f'Bearer {token}'},
+            )
+            if response.status_code == 401 and not refreshed:
+                refreshed = True
+                stale_token = token
+                continue
+            if attempt < RATE_LIMIT_MAX_RETRIES and is_retryable_response(response.status_code, response.content):
+                throttle(self.api, user, attempt, response.status_code, response.headers.get('retry-after'),
+                         response.content)
+                attempt += 1
+                continue
+            break
+        if response.status_code >= 400:
+            raise GoogleApiError.from_response(response)
+        if response.status_code == 204 or not response.content:
+            return {}
+        try:
+            return response.json()
+        except json.JSONDecodeError:
+            return {}
+
+    async def get(self, path: str, **params) -> Dict[str, Any]:
+        return await self.request('GET', path, params=params)
+
+    async def paginate(self, path: str, items_key: str, params: Dict[str, Any] = None,
+                       limit: int = None) -> AsyncIterator[Dict[str, Any]]:
+        """Recorre todas las páginas (`nextPageToken`) devolviendo los elementos de `items_key`."""
+        params = dict(params or {})
+        produced = 0
+        while True:
+            response = await self.request('GET', path, params=params)
+            for item in response.get(items_key, []):
+                yield item
+                produced += 1
+                if limit is not None and produced >= limit:
+                    return
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return
+            params['pageToken'] = page_token
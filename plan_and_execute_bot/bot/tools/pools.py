@@ -0,0 +1,187 @@
+# pools.py
+"""Pools de hilos acotados por API para las llamadas bloqueantes de las herramientas.
+
+Los clientes de Google (googleapiclient/httplib2) y `requests` son síncronos. Cuando los
+ejecutores invocan las herramientas con `ainvoke`, cada llamada corre en el pool de su API:
+un Drive lento solo ocupa los hilos de Drive y no deja sin hilos a Calendar o al clima.
+Como httplib2 no es thread-safe, cada hilo construye y reutiliza su propio servicio.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable
+
+from .circuit import CircuitOpenError, get_breaker
+
+# Hilos por API (configurables con <API>_POOL_SIZE, p. ej. DRIVE_POOL_SIZE=2)
+DEFAULT_POOL_SIZES = {
+    'gmail': 8,
+    'calendar': 8,
+    'drive': 4,
+    'tasks': 4,
+    'weather': 8,
+}
+# Llamadas en espera por API antes de rechazar nuevas (<API>_POOL_MAX_QUEUE)
+DEFAULT_POOL_MAX_QUEUE = int(os.getenv("TOOL_POOL_MAX_QUEUE", "64"))
+
+
+class PoolSaturatedError(RuntimeError):
+    """La cola del pool de una API está llena."""
+
+
+class ApiPool:
+    """Pool de hilos de una API con métricas de cola y de espera."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        """Inicializar el pool.
+
+        Args:
+            name: Nombre de la API (gmail, drive, ...)
+            max_workers: Hilos simultáneos
+            max_queue: Llamadas en espera permitidas antes de rechazar
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _call(self, ctx: contextvars.Context, submitted_at: float, func: Callable, args, kwargs):
+        wait = time.monotonic() - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            # Se ejecuta en el contexto del llamador (p. ej. el usuario de la sesión actual)
+            return ctx.run(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Ejecuta `func` en un hilo del pool sin bloquear el event loop."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise PoolSaturatedError(f"El servicio {self.name} está saturado, reintenta en unos segundos")
+            self.queued += 1
+        ctx = contextvars.copy_context()
+        future = self._executor.submit(self._call, ctx, time.monotonic(), func, args, kwargs)
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Estado actual del pool."""
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                'max_workers': self.max_workers,
+                'active': self.active,
+                'queued': self.queued,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(1000 * self.total_wait / started, 1) if started else 0.0,
+                'max_wait_ms': round(1000 * self.max_wait, 1),
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+_POOLS: Dict[str, ApiPool] = {}
+_POOLS_LOCK = threading.Lock()
+_THREAD_LOCAL = threading.local()
+
+
+def get_pool(api: str) -> ApiPool:
+    """Devuelve (creándolo la primera vez) el pool de una API."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(api)
+        if pool is None:
+            size = int(os.getenv(f"{api.upper()}_POOL_SIZE", str(DEFAULT_POOL_SIZES.get(api, 4))))
+            max_queue = int(os.getenv(f"{api.upper()}_POOL_MAX_QUEUE", str(DEFAULT_POOL_MAX_QUEUE)))
+            pool = _POOLS[api] = ApiPool(api, size, max_queue)
+        return pool
+
+
+async def run_in_pool(api: str, func: Callable, *args, **kwargs) -> Any:
+    """Atajo para `get_pool(api).run(...)`."""
+    return await get_pool(api).run(func, *args, **kwargs)
+
+
+def thread_local_service(key: str, builder: Callable[[], Any]) -> Any:
+    """Devuelve el objeto construido por `builder` para el hilo actual, creándolo una sola vez por hilo."""
+    services = getattr(_THREAD_LOCAL, 'services', None)
+    if services is None:
+        services = _THREAD_LOCAL.services = {}
+    service = services.get(key)
+    if service is None:
+        service = services[key] = builder()
+    return service
+
+
+def bind_tools_to_pool(api: str, tools: Iterable) -> None:
+    """Hace que `ainvoke` de cada herramienta síncrona corra en el pool de su API.
+
+    Sin esto, LangChain usa el executor por defecto del event loop, compartido y sin
+    límites por API. Las herramientas con corrutina nativa solo se envuelven con el
+    circuito de la API: si está abierto, todas responden "no disponible" al instante.
+    """
+    for tool in tools:
+        if tool.coroutine is not None:
+            tool.coroutine = _guarded(api, tool.coroutine)
+        elif tool.func is not None:
+            tool.coroutine = _guarded(api, _pooled(api, tool.func))
+
+
+def _pooled(api: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def coroutine(*args, **kwargs):
+        try:
+            return await run_in_pool(api, func, *args, **kwargs)
+        except PoolSaturatedError as e:
+            return f"❌ Error: {str(e)}"
+    return coroutine
+
+
+def _guarded(api: str, coroutine_func: Callable) -> Callable:
+    @functools.wraps(coroutine_func)
+    async def coroutine(*args, **kwargs):
+        breaker = get_breaker(api)
+        # Sin ocupar hilos ni esperar timeouts mientras la dependencia está caída
+        if breaker.is_open():
+            return breaker.unavailable_message()
+        try:
+            return await coroutine_func(*args, **kwargs)
+        except CircuitOpenError as e:
+            return str(e)
+    return coroutine
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todos los pools creados."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return {pool.name: pool.metrics() for pool in pools}
+
+
+def shutdown_pools(wait: bool = True):
+    """Cierra todos los pools (al apagar el servidor)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
@@ -0,0 +1,284 @@
+# ratelimit.py
+"""Planificador central de cuotas: token buckets por API y por usuario, con backoff ante 429/5xx.
+
+Todas las llamadas de `bot/tools` pasan por acá: las síncronas de googleapiclient (vía
+`RateLimitedHttpRequest`), los fragmentos de subidas y descargas de Drive (vía
+`call_with_retries`, porque no usan `execute()`), las del cliente asíncrono y las de
+OpenWeather. Cuando no hay cupo la llamada espera su turno en lugar de fallar; si la API
+responde 429 o 5xx se reintenta con backoff exponencial con jitter, respetando `Retry-After`.
+Si lo agotado es la cuota de un usuario, solo se frena a ese usuario.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from .circuit import get_breaker
+
+# Cupos por defecto (peticiones por segundo, ráfaga máxima), alineados con las cuotas publicadas:
+# - Gmail: 250 unidades/usuario/s (~50 lecturas de 5 unidades)
+# - Calendar: ~600 peticiones/usuario/min
+# - Drive: 12.000 peticiones/min por proyecto
+# - Tasks: 50.000 peticiones/día por proyecto (repartidas de forma pareja en el día, con ráfagas cortas)
+# - OpenWeather (plan gratuito): 60 llamadas/min
+# Se pueden cambiar con <API>_RATE_PER_SEC, <API>_BURST, <API>_USER_RATE_PER_SEC y <API>_USER_BURST.
+# Los buckets viven en memoria: con varios procesos (WEB_CONCURRENCY, como uvicorn --workers) cada
+# uno usa cupo / procesos para que la suma respete la cuota.
+TASKS_DAILY_QUOTA = 50000
+DEFAULT_QUOTAS = {
+    #            global (rate, burst)   por usuario (rate, burst)
+    'gmail':    ((400.0, 400),          (40.0, 50)),
+    'calendar': ((100.0, 100),          (10.0, 20)),
+    'drive':    ((200.0, 200),          (20.0, 40)),
+    'tasks':    ((TASKS_DAILY_QUOTA / 86400, 20), (0.2, 10)),
+    'weather':  ((1.0, 10),             None),
+}
+
+# Reintentos ante 429/5xx
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "0.5"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "20"))
+# Espera máxima en cola antes de rechazar una llamada
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+# Procesos que comparten las cuotas
+RATE_LIMIT_PROCESSES = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+# Buckets por usuario que se mantienen en memoria
+RATE_LIMIT_MAX_USER_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_USER_BUCKETS", "1000"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Motivos de Google que se refieren a la cuota de un usuario (en minúsculas)
+USER_QUOTA_REASONS = (b'userratelimitexceeded', b'user-rate limit exceeded', b'concurrent requests for user')
+
+
+class RateLimitExceeded(RuntimeError):
+    """La espera por cupo superaría RATE_LIMIT_MAX_WAIT."""
+
+
+class TokenBucket:
+    """Token bucket con reservas: quien no tiene cupo recibe cuánto debe esperar (cola FIFO implícita)."""
+
+    def __init__(self, rate: float, capacity: float):
+        """Inicializar el bucket.
+
+        Args:
+            rate: Tokens que se reponen por segundo
+            capacity: Ráfaga máxima
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Descuenta `tokens` y devuelve los segundos que hay que esperar para usarlos."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+            self.granted += 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            if wait:
+                self.delayed += 1
+                self.total_wait += wait
+            return wait
+
+    def penalize(self, seconds: float):
+        """Vacía el bucket durante `seconds` (p. ej. tras un Retry-After) para que esperen todos."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate_per_sec': self.rate,
+                'capacity': self.capacity,
+                'available': round(max(self.tokens, 0.0), 2),
+                'utilization': round(1 - max(self.tokens, 0.0) / self.capacity, 3),
+                'granted': self.granted,
+                'delayed': self.delayed,
+                'avg_wait_ms': round(1000 * self.total_wait / self.delayed, 1) if self.delayed else 0.0,
+            }
+
+
+def _quota(api: str, scope: str, default: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    prefix = f"{api.upper()}_USER" if scope == 'user' else api.upper()
+    rate = os.getenv(f"{prefix}_RATE_PER_SEC")
+    burst = os.getenv(f"{prefix}_BURST")
+    if rate is None and default is None:
+        return None
+    rate = float(rate) if rate is not None else default[0]
+    burst = float(burst) if burst is not None else (default[1] if default else max(rate, 1.0))
+    return rate / RATE_LIMIT_PROCESSES, max(burst / RATE_LIMIT_PROCESSES, 1.0)
+
+
+class RateLimiter:
+    """Registro de buckets por API (cuota del proyecto) y por (API, usuario)."""
+
+    def __init__(self):
+        self._api_buckets: Dict[str, TokenBucket] = {}
+        self._user_buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        # api -> {'retries', 'throttled', 'rejected'}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _buckets(self, api: str, user: Optional[str]):
+        global_default, user_default = DEFAULT_QUOTAS.get(api, ((10.0, 10), None))
+        with self._lock:
+            if api not in self._api_buckets:
+                rate, burst = _quota(api, 'api', global_default)
+                self._api_buckets[api] = TokenBucket(rate, burst)
+            buckets = [self._api_buckets[api]]
+            if user is not None:
+                key = (api, user)
+                bucket = self._user_buckets.get(key)
+                if bucket is None:
+                    quota = _quota(api, 'user', user_default)
+                    if quota is not None:
+                        bucket = self._user_buckets[key] = TokenBucket(*quota)
+                        while len(self._user_buckets) > RATE_LIMIT_MAX_USER_BUCKETS:
+                            self._user_buckets.popitem(last=False)
+                else:
+                    self._user_buckets.move_to_end(key)
+                if bucket is not None:
+                    buckets.append(bucket)
+            return buckets
+
+    def count(self, api: str, counter: str):
+        """Suma uno al contador `counter` ('retries', 'throttled' o 'rejected') de la API."""
+        with self._lock:
+            counters = self._counters.setdefault(api, {'retries': 0, 'throttled': 0, 'rejected': 0})
+            counters[counter] += 1
+
+    def _reserve(self, api: str, user: Optional[str]) -> float:
+        wait = max(bucket.reserve() for bucket in self._buckets(api, user))
+        if wait > RATE_LIMIT_MAX_WAIT:
+            self.count(api, 'rejected')
+            raise RateLimitExceeded(f"Cuota de {api} agotada; reintenta en {int(wait)} segundos")
+        return wait
+
+    def acquire(self, api: str, user: Optional[str] = None):
+        """Espera (bloqueando el hilo) hasta tener cupo."""
+        wait = self._reserve(api, user)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, api: str, user: Optional[str] = None):
+        """Espera (sin bloquear el event loop) hasta tener cupo."""
+        wait = self._reserve(api, user)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def throttled(self, api: str, user: Optional[str], delay: float, user_quota: bool = False):
+        """Registra un 429/5xx y frena durante `delay` a quienes comparten la cuota agotada.
+
+        Con `user_quota` (cuota del usuario agotada) solo se frena el bucket de ese usuario;
+        si no, el de la API entera, que comparten todos los usuarios.
+        """
+        self.count(api, 'throttled')
+        buckets = self._buckets(api, user)
+        # Sin bucket propio (API sin cupo por usuario) se frena la API
+        buckets[-1 if user_quota else 0].penalize(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Uso de cuota por API (y cantidad de buckets por usuario activos)."""
+        with self._lock:
+            api_buckets = dict(self._api_buckets)
+            user_counts: Dict[str, int] = {}
+            for api, _ in self._user_buckets:
+                user_counts[api] = user_counts.get(api, 0) + 1
+            counters = {api: dict(values) for api, values in self._counters.items()}
+        return {
+            api: {
+                **bucket.metrics(),
+                'user_buckets': user_counts.get(api, 0),
+                **counters.get(api, {'retries': 0, 'throttled': 0, 'rejected': 0}),
+            }
+            for api, bucket in api_buckets.items()
+        }
+
+
+# Instancia global del planificador
+rate_limiter = RateLimiter()
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Espera antes del reintento: `Retry-After` si vino, si no exponencial con jitter completo."""
+    if retry_after:
+        try:
+            return min(float(retry_after), RATE_LIMIT_BACKOFF_MAX)
+        except ValueError:
+            pass  # Fecha HTTP: se usa el backoff normal
+    return random.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+
+
+def is_user_quota_error(content: Optional[bytes]) -> bool:
+    """True si Google informa la cuota de un usuario (no la del proyecto) como agotada."""
+    content = (content or b'').lower()
+    return any(reason in content for reason in USER_QUOTA_REASONS)
+
+
+def is_retryable_response(status: int, content: Optional[bytes]) -> bool:
+    """True para 429/5xx y para los 403 de cuota de Google."""
+    if status in RETRYABLE_STATUSES:
+        return True
+    # Google responde 403 (no 429) para rateLimitExceeded / userRateLimitExceeded
+    return status == 403 and b'ratelimitexceeded' in (content or b'').lower()
+
+
+def call_with_retries(api: str, user: Optional[str], func: Callable[[], Any]) -> Any:
+    """Ejecuta `func` respetando la cuota y el circuito de la API, reintentando ante 429/5xx."""
+    with get_breaker(api).protect():
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            rate_limiter.acquire(api, user)
+            try:
+                return func()
+            except HttpError as e:
+                if attempt == RATE_LIMIT_MAX_RETRIES or not is_retryable_response(e.resp.status, e.content):
+                    raise
+                throttle(api, user, attempt, e.resp.status, e.resp.get('retry-after'), e.content)
+
+
+def throttle(api: str, user: Optional[str], attempt: int, status: int, retry_after: Optional[str] = None,
+             content: Optional[bytes] = None) -> float:
+    """Registra una respuesta reintentable y frena la cuota; devuelve la espera aplicada.
+
+    No duerme: la penalización del bucket hace que el próximo `acquire` espere. Si el cuerpo
+    indica la cuota de un usuario solo se frena a ese usuario.
+    """
+    delay = backoff_delay(attempt, retry_after)
+    print(f"⏳ [RATE_LIMIT] {api} respondió {status}; reintento {attempt + 1} en {delay:.1f}s")
+    rate_limiter.throttled(api, user, delay, user_quota=is_user_quota_error(content))
+    rate_limiter.count(api, 'retries')
+    return delay
+
+
+def rate_limited_request_builder(api: str, user_resolver: Callable[[], Optional[str]]):
+    """`requestBuilder` para `googleapiclient.discovery.build`: cada `execute()` pasa por el planificador."""
+
+    class RateLimitedHttpRequest(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            parent_execute = super().execute
+            return call_with_retries(api, user_resolver(), lambda: parent_execute(http=http, num_retries=0))
+
+    return RateLimitedHttpRequest
+
+
+def rate_limit_metrics() -> Dict[str, Any]:
+    """Uso de cuota y reintentos por API (para exponer en /metrics o logs)."""
+    return rate_limiter.metrics()
@@ -2,47 +2,32 @@
 
 import os
 from pathlib import Path
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
 from langchain.tools import tool
 
+from .google_async import AsyncGoogleClient
+from .credentials import credential_manager
+from .pools import bind_tools_to_pool
+
 
 # 1) Configuración
 SCOPES = ['https://www.googleapis.com/auth/tasks']
 
 # Configurar rutas relativas al directorio raíz del proyecto
 _CURRENT_DIR = Path(__file__).parent.parent.parent.parent  # Subir 4 niveles desde bot/tools/tasks.py
-CREDS_FILE = str(_CURRENT_DIR / 'credentials.json')
 TOKEN_FILE = str(_CURRENT_DIR / 'tasks_token.json')
 
+credential_manager.register_api('tasks', SCOPES, TOKEN_FILE, 'tasks', 'v1')
+
 def get_service():
-    """Obtiene el servicio de Google Tasks con manejo mejorado de errores."""
+    """Devuelve el servicio de Google Tasks del usuario actual para este hilo (httplib2 no es thread-safe)."""
     try:
-        # Verificar si existe el archivo de credenciales
-        if not Path(CREDS_FILE).exists():
-            raise FileNotFoundError(f"No se encontró el archivo {CREDS_FILE}. Por favor, configura las credenciales de Google Tasks siguiendo las instrucciones en CONFIGURACION_TASKS.md")
-        
-        creds = None
-        # 2) Cargar credenciales guardadas si existen
-        if Path(TOKEN_FILE).exists():
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-        # 3) Si no hay creds o no son válidas, ejecutar el flujo de OAuth
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(CREDS_FILE, SCOPES)
-                creds = flow.run_local_server(port=0)
-            # Guardar para próximas ejecuciones
-            with open(TOKEN_FILE, 'w', encoding='utf-8') as token:
-                token.write(creds.to_json())
-        # 4) Construir el servicio
-        return build('tasks', 'v1', credentials=creds)
+        return credential_manager.get_service('tasks')
+    except FileNotFoundError:
+        raise
     except Exception as e:
         raise Exception(f"Error al configurar Google Tasks: {str(e)}")
 
+
 def get_task_id_by_title(title: str) -> str:
     """Función auxiliar para obtener el ID de una tarea por su título."""
     try:
@@ -283,3 +268,53 @@ def add_subtask(parent_task_title: str, subtask_title: str) -> str:
         return error_msg
 
 
+# --- IMPLEMENTACIONES ASÍNCRONAS (sin hilos) ---
+
+tasks_api = AsyncGoogleClient('tasks', 'https://tasks.googleapis.com/tasks/v1/')
+
+
+async def _acreate_task(title: str) -> str:
+    print(f"🔄 [DEBUG] Creating task: {title}")
+    try:
+        # Una sola lectura de los títulos existentes (solo tareas principales) para evitar duplicados
+        existing = {
+            task['title'].lower()
+            async for task in tasks_api.paginate('lists/@default/tasks', 'items', params={'maxResults': 100})
+            if not task.get('parent')
+        }
+        if title.lower() in existing:
+            original_title = title
+            counter = 1
+            while title.lower() in existing:
+                title = f"{original_title} ({counter})"
+                counter += 1
+
+        task = await tasks_api.request('POST', 'lists/@default/tasks', json_body={'title': title})
+        return f"Tarea creada: «{task['title']}» (id: {task['id']})"
+    except FileNotFoundError as e:
+        return f"❌ Google Tasks no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al crear la tarea: {str(e)}"
+
+
+async def _alist_tasks() -> str:
+    try:
+        items = [
+            task async for task in tasks_api.paginate(
+                'lists/@default/tasks', 'items', params={'showCompleted': False, 'maxResults': 100}
+            )
+        ]
+        if not items:
+            return "No tienes tareas pendientes."
+        return "\n".join(f"- {t['title']} (id: {t['id']})" for t in items)
+    except FileNotFoundError as e:
+        return f"❌ Google Tasks no está configurado: {str(e)}"
+    except Exception as e:
+        return f"❌ Error al listar las tareas: {str(e)}"
+
+
+create_task.coroutine = _acreate_task
+list_tasks.coroutine = _alist_tasks
+
+# El resto de las invocaciones asíncronas (ainvoke) corren en el pool de hilos de Tasks
+bind_tools_to_pool('tasks', [create_task, list_tasks, complete_task, delete_task, edit_task, search_tasks, add_subtask])
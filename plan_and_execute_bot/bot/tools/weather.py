@@ -4,18 +4,53 @@ from datetime import datetime
 from collections import defaultdict
 from langchain.tools import tool
 
+from .pools import bind_tools_to_pool, thread_local_service
+from .circuit import get_breaker
+from .ratelimit import RATE_LIMIT_MAX_RETRIES, is_retryable_response, rate_limiter, throttle
+
 
 API_KEY = os.getenv('OPENWEATHER_API_KEY')
 BASE_URL_CURRENT  = "https://api.openweathermap.org/data/2.5/weather"
 BASE_URL_FORECAST = "https://api.openweathermap.org/data/2.5/forecast"
 BASE_URL_GEOCODE  = "http://api.openweathermap.org/geo/1.0/direct"
 BASE_URL_AIRQ     = "http://api.openweathermap.org/data/2.5/air_pollution"
+# Timeout de cada petición a OpenWeather (segundos)
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "10"))
+
+
+def _get(url: str, params: dict) -> requests.Response:
+    """GET reutilizando la sesión del hilo actual, dentro del cupo por minuto y del circuito de OpenWeather."""
+    session = thread_local_service('weather', requests.Session)
+    breaker = get_breaker('weather')
+    breaker.check()
+    available = None
+    try:
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            rate_limiter.acquire('weather')
+            resp = session.get(url, params=params, timeout=WEATHER_HTTP_TIMEOUT)
+            if attempt == RATE_LIMIT_MAX_RETRIES or not is_retryable_response(resp.status_code, resp.content):
+                break
+            throttle('weather', None, attempt, resp.status_code, resp.headers.get('Retry-After'))
+        available = resp.status_code < 500 and resp.status_code != 429
+    except requests.RequestException:
+        available = False
+        raise
+    finally:
+        if available is None:
+            # Falló antes de obtener respuesta (p. ej. RateLimitExceeded): no se registra nada,
+            # pero se libera la llamada de prueba para que el circuito no quede abierto para siempre
+            breaker.release_probe()
+        elif available:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    return resp
 
 @tool
 def get_weather(location: str) -> str:
     """Clima actual (descr, temp, humedad)."""
     params = {"q": location, "appid": API_KEY, "units": "metric", "lang": "es"}
-    resp = requests.get(BASE_URL_CURRENT, params=params)
+    resp = _get(BASE_URL_CURRENT, params=params)
     data = resp.json()
     if resp.status_code != 200:
         return f"Error al obtener el clima: {data.get('message','desconocido')}"
@@ -28,7 +63,7 @@ def get_weather(location: str) -> str:
 def get_next_rain_day(location: str) -> str:
     """Primer día con lluvia en los próximos 5 días."""
     params = {"q": location, "appid": API_KEY, "units": "metric", "lang": "es"}
-    resp = requests.get(BASE_URL_FORECAST, params=params)
+    resp = _get(BASE_URL_FORECAST, params=params)
     data = resp.json()
     if resp.status_code != 200:
         return f"Error al obtener el pronóstico: {data.get('message','desconocido')}"
@@ -50,7 +85,7 @@ def get_next_rain_day(location: str) -> str:
 def geocode(location: str) -> tuple[float,float] | None:
     """Devuelve (lat, lon) o None si falla."""
     params = {"q": location, "limit":1, "appid": API_KEY}
-    resp = requests.get(BASE_URL_GEOCODE, params=params)
+    resp = _get(BASE_URL_GEOCODE, params=params)
     arr = resp.json()
     if not arr: return None
     return arr[0]["lat"], arr[0]["lon"]
@@ -63,7 +98,7 @@ def get_air_quality(location: str) -> str:
         return f"No pude geolocalizar {location}."
     lat, lon = coords
     params = {"lat": lat, "lon": lon, "appid": API_KEY}
-    resp = requests.get(BASE_URL_AIRQ, params=params)
+    resp = _get(BASE_URL_AIRQ, params=params)
     data = resp.json()
     if resp.status_code != 200:
         return f"Error AQI: {data.get('message','desconocido')}"
@@ -77,7 +112,7 @@ def get_air_quality(location: str) -> str:
 def get_sun_times(location: str) -> str:
     """Salida y puesta de sol para hoy."""
     params = {"q": location, "appid": API_KEY}
-    resp = requests.get(BASE_URL_CURRENT, params=params)
+    resp = _get(BASE_URL_CURRENT, params=params)
     data = resp.json()
     if resp.status_code != 200:
         return f"Error al obtener sol: {data.get('message','desconocido')}"
@@ -92,7 +127,7 @@ def get_sun_times(location: str) -> str:
 def get_weekly_summary(location: str) -> str:
     """Min/Max diarios de los próximos 5 días."""
     params = {"q": location, "appid": API_KEY, "units": "metric"}
-    resp = requests.get(BASE_URL_FORECAST, params=params)
+    resp = _get(BASE_URL_FORECAST, params=params)
     data = resp.json()
     if resp.status_code != 200:
         return f"Error resumen: {data.get('message','desconocido')}"
@@ -112,7 +147,7 @@ def get_weekly_summary(location: str) -> str:
 def get_clothing_advice(location: str) -> str:
     """Recomendación de ropa según el clima actual."""
     params = {"q": location, "appid": API_KEY, "units": "metric", "lang":"es"}
-    resp = requests.get(BASE_URL_CURRENT, params=params)
+    resp = _get(BASE_URL_CURRENT, params=params)
     data = resp.json()
     if resp.status_code != 200:
         return f"Error ropa: {data.get('message','desconocido')}"
@@ -130,3 +165,8 @@ def get_clothing_advice(location: str) -> str:
     return "Recomendación: " + " y ".join(consejo) + "."
 
 
+# Las invocaciones asíncronas (ainvoke) corren en el pool de hilos del clima
+bind_tools_to_pool('weather', [
+    get_weather, get_next_rain_day, geocode, get_air_quality, get_sun_times,
+    get_weekly_summary, get_clothing_advice
+])
@@ -0,0 +1,136 @@
+# admission.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from xml.sax.saxutils import escape
+
+LOGGER = logging.getLogger("admission")
+
+BUSY_TWIML = (
+    '<?xml version="1.0" encoding="UTF-8"?><Response><Message>{message}</Message></Response>'
+)
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+
+class SenderBucket:
+    """Token bucket de un remitente (mensajes/segundo con ráfaga)."""
+
+    __slots__ = ("tokens", "updated_at", "notified_at")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated_at = now
+        self.notified_at = 0.0
+
+
+class AdmissionController:
+    """Control de admisión en la entrada del webhook.
+
+    Cada turno admitido termina en una ejecución del grafo (varias llamadas al LLM), así que
+    antes de crear un trabajo nuevo se revisa el cupo del remitente y la carga total de la cola.
+    Lo que no entra recibe una respuesta fija sin pasar por el LLM.
+
+    Se cobra por turno: la cola llama a `admit` solo después de descartar los reintentos de
+    Twilio y de agrupar los mensajes seguidos del mismo remitente (ver `JobQueue.enqueue`).
+    """
+
+    def __init__(self, sender_rate: float = 0.2, sender_burst: int = 5, max_pending: int = 100,
+                 notify_cooldown: float = 60.0, max_senders: int = 10000, enabled: bool = True):
+        """Inicializar el control de admisión.
+
+        Args:
+            sender_rate: Turnos por segundo admitidos por remitente (0 = sin límite)
+            sender_burst: Ráfaga máxima por remitente
+            max_pending: Trabajos en cola o en curso a partir de los cuales se rechaza (0 = sin límite)
+            notify_cooldown: Segundos entre avisos de "estoy ocupado" a un mismo remitente
+            max_senders: Remitentes recordados en memoria (LRU)
+            enabled: False deja pasar todo (solo cuenta)
+        """
+        self.sender_rate = sender_rate
+        self.sender_burst = sender_burst
+        self.max_pending = max_pending
+        self.notify_cooldown = notify_cooldown
+        self.max_senders = max_senders
+        self.enabled = enabled
+        self._buckets: "OrderedDict[str, SenderBucket]" = OrderedDict()
+        self._pending_value = 0
+        # `admit` corre en el hilo de la cola
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.shed_sender = 0
+        self.shed_global = 0
+        self.notified = 0
+
+    def _take_sender_token(self, sender: str, now: float) -> bool:
+        if self.sender_rate <= 0:
+            return True
+        bucket = self._buckets.get(sender)
+        if bucket is None:
+            bucket = SenderBucket(self.sender_burst, now)
+            self._buckets[sender] = bucket
+            if len(self._buckets) > self.max_senders:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(sender)
+            bucket.tokens = min(self.sender_burst, bucket.tokens + (now - bucket.updated_at) * self.sender_rate)
+            bucket.updated_at = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True
+        return False
+
+    def admit(self, sender: str, pending: int) -> Optional[str]:
+        """None si el turno se admite; si no, el motivo del rechazo ('sender' o 'global').
+
+        Args:
+            sender: Remitente del turno
+            pending: Trabajos en cola o en curso (los cuenta la cola en la misma transacción)
+        """
+        with self._lock:
+            self._pending_value = pending
+            if not self.enabled:
+                self.admitted += 1
+                return None
+            if self.max_pending and pending >= self.max_pending:
+                self.shed_global += 1
+                LOGGER.warning(f"🚦 Mensaje de {sender} rechazado: {pending} trabajos pendientes")
+                return "global"
+            if not self._take_sender_token(sender, time.monotonic()):
+                self.shed_sender += 1
+                LOGGER.warning(f"🚦 Mensaje de {sender} rechazado: supera su cupo")
+                return "sender"
+            self.admitted += 1
+            return None
+
+    def should_notify(self, sender: str) -> bool:
+        """True si corresponde avisarle al remitente (como mucho una vez cada `notify_cooldown`)."""
+        with self._lock:
+            bucket = self._buckets.get(sender)
+            now = time.monotonic()
+            if bucket is not None:
+                if now - bucket.notified_at < self.notify_cooldown:
+                    return False
+                bucket.notified_at = now
+            self.notified += 1
+            return True
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'admitted': self.admitted,
+                'shed_sender': self.shed_sender,
+                'shed_global': self.shed_global,
+                'notified': self.notified,
+                'pending': self._pending_value,
+                'max_pending': self.max_pending,
+                'tracked_senders': len(self._buckets),
+            }
+
+
+def busy_twiml(message: str) -> str:
+    """Respuesta TwiML fija para mensajes rechazados (sin LLM)."""
+    return BUSY_TWIML.format(message=escape(message))
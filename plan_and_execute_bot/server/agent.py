@@ -23,14 +23,19 @@ class Agent:
             LOGGER.error(f"❌ Error inicializando chatbot grafo: {e}")
             raise
 
-    async def invoke(self, id: str, user_message: str, images: list = None) -> str:
+    async def invoke(self, id: str, user_message: str, images: list = None, media: list = None,
+                     raise_errors: bool = False) -> str:
         """
         Process a user message through the chatbot graph directly.
         
         Args:
             id: The unique identifier for the conversation (WhatsApp phone number)
             user_message: The message content from the user
-            images: List of dictionaries with image data
+            images: List of dictionaries with image data (legacy, data URIs)
+            media: List of MediaRef dicts (archivos descargados a disco)
+            raise_errors: Propagar los errores previos al grafo (la cola reintenta) en vez de responder con un
+                mensaje de emergencia. Los del grafo nunca se propagan: sus herramientas ya pudieron enviar
+                correos o crear eventos, y reintentar el turno los repetiría
             
         Returns:
             str: The response message from the bot
@@ -43,19 +48,31 @@ class Agent:
             # Ensure session exists in memory
             memory.get_or_create_session(session_id)
             
-            # Add user message to memory
-            memory.add_message(session_id, "user", user_message)
+            # Add user message to memory (un reintento de la cola no lo duplica)
+            last = memory.get_conversation_history(session_id, limit=1)
+            if not (last and last[-1].get('role') == "user" and last[-1].get('content') == user_message):
+                memory.add_message(session_id, "user", user_message)
             
             # TODO: Handle images if needed (for future implementation)
             if images:
                 LOGGER.info(f"Received {len(images)} images (image processing not yet implemented)")
             
+            # La media viaja por referencia: el modelo ve identificadores opacos (media:<sha256>),
+            # ni bytes en base64 ni rutas del servidor; las herramientas de Drive los resuelven
+            graph_input = user_message
+            if media:
+                LOGGER.info(f"Received {len(media)} media files")
+                attachments = "\n".join(
+                    f"- media:{item['sha256']} ({item['content_type']}, {item['size']} bytes)" for item in media
+                )
+                graph_input = f"{user_message}\n\nArchivos adjuntos:\n{attachments}"
+            
             # Prepare state for the chatbot
             state = {
-                "input": user_message,
+                "input": graph_input,
                 "session_id": session_id,
                 "conversation_history": [],
-                "past_steps": []
+                "past_steps": [],
             }
             
             LOGGER.info(f"Processing message with chatbot: '{user_message}'")
@@ -96,6 +113,8 @@ class Agent:
                 return fallback_msg
             
         except Exception as e:
+            if raise_errors:
+                raise
             error_msg = f"Ocurrió un error al procesar tu mensaje. Por favor, inténtalo de nuevo."
             LOGGER.error(f"Error during invoke: {str(e)}", exc_info=True)
             
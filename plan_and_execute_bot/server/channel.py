@@ -1,39 +1,44 @@
 # channel.py
-import base64, logging, requests
+import logging
 import asyncio
 from abc import ABC, abstractmethod
 
 from fastapi import Request, HTTPException
 from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client
 
 from server.agent import Agent
-from server.config import TWILIO_AUTH_TOKEN, TWILIO_ACCOUNT_SID, TWILIO_WHATSAPP_NUMBER
+from server.config import (
+    TWILIO_AUTH_TOKEN, TWILIO_ACCOUNT_SID, TWILIO_WHATSAPP_NUMBER,
+    TWILIO_SEND_RATE, TWILIO_SEND_MAX_RETRIES, TWILIO_MESSAGE_MAX_CHARS, TWILIO_HTTP_TIMEOUT,
+    MEDIA_DIR, MEDIA_MAX_BYTES, MEDIA_TTL, MEDIA_TIMEOUT, SERVER_PROCESSES,
+)
+from server.ingress import InboundMessage, get_inbound
+from server.media import MediaStore
+from server.outbound import TwilioDeliveryUnknownError, TwilioOutbound, TwilioSendError
 
 LOGGER = logging.getLogger("whatsapp")
 
+# Clave del payload de la cola donde queda la respuesta ya generada: un reintento solo la reenvía
+REPLY_CHECKPOINT_KEY = "_reply"
 
-def twilio_url_to_data_uri(url: str, content_type: str = None) -> str:
-    """Download the Twilio media URL and convert to data‑URI (base64)."""
-    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN):
-        raise RuntimeError("Twilio credentials are missing")
 
-    LOGGER.info(f"Downloading image from Twilio URL: {url}")
-    resp = requests.get(url, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), timeout=20)
-    resp.raise_for_status()
+def merge_twilio_messages(first: dict, later: dict) -> dict:
+    """Combina dos webhooks consecutivos del mismo remitente en un solo turno (texto y media)."""
+    merged = dict(first)
+    bodies = [first.get("Body", ""), later.get("Body", "")]
+    merged["Body"] = "\n".join(body for body in bodies if body.strip())
 
-    # Use provided content_type or get from headers
-    mime = content_type or resp.headers.get('Content-Type')
+    # Renumerar la media del segundo mensaje a continuación de la del primero
+    num_media = int(first.get("NumMedia", "0") or 0)
+    later_media = int(later.get("NumMedia", "0") or 0)
+    for i in range(later_media):
+        merged[f"MediaUrl{num_media + i}"] = later.get(f"MediaUrl{i}", "")
+        merged[f"MediaContentType{num_media + i}"] = later.get(f"MediaContentType{i}", "")
+    merged["NumMedia"] = str(num_media + later_media)
 
-    # Ensure we have a proper image mime type
-    if not mime or not mime.startswith('image/'):
-        LOGGER.warning(f"Converting non-image MIME type '{mime}' to 'image/jpeg'")
-        mime = "image/jpeg"  # Default to jpeg if not an image type
-
-    b64 = base64.b64encode(resp.content).decode()
-    data_uri = f"data:{mime};base64,{b64}"
-
-    return data_uri
+    sids = [first.get("CoalescedMessageSids") or first.get("MessageSid", ""), later.get("MessageSid", "")]
+    merged["CoalescedMessageSids"] = ",".join(sid for sid in sids if sid)
+    return merged
 
 class WhatsAppAgent(ABC):
     @abstractmethod
@@ -44,8 +49,33 @@ class WhatsAppAgentTwilio(WhatsAppAgent):
         if not (TWILIO_AUTH_TOKEN and TWILIO_ACCOUNT_SID):
             raise ValueError("Twilio credentials are not configured")
         self.agent = Agent()
-        # Inicializar cliente de Twilio para envío de mensajes
-        self.twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        # Cliente asíncrono de Twilio para envío de mensajes
+        from_number = f"whatsapp:{TWILIO_WHATSAPP_NUMBER}" if TWILIO_WHATSAPP_NUMBER != "sandbox" else "whatsapp:+14155238886"
+        self.outbound = TwilioOutbound(
+            TWILIO_ACCOUNT_SID,
+            TWILIO_AUTH_TOKEN,
+            from_number,
+            # El ritmo se mide por proceso: se reparte entre los procesos del servidor
+            rate_per_number=TWILIO_SEND_RATE / SERVER_PROCESSES,
+            max_retries=TWILIO_SEND_MAX_RETRIES,
+            max_chars=TWILIO_MESSAGE_MAX_CHARS,
+            timeout=TWILIO_HTTP_TIMEOUT
+        )
+        # Media entrante: se descarga a disco y viaja por referencia
+        self.media = MediaStore(
+            MEDIA_DIR,
+            (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+            max_bytes=MEDIA_MAX_BYTES,
+            ttl=MEDIA_TTL,
+            timeout=MEDIA_TIMEOUT
+        )
+    
+    async def _collect_media(self, message: InboundMessage) -> list:
+        """Descarga en paralelo toda la media del mensaje y devuelve sus referencias."""
+        if not message.media:
+            return []
+        refs = await self.media.fetch_all([(url, ctype or None) for url, ctype in message.media])
+        return [ref.as_dict() for ref in refs]
     
     def _clean_whatsapp_text(self, text: str) -> str:
         """Limpia el texto para que sea compatible con WhatsApp/Twilio."""
@@ -68,135 +98,113 @@ class WhatsAppAgentTwilio(WhatsAppAgent):
         return text.strip()
 
     async def send_whatsapp_message(self, to_number: str, message: str):
-        """Envía un mensaje de WhatsApp usando la API REST de Twilio."""
+        """Envía un mensaje de WhatsApp usando la API REST de Twilio (sin bloquear el event loop)."""
         try:
             # Limpiar el texto antes de enviarlo
             clean_message = self._clean_whatsapp_text(message)
             
-            # Limitar la longitud de la respuesta para WhatsApp
-            if len(clean_message) > 1600:  # WhatsApp tiene límite de caracteres
-                clean_message = clean_message[:1600] + "..."
-                LOGGER.warning("Respuesta truncada por límite de WhatsApp")
-            
-            # Determinar el número de origen
-            from_number = f"whatsapp:{TWILIO_WHATSAPP_NUMBER}" if TWILIO_WHATSAPP_NUMBER != "sandbox" else "whatsapp:+14155238886"
-            
-            # Enviar mensaje usando la API de Twilio
-            message_instance = self.twilio_client.messages.create(
-                body=clean_message,
-                from_=from_number,
-                to=to_number
-            )
+            # Las respuestas largas se envían en varias partes ordenadas en lugar de truncarse
+            sids = await self.outbound.send(to_number, clean_message)
             
-            LOGGER.info(f"✅ Mensaje enviado exitosamente. SID: {message_instance.sid}")
-            LOGGER.info(f"📱 De: {from_number} → Para: {to_number}")
+            LOGGER.info(f"✅ Mensaje enviado exitosamente. SID: {', '.join(sids)}")
+            LOGGER.info(f"📱 De: {self.outbound.from_number} → Para: {to_number}")
             LOGGER.info(f"📝 Contenido: {clean_message[:100]}{'...' if len(clean_message) > 100 else ''}")
             
         except Exception as e:
             LOGGER.error(f"❌ Error enviando mensaje de WhatsApp: {e}")
             raise
 
-    async def handle_message_async(self, form_data: dict):
-        """Maneja mensajes de WhatsApp de forma asíncrona y envía respuesta usando API de Twilio."""
+    async def handle_message_async(self, form_data: dict, last_attempt: bool = True):
+        """Maneja mensajes de WhatsApp de forma asíncrona y envía respuesta usando API de Twilio.
+
+        Se reintentan (propagando el error a la cola) solo las fallas previas al grafo, como la
+        descarga de media, y las del envío. Una vez que el grafo corrió sus herramientas ya pudieron
+        enviar correos, crear eventos o subir archivos: la respuesta queda en `form_data` (la cola
+        la guarda al reintentar) y el reintento solo la reenvía, sin volver a ejecutar el turno.
+        La disculpa al usuario se envía solo en el último intento.
+        """
+        message = InboundMessage.from_form(form_data)
+        sender = message.sender
+        content = message.body
+
+        if not sender:
+            # Reintentarlo no lo arregla
+            LOGGER.error("Missing 'From' in request form")
+            return
+
         try:
-            sender = form_data.get("From", "").strip()
-            content = form_data.get("Body", "").strip()
-            
-            if not sender:
-                LOGGER.error("Missing 'From' in request form")
-                return
-
-            LOGGER.info(f"📱 Procesando mensaje de {sender}: {content[:50]}{'...' if len(content) > 50 else ''}")
-
-            # Collect ALL images (you'll forward only the first one for now)
-            images = []
-            num_media = int(form_data.get("NumMedia", "0"))
-            for i in range(num_media):
-                url = form_data.get(f"MediaUrl{i}", "")
-                ctype = form_data.get(f"MediaContentType{i}", "")
-                if url and ctype.startswith("image/"):
-                    try:
-                        images.append({
-                            "url": url,
-                            "data_uri": twilio_url_to_data_uri(url, ctype),
-                        })
-                    except Exception as err:
-                        LOGGER.error("Failed to download %s: %s", url, err)
-
-            # Assemble payload for the LangGraph agent
-            input_data = {
-                "id": sender,
-                "user_message": content,
-            }
-            if images:
-                # Pass all images to the agent
-                input_data["images"] = [
-                    {"image_url": {"url": img["data_uri"]}} for img in images
-                ]
-
-            # Procesar mensaje con el agente con manejo robusto de errores
-            reply = None
-            try:
+            reply = form_data.get(REPLY_CHECKPOINT_KEY)
+            if reply is not None:
+                LOGGER.info(f"♻️ Reenviando a {sender} la respuesta ya generada (sin volver a ejecutar el grafo)")
+            else:
+                LOGGER.info(f"📱 Procesando mensaje de {sender}: {content[:50]}{'...' if len(content) > 50 else ''}")
+
+                # Descargar toda la media en paralelo (streaming, con tope de tamaño)
+                media = await self._collect_media(message)
+
+                # Assemble payload for the LangGraph agent
+                input_data = {
+                    "id": sender,
+                    "user_message": content,
+                }
+                if media:
+                    # Referencias a archivos en disco; los bytes se leen solo si se necesitan
+                    input_data["media"] = media
+
+                # Solo se propagan los errores previos al grafo; los del grafo vuelven como mensaje de emergencia
                 LOGGER.info("🤖 Procesando mensaje con el agente...")
-                reply = await self.agent.invoke(**input_data)
+                reply = await self.agent.invoke(**input_data, raise_errors=not last_attempt)
                 LOGGER.info("✅ Agente procesó el mensaje exitosamente")
-            except Exception as e:
-                LOGGER.error(f"❌ Error crítico en el agente: {e}", exc_info=True)
-                # Respuesta de emergencia si todo lo demás falla
-                reply = "Lo siento, estoy experimentando dificultades técnicas. Por favor, inténtalo de nuevo en unos momentos."
-            
-            # Asegurar que tenemos una respuesta válida
-            if not reply or not isinstance(reply, str) or not reply.strip():
-                LOGGER.warning("El agente no devolvió una respuesta válida")
-                reply = "Disculpa, no pude procesar tu mensaje. Por favor, inténtalo de nuevo."
-            
+
+                # Asegurar que tenemos una respuesta válida
+                if not reply or not isinstance(reply, str) or not reply.strip():
+                    LOGGER.warning("El agente no devolvió una respuesta válida")
+                    reply = "Disculpa, no pude procesar tu mensaje. Por favor, inténtalo de nuevo."
+
+                # Desde acá el turno no se vuelve a ejecutar: si el envío falla, el reintento solo reenvía
+                form_data[REPLY_CHECKPOINT_KEY] = reply
+
             # Enviar la respuesta usando la API de Twilio
             await self.send_whatsapp_message(sender, reply)
-            
+
+        except TwilioDeliveryUnknownError as e:
+            # Twilio pudo haberlo entregado: reintentar el trabajo duplicaría la respuesta
+            LOGGER.error(f"❌ No se sabe si la respuesta a {sender} se entregó; no se reenvía: {e}")
         except Exception as e:
+            if not last_attempt:
+                LOGGER.warning(f"⚠️ Error procesando mensaje de {sender}, se reintentará: {e}")
+                raise
             LOGGER.exception(f"❌ Error crítico en handle_message_async: {e}")
-            # Intentar enviar mensaje de error
-            try:
-                if 'sender' in locals() and sender:
+            # Si lo que falló fue el envío, la disculpa tampoco saldría
+            if not isinstance(e, TwilioSendError):
+                try:
                     await self.send_whatsapp_message(
-                        sender, 
+                        sender,
                         "Lo siento, ocurrió un error inesperado. Por favor, inténtalo de nuevo."
                     )
-            except:
-                LOGGER.error("No se pudo enviar mensaje de error")
+                except Exception:
+                    LOGGER.error("No se pudo enviar mensaje de error")
+            raise
 
     async def handle_message(self, request: Request) -> str:
-        form = await request.form()
+        message = get_inbound(request) or InboundMessage.from_form(await request.form())
 
-        sender  = form.get("From", "").strip()
-        content = form.get("Body", "").strip()
+        sender  = message.sender
+        content = message.body
         if not sender:
             raise HTTPException(400, detail="Missing 'From' in request form")
 
-        # Collect ALL images (you'll forward only the first one for now)
-        images = []
-        for i in range(int(form.get("NumMedia", "0"))):
-            url   = form.get(f"MediaUrl{i}", "")
-            ctype = form.get(f"MediaContentType{i}", "")
-            if url and ctype.startswith("image/"):
-                try:
-                    images.append({
-                        "url": url,
-                        "data_uri": twilio_url_to_data_uri(url, ctype),
-                    })
-                except Exception as err:
-                    LOGGER.error("Failed to download %s: %s", url, err)
+        # Descargar toda la media en paralelo (streaming, con tope de tamaño)
+        media = await self._collect_media(message)
 
         # Assemble payload for the LangGraph agent
         input_data = {
             "id": sender,
             "user_message": content,
         }
-        if images:
-            # Pass all images to the agent
-            input_data["images"] = [
-                {"image_url": {"url": img["data_uri"]}} for img in images
-            ]
+        if media:
+            # Referencias a archivos en disco; los bytes se leen solo si se necesitan
+            input_data["media"] = media
 
         # Procesar mensaje con el agente con manejo robusto de errores
         reply = None
@@ -1,5 +1,7 @@
 from os import environ
 import logging
+import os
+import tempfile
 import sys
 
 LOGGER = logging.getLogger(__name__)
@@ -9,12 +11,60 @@ LANGGRAPH_URL = environ.get("LANGGRAPH_URL", "http://localhost:2024")
 ASSISTANT_ID = environ.get("LANGGRAPH_ASSISTANT_ID", "agent")
 CONFIG = environ.get("CONFIG") or "{}"
 
+# Procesos del servidor (uvicorn --workers N; uvicorn toma el valor por defecto de WEB_CONCURRENCY).
+# Los cupos que viven en memoria (admisión por remitente, ritmo de envío y cuotas de Google en
+# bot/tools/ratelimit.py) son por proceso, así que cada uno usa su parte: límite / procesos
+SERVER_PROCESSES = max(int(environ.get("WEB_CONCURRENCY", "1")), 1)
+
 # Configuración de Twilio
 TWILIO_AUTH_TOKEN = environ.get("TWILIO_AUTH_TOKEN")
 TWILIO_ACCOUNT_SID = environ.get("TWILIO_ACCOUNT_SID")
 # Para sandbox no necesitas número específico - Twilio maneja esto automáticamente
 TWILIO_WHATSAPP_NUMBER = environ.get("TWILIO_WHATSAPP_NUMBER", "sandbox")
 
+# Envío de respuestas por la API REST de Twilio
+TWILIO_SEND_RATE = float(environ.get("TWILIO_SEND_RATE", "1"))  # mensajes/segundo por número de origen
+TWILIO_SEND_MAX_RETRIES = int(environ.get("TWILIO_SEND_MAX_RETRIES", "3"))
+TWILIO_MESSAGE_MAX_CHARS = int(environ.get("TWILIO_MESSAGE_MAX_CHARS", "1600"))
+TWILIO_HTTP_TIMEOUT = float(environ.get("TWILIO_HTTP_TIMEOUT", "15"))
+
+# Media entrante (imágenes, audios, documentos)
+MEDIA_DIR = environ.get("MEDIA_DIR", os.path.join(tempfile.gettempdir(), "whatsapp_media"))
+MEDIA_MAX_BYTES = int(environ.get("MEDIA_MAX_BYTES", str(16 * 1024 * 1024)))
+MEDIA_TTL = float(environ.get("MEDIA_TTL", "86400"))
+MEDIA_TIMEOUT = float(environ.get("MEDIA_TIMEOUT", "20"))
+
+# Cola durable de mensajes entrantes
+JOBQUEUE_PATH = environ.get("JOBQUEUE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "jobqueue.sqlite3"))
+JOBQUEUE_WORKERS = int(environ.get("JOBQUEUE_WORKERS", "4"))
+JOBQUEUE_VISIBILITY_TIMEOUT = float(environ.get("JOBQUEUE_VISIBILITY_TIMEOUT", "300"))
+JOBQUEUE_MAX_ATTEMPTS = int(environ.get("JOBQUEUE_MAX_ATTEMPTS", "3"))
+JOBQUEUE_MAX_DEPTH = int(environ.get("JOBQUEUE_MAX_DEPTH", "10000"))
+JOBQUEUE_DRAIN_TIMEOUT = float(environ.get("JOBQUEUE_DRAIN_TIMEOUT", "30"))
+# Segundos de espera que suben un trabajo una clase de prioridad (0 = orden de llegada)
+JOBQUEUE_PRIORITY_AGING = float(environ.get("JOBQUEUE_PRIORITY_AGING", "15"))
+# Varios procesos (uvicorn --workers N): cada remitente se atiende siempre en el mismo proceso
+JOBQUEUE_STICKY = environ.get("JOBQUEUE_STICKY", "false").lower() in ("true", "1", "yes")
+JOBQUEUE_HEARTBEAT_TTL = float(environ.get("JOBQUEUE_HEARTBEAT_TTL", "15"))
+JOBQUEUE_STICKY_MAX_WAIT = float(environ.get("JOBQUEUE_STICKY_MAX_WAIT", "10"))
+
+# Idempotencia de webhooks (MessageSid) y agrupación de mensajes seguidos del mismo remitente
+WHATSAPP_DEDUPE_TTL = float(environ.get("WHATSAPP_DEDUPE_TTL", "86400"))
+WHATSAPP_DEDUPE_MAX_KEYS = int(environ.get("WHATSAPP_DEDUPE_MAX_KEYS", "100000"))
+WHATSAPP_COALESCE_WINDOW = float(environ.get("WHATSAPP_COALESCE_WINDOW", "2"))  # 0 = sin agrupar
+WHATSAPP_COALESCE_MAX_WAIT = float(environ.get("WHATSAPP_COALESCE_MAX_WAIT", "8"))
+
+# Control de admisión en el webhook (protege la cuota del LLM)
+ADMISSION_ENABLED = environ.get("ADMISSION_ENABLED", "true").lower() in ("true", "1", "yes")
+ADMISSION_SENDER_RATE = float(environ.get("ADMISSION_SENDER_RATE", "0.2"))  # mensajes/segundo por remitente
+ADMISSION_SENDER_BURST = int(environ.get("ADMISSION_SENDER_BURST", "5"))
+ADMISSION_MAX_PENDING = int(environ.get("ADMISSION_MAX_PENDING", "100"))  # trabajos en cola + en curso
+ADMISSION_NOTIFY_COOLDOWN = float(environ.get("ADMISSION_NOTIFY_COOLDOWN", "60"))
+ADMISSION_BUSY_MESSAGE = environ.get(
+    "ADMISSION_BUSY_MESSAGE",
+    "⏳ Estoy ocupado atendiendo muchos mensajes. Dame unos minutos y vuelve a escribirme."
+)
+
 # Configuración de logs
 LOG_LEVEL = environ.get("LOG_LEVEL", "INFO")
 DEBUG = environ.get("DEBUG", "false").lower() in ("true", "1", "yes")
@@ -0,0 +1,125 @@
+# ingress.py
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import Message
+from twilio.request_validator import RequestValidator
+
+LOGGER = logging.getLogger("ingress")
+
+
+@dataclass(frozen=True)
+class InboundMessage:
+    """Mensaje entrante de WhatsApp, parseado una sola vez por webhook."""
+    message_sid: str
+    sender: str
+    body: str
+    # ((url, content_type), ...) en el orden en que llegaron
+    media: Tuple[Tuple[str, str], ...] = ()
+    # Formulario completo tal como lo envió Twilio (solo lectura)
+    form: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}), repr=False, compare=False)
+
+    @classmethod
+    def from_form(cls, form: Mapping[str, Any]) -> "InboundMessage":
+        """Construye el mensaje a partir de un formulario de Twilio (dict, FormData o payload de la cola)."""
+        flat = {key: str(value) for key, value in form.items()}
+        media = []
+        for i in range(int(flat.get("NumMedia", "0") or 0)):
+            url = flat.get(f"MediaUrl{i}", "")
+            if url:
+                media.append((url, flat.get(f"MediaContentType{i}", "")))
+        return cls(
+            message_sid=flat.get("MessageSid", ""),
+            sender=flat.get("From", "").strip(),
+            body=flat.get("Body", "").strip(),
+            media=tuple(media),
+            form=MappingProxyType(flat),
+        )
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "InboundMessage":
+        return cls.from_form(parse_form(body))
+
+    def as_form(self) -> Dict[str, str]:
+        """Formulario como dict plano (serializable, para la cola)."""
+        return dict(self.form)
+
+
+def parse_form(body: bytes) -> Dict[str, str]:
+    """application/x-www-form-urlencoded -> dict plano (primer valor de cada clave)."""
+    form: Dict[str, str] = {}
+    for key, value in parse_qsl(body.decode(), keep_blank_values=True):
+        form.setdefault(key, value)
+    return form
+
+
+@lru_cache(maxsize=4)
+def get_validator(auth_token: str) -> RequestValidator:
+    """Validador de firmas de Twilio, uno por token durante toda la vida del proceso."""
+    return RequestValidator(auth_token)
+
+
+@lru_cache(maxsize=64)
+def public_url(proto: str, host: str, path: str, query: str = "") -> str:
+    """URL pública con la que Twilio firmó el webhook (detrás de un proxy usa los X-Forwarded-*).
+
+    Twilio firma la URL completa: si el webhook se configuró con parámetros, van incluidos.
+    """
+    url = f"{proto}://{host}{path}"
+    return f"{url}?{query}" if query else url
+
+
+def get_inbound(request: Request) -> Optional[InboundMessage]:
+    """Mensaje que dejó TwilioIngressMiddleware en el estado del request (None si no pasó por él)."""
+    return getattr(request.state, "inbound", None)
+
+
+class TwilioIngressMiddleware(BaseHTTPMiddleware):
+    """Lee y parsea el webhook una sola vez, valida la firma y deja un InboundMessage en `request.state.inbound`."""
+
+    def __init__(self, app, auth_token: str, paths: Iterable[str] = ("/whatsapp",),
+                 unsigned_paths: Iterable[str] = ()):
+        """
+        Args:
+            auth_token: Token de Twilio para validar las firmas
+            paths: Rutas con firma obligatoria
+            unsigned_paths: Rutas que se parsean sin validar firma (pruebas)
+        """
+        super().__init__(app)
+        self.validator = get_validator(auth_token)
+        self.paths = frozenset(paths)
+        self.unsigned_paths = frozenset(unsigned_paths)
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        if request.method != "POST" or (path not in self.paths and path not in self.unsigned_paths):
+            return await call_next(request)
+
+        body = await request.body()
+        message = InboundMessage.from_body(body)
+
+        if path in self.paths:
+            proto = request.headers.get("x-forwarded-proto", request.url.scheme)
+            host = request.headers.get("x-forwarded-host", request.headers.get("host"))
+            url = public_url(proto, host, path, request.url.query)
+            sig = request.headers.get("X-Twilio-Signature", "")
+            if not self.validator.validate(url, message.form, sig):
+                LOGGER.warning("Invalid Twilio signature for %s", url)
+                return Response(status_code=401, content="Invalid Twilio signature")
+
+        request.state.inbound = message
+
+        # Rewind: por si algún handler todavía lee el body crudo
+        async def _replay() -> Message:
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        request._body = body
+        request._receive = _replay  # type: ignore[attr-defined]
+
+        return await call_next(request)
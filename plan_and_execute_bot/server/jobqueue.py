@@ -0,0 +1,517 @@
+# jobqueue.py
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from server.sticky import HashRing, default_worker_id
+
+LOGGER = logging.getLogger("jobqueue")
+
+
+class QueueFullError(RuntimeError):
+    """La cola superó su profundidad máxima."""
+
+
+class JobRejectedError(RuntimeError):
+    """El control de admisión (`admit` de `enqueue`) rechazó el trabajo nuevo."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Trabajo rechazado ({reason})")
+        self.reason = reason
+
+
+@dataclass
+class Job:
+    id: int
+    payload: Dict[str, Any]
+    attempts: int
+    enqueued_at: float
+    priority: int = 1
+
+
+class JobQueue:
+    """Cola durable en SQLite con visibility timeout.
+
+    Un trabajo tomado por un worker queda invisible durante `visibility_timeout`; si el
+    proceso muere antes del ack, vuelve a estar disponible y otro worker lo reintenta.
+
+    Los trabajos se toman por prioridad (menor = antes) con envejecimiento: cada
+    `priority_aging` segundos de espera un trabajo sube una clase, así los largos no
+    quedan postergados indefinidamente detrás de los interactivos.
+
+    Con `sticky=True` (varios procesos sobre el mismo archivo) cada trabajo se asigna a un
+    worker por hashing consistente de su `sticky_key` (el remitente), entre los workers con
+    heartbeat reciente. Así las sesiones de un usuario quedan en la memoria de un mismo
+    proceso. Si el dueño deja de latir, o el trabajo espera más de `sticky_max_wait`,
+    cualquier worker lo toma.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 300, max_attempts: int = 3,
+                 max_depth: int = 10000, retry_delay: float = 5, dedupe_ttl: float = 86400,
+                 dedupe_max_keys: int = 100000, priority_aging: float = 15, sticky: bool = False,
+                 worker_id: Optional[str] = None, heartbeat_ttl: float = 15, sticky_max_wait: float = 10):
+        """Inicializar la cola.
+
+        Args:
+            path: Archivo SQLite
+            visibility_timeout: Segundos que un trabajo tomado queda oculto a otros workers
+            max_attempts: Intentos antes de marcarlo como fallido
+            max_depth: Trabajos pendientes admitidos antes de rechazar nuevos
+            retry_delay: Espera base (se duplica por intento) antes de reintentar
+            dedupe_ttl: Segundos que se recuerda una clave de idempotencia
+            dedupe_max_keys: Máximo de claves de idempotencia guardadas
+            priority_aging: Segundos de espera que equivalen a subir una clase de prioridad (0 = FIFO)
+            sticky: Asignar cada trabajo a un worker por hashing consistente de su `sticky_key`
+            worker_id: Identificador de este proceso (por defecto <host>:<pid>)
+            heartbeat_ttl: Segundos sin heartbeat tras los que un worker se da por caído
+            sticky_max_wait: Segundos que un trabajo espera a su dueño antes de que otro lo tome
+        """
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.max_depth = max_depth
+        self.retry_delay = retry_delay
+        self.dedupe_ttl = dedupe_ttl
+        self.dedupe_max_keys = dedupe_max_keys
+        self.priority_aging = priority_aging
+        self.sticky = sticky
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat_ttl = heartbeat_ttl
+        self.sticky_max_wait = sticky_max_wait
+        self._ring = HashRing()
+        self._ring_refreshed_at = 0.0
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                visible_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        # Colas creadas antes de que existiera la agrupación por remitente
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'coalesce_key' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN coalesce_key TEXT")
+        # ... y antes de la prioridad por costo estimado
+        if 'priority' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 1")
+        # ... y antes del despacho sticky entre procesos
+        if 'owner' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_visible ON jobs (status, visible_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_coalesce ON jobs (coalesce_key, status)")
+        # Claves de idempotencia ya vistas (conjunto acotado con TTL)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen_keys (
+                key TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_keys_age ON seen_keys (seen_at)")
+        # Workers vivos (uno por proceso) para el despacho sticky
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            )
+        """)
+
+        # Métricas del proceso
+        self.enqueued = 0
+        self.duplicates = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_processing = 0.0
+        # Espera por clase de prioridad: {prioridad: [trabajos tomados, segundos de espera, espera máxima]}
+        self.wait_by_priority: Dict[int, List[float]] = {}
+
+    def enqueue(self, payload: Dict[str, Any], delay: float = 0, dedupe_key: Optional[str] = None,
+                coalesce_key: Optional[str] = None,
+                merge: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None,
+                max_delay: Optional[float] = None, priority: int = 1,
+                sticky_key: Optional[str] = None,
+                admit: Optional[Callable[[int], Optional[str]]] = None) -> Optional[int]:
+        """Persiste un trabajo; visible para los workers después de `delay` segundos.
+
+        Args:
+            payload: Datos del trabajo (serializables a JSON)
+            delay: Segundos antes de que un worker pueda tomarlo
+            dedupe_key: Clave de idempotencia; si ya se vio, el trabajo se descarta
+            coalesce_key: Si hay un trabajo pendiente (aún no visible) con la misma clave, se
+                combina con este usando `merge` en lugar de encolar uno nuevo
+            merge: Función (payload_anterior, payload_nuevo) -> payload combinado
+            max_delay: Espera máxima desde el primer trabajo combinado
+            priority: Clase de prioridad (menor = antes); al combinar queda la más pesada
+            sticky_key: Clave de afinidad (con `sticky`, decide qué worker procesa el trabajo)
+            admit: Control de admisión `admit(pendientes) -> motivo | None`. Solo se consulta si hay
+                que crear un trabajo nuevo: los duplicados y los mensajes combinados no se cobran
+
+        Returns:
+            Optional[int]: ID del trabajo (nuevo o combinado), o None si era un duplicado
+
+        Raises:
+            QueueFullError: La cola superó `max_depth`
+            JobRejectedError: `admit` rechazó el trabajo (no se guarda nada, tampoco la clave)
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if dedupe_key is not None:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO seen_keys (key, seen_at) VALUES (?, ?)", (dedupe_key, now)
+                    )
+                    if cursor.rowcount == 0:
+                        self._conn.execute("COMMIT")
+                        self.duplicates += 1
+                        return None
+                    self._purge_seen_keys(now)
+
+                if coalesce_key is not None and merge is not None:
+                    row = self._conn.execute(
+                        "SELECT id, payload, enqueued_at FROM jobs "
+                        "WHERE coalesce_key = ? AND status = 'queued' AND attempts = 0 AND visible_at > ? "
+                        "ORDER BY id DESC LIMIT 1",
+                        (coalesce_key, now)
+                    ).fetchone()
+                    if row is not None:
+                        visible_at = now + delay
+                        if max_delay is not None:
+                            visible_at = min(visible_at, row[2] + max_delay)
+                        self._conn.execute(
+                            "UPDATE jobs SET payload = ?, visible_at = ?, priority = MAX(priority, ?) WHERE id = ?",
+                            (json.dumps(merge(json.loads(row[1]), payload)), visible_at, priority, row[0])
+                        )
+                        self._conn.execute("COMMIT")
+                        self.coalesced += 1
+                        return row[0]
+
+                pending = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'processing')"
+                ).fetchone()[0]
+                if pending >= self.max_depth:
+                    # El ROLLBACK también olvida la clave: el reintento de Twilio podrá entrar
+                    raise QueueFullError(f"La cola tiene {pending} trabajos pendientes")
+                if admit is not None:
+                    reason = admit(pending)
+                    if reason is not None:
+                        raise JobRejectedError(reason)
+                owner = None
+                if self.sticky and sticky_key is not None:
+                    self._refresh_ring(now)
+                    owner = self._ring.node_for(sticky_key)
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (payload, enqueued_at, visible_at, coalesce_key, priority, owner) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (json.dumps(payload), now, now + delay, coalesce_key, priority, owner)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.enqueued += 1
+            return cursor.lastrowid
+
+    def _purge_seen_keys(self, now: float):
+        """Vence las claves viejas y recorta el conjunto (como mucho una vez por minuto)."""
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        self._conn.execute("DELETE FROM seen_keys WHERE seen_at < ?", (now - self.dedupe_ttl,))
+        self._conn.execute(
+            "DELETE FROM seen_keys WHERE key IN ("
+            "SELECT key FROM seen_keys ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+            (self.dedupe_max_keys,)
+        )
+
+    def _refresh_ring(self, now: float, force: bool = False):
+        """Reconstruye el anillo con los workers vivos (como mucho cada heartbeat_ttl / 3)."""
+        if not force and now - self._ring_refreshed_at < self.heartbeat_ttl / 3:
+            return
+        self._ring_refreshed_at = now
+        live = {row[0] for row in self._conn.execute(
+            "SELECT worker_id FROM workers WHERE heartbeat_at >= ?", (now - self.heartbeat_ttl,)
+        )}
+        if live != self._ring.nodes:
+            self._ring = HashRing(live)
+            LOGGER.info(f"🔁 Workers vivos para despacho sticky: {len(live)}")
+
+    def heartbeat(self):
+        """Registra este proceso como vivo y borra los workers caídos hace rato."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (worker_id, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (self.worker_id, now)
+            )
+            self._conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - 10 * self.heartbeat_ttl,))
+            self._refresh_ring(now, force=True)
+
+    def unregister(self):
+        """Da de baja este proceso: sus trabajos pendientes pasan a cualquier otro worker."""
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            self._conn.execute(
+                "UPDATE jobs SET owner = NULL WHERE owner = ? AND status = 'queued'", (self.worker_id,)
+            )
+
+    def dequeue(self) -> Optional[Job]:
+        """Toma el trabajo visible más prioritario, con envejecimiento (incluye los de workers caídos cuyo timeout venció).
+
+        Los de workers caídos que ya usaron `max_attempts` intentos quedan como 'failed'.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Tomados que vencieron sin ack ni nack (el worker murió) y ya gastaron todos los
+                # intentos: un trabajo que tumba al proceso no se reentrega para siempre
+                abandoned = self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', "
+                    "last_error = 'visibility timeout vencido en el último intento' "
+                    "WHERE status = 'processing' AND visible_at <= ? AND attempts >= ?",
+                    (now, self.max_attempts)
+                ).rowcount
+                if abandoned:
+                    self.failed += abandoned
+                    LOGGER.warning(f"⚠️ {abandoned} trabajos marcados como fallidos: agotaron los intentos sin terminar")
+                where = "status IN ('queued', 'processing') AND visible_at <= ?"
+                params: List[Any] = [now]
+                if self.sticky:
+                    # Propios, sin dueño, de un dueño caído o que ya esperaron demasiado
+                    where += (
+                        " AND (owner IS NULL OR owner = ? OR enqueued_at <= ?"
+                        " OR owner NOT IN (SELECT worker_id FROM workers WHERE heartbeat_at >= ?))"
+                    )
+                    params += [self.worker_id, now - self.sticky_max_wait, now - self.heartbeat_ttl]
+                if self.priority_aging > 0:
+                    # Prioridad efectiva = clase - espera / aging (la espera cuenta desde que se encoló)
+                    order = "priority - (? - enqueued_at) / ?, id"
+                    params += [now, self.priority_aging]
+                else:
+                    order = "id"
+                row = self._conn.execute(
+                    f"SELECT id, payload, attempts, enqueued_at, priority FROM jobs WHERE {where} ORDER BY {order} LIMIT 1",
+                    params
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'processing', attempts = attempts + 1, visible_at = ? WHERE id = ?",
+                    (now + self.visibility_timeout, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.total_wait += now - row[3]
+            stats = self.wait_by_priority.setdefault(row[4], [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += now - row[3]
+            stats[2] = max(stats[2], now - row[3])
+            return Job(id=row[0], payload=json.loads(row[1]), attempts=row[2] + 1, enqueued_at=row[3],
+                       priority=row[4])
+
+    def ack(self, job: Job, processing_time: float = 0.0):
+        """Trabajo completado: se borra de la cola."""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+            self.completed += 1
+            self.total_processing += processing_time
+
+    def nack(self, job: Job, error: str):
+        """Trabajo fallido: se reintenta con backoff o, agotados los intentos, queda como 'failed'.
+
+        Se guarda `job.payload` tal como lo dejó el handler, así el reintento retoma desde ahí.
+        """
+        payload = json.dumps(job.payload)
+        with self._lock:
+            if job.attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', payload = ?, last_error = ? WHERE id = ?",
+                    (payload, error, job.id)
+                )
+                self.failed += 1
+            else:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', payload = ?, visible_at = ?, last_error = ? WHERE id = ?",
+                    (payload, time.time() + delay, error, job.id)
+                )
+                self.retried += 1
+
+    def release(self, job: Job):
+        """Devuelve un trabajo sin terminar (apagado) para que se retome enseguida, sin gastar un intento."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, visible_at = ? WHERE id = ?",
+                (time.time(), job.id)
+            )
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {'queued': 0, 'processing': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def oldest_wait(self) -> float:
+        """Segundos que lleva esperando el trabajo pendiente más antiguo."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM jobs WHERE status = 'queued'"
+            ).fetchone()
+        return time.time() - row[0] if row[0] else 0.0
+
+    def metrics(self) -> Dict[str, Any]:
+        started = self.completed + self.retried + self.failed
+        return {
+            'depth': self.depth(),
+            'oldest_wait_ms': round(self.oldest_wait() * 1000),
+            'enqueued': self.enqueued,
+            'duplicates': self.duplicates,
+            'coalesced': self.coalesced,
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed,
+            'avg_wait_ms': round(1000 * self.total_wait / started, 1) if started else 0.0,
+            'avg_processing_ms': round(1000 * self.total_processing / self.completed, 1) if self.completed else 0.0,
+            'sticky_workers': len(self._ring.nodes) if self.sticky else None,
+            'wait_by_priority': {
+                priority: {
+                    'dequeued': int(count),
+                    'avg_wait_ms': round(1000 * total / count, 1) if count else 0.0,
+                    'max_wait_ms': round(1000 * worst, 1),
+                }
+                for priority, (count, total, worst) in sorted(self.wait_by_priority.items())
+            },
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WorkerPool:
+    """Pool de workers async que vacía la cola con concurrencia acotada."""
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 concurrency: int = 4, poll_interval: float = 1.0):
+        """Inicializar el pool.
+
+        Args:
+            queue: Cola de la que se toman los trabajos
+            handler: Corrutina `handler(payload, last_attempt=...)`; si lanza una excepción el trabajo
+                se reintenta. `last_attempt` es True en el último intento (para avisar al usuario).
+                Lo que el handler anote en `payload` se guarda al reintentar (p. ej. el avance ya hecho)
+            concurrency: Workers simultáneos (= grafos ejecutándose a la vez)
+            poll_interval: Segundos entre consultas cuando la cola está vacía
+        """
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._in_flight: Dict[int, Job] = {}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        if self.queue.sticky:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        LOGGER.info(f"✅ {self.concurrency} workers de la cola iniciados")
+
+    async def _heartbeat(self):
+        """Mantiene vivo el registro de este proceso para el despacho sticky."""
+        while not self._stopping:
+            try:
+                await asyncio.to_thread(self.queue.heartbeat)
+            except Exception:
+                LOGGER.exception("Error registrando heartbeat")
+            await asyncio.sleep(self.queue.heartbeat_ttl / 3)
+
+    async def submit(self, payload: Dict[str, Any], delay: float = 0, **options) -> Optional[int]:
+        """Encola un trabajo (ver `JobQueue.enqueue`) y despierta a un worker."""
+        job_id = await asyncio.to_thread(self.queue.enqueue, payload, delay, **options)
+        if job_id is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def _worker(self, index: int):
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self.queue.dequeue)
+            except Exception:
+                LOGGER.exception("Error leyendo la cola")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._in_flight[job.id] = job
+            start = time.monotonic()
+            try:
+                await self.handler(job.payload, last_attempt=job.attempts >= self.queue.max_attempts)
+            except asyncio.CancelledError:
+                # Apagado sin terminar: otro proceso (o el próximo arranque) lo retoma
+                await asyncio.to_thread(self.queue.release, job)
+                raise
+            except Exception as e:
+                LOGGER.error(f"❌ Trabajo {job.id} falló (intento {job.attempts}): {e}")
+                await asyncio.to_thread(self.queue.nack, job, str(e))
+            else:
+                await asyncio.to_thread(self.queue.ack, job, time.monotonic() - start)
+            finally:
+                self._in_flight.pop(job.id, None)
+
+    async def stop(self, drain_timeout: float = 30):
+        """Deja de tomar trabajos y espera a los que están en curso hasta `drain_timeout`."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+            await asyncio.to_thread(self.queue.unregister)
+        if not self._tasks:
+            return
+        LOGGER.info(f"⏳ Drenando la cola: {len(self._in_flight)} trabajos en curso")
+        done, pending = await asyncio.wait(self._tasks, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            LOGGER.warning(f"⚠️ {len(pending)} workers cancelados al vencer el drenaje; sus trabajos vuelven a la cola")
+        self._tasks = []
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.queue.metrics(),
+            'workers': self.concurrency,
+            'in_flight': len(self._in_flight),
+            'worker_id': self.queue.worker_id,
+        }
@@ -0,0 +1,150 @@
+# media.py
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+LOGGER = logging.getLogger("media")
+
+
+class MediaTooLargeError(RuntimeError):
+    """El archivo supera el tamaño máximo permitido."""
+
+
+@dataclass(frozen=True)
+class MediaRef:
+    """Referencia a un archivo descargado; los bytes quedan en disco hasta que alguien los necesite."""
+    sha256: str
+    path: str
+    content_type: str
+    size: int
+    source_url: str
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MediaStore:
+    """Descargas en streaming, con tope de tamaño, a un almacén temporal direccionado por contenido."""
+
+    def __init__(self, root: str, auth: Tuple[str, str], max_bytes: int = 10 * 1024 * 1024,
+                 ttl: float = 86400, timeout: float = 20.0, chunk_size: int = 64 * 1024):
+        """Inicializar el almacén.
+
+        Args:
+            root: Carpeta donde se guardan los archivos (<sha256[:2]>/<sha256>.<ext>)
+            auth: Credenciales (account SID, auth token) para las URLs de media de Twilio
+            max_bytes: Tamaño máximo por archivo
+            ttl: Segundos que se conservan los archivos
+            timeout: Timeout de cada descarga (segundos)
+            chunk_size: Tamaño de cada bloque leído
+        """
+        self.root = Path(root)
+        self.auth = auth
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._client: Optional[httpx.AsyncClient] = None
+        self._last_purge = 0.0
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.bytes_downloaded = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            # Twilio redirige las URLs de media a su almacenamiento
+            self._client = httpx.AsyncClient(auth=self.auth, timeout=httpx.Timeout(self.timeout),
+                                             follow_redirects=True)
+        return self._client
+
+    async def fetch(self, url: str, content_type: str = None) -> MediaRef:
+        """Descarga `url` en bloques, cortando si supera `max_bytes`, y la guarda por su SHA-256."""
+        tmp_path = self.root / f".{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with self._get_client().stream("GET", url) as response:
+                response.raise_for_status()
+                declared = int(response.headers.get("Content-Length") or 0)
+                if declared > self.max_bytes:
+                    raise MediaTooLargeError(f"{declared} bytes (máximo {self.max_bytes})")
+                content_type = content_type or response.headers.get("Content-Type", "application/octet-stream")
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise MediaTooLargeError(f"más de {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        f.write(chunk)
+        except MediaTooLargeError:
+            self.rejected += 1
+            tmp_path.unlink(missing_ok=True)
+            raise
+        except Exception:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        sha256 = digest.hexdigest()
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ""
+        path = self.root / sha256[:2] / f"{sha256}{extension}"
+        if path.exists():
+            # Mismo contenido ya descargado (p. ej. un reenvío): se reutiliza
+            tmp_path.unlink(missing_ok=True)
+            os.utime(path)
+            self.deduplicated += 1
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(tmp_path, path)
+        self.downloaded += 1
+        self.bytes_downloaded += size
+        return MediaRef(sha256=sha256, path=str(path), content_type=content_type, size=size, source_url=url)
+
+    async def fetch_all(self, items: List[Tuple[str, str]]) -> List[MediaRef]:
+        """Descarga en paralelo [(url, content_type), ...]; las que fallan se registran y se omiten."""
+        await asyncio.to_thread(self.purge_expired)
+        results = await asyncio.gather(*(self.fetch(url, ctype) for url, ctype in items), return_exceptions=True)
+        refs = []
+        for (url, _), result in zip(items, results):
+            if isinstance(result, Exception):
+                LOGGER.error("Failed to download %s: %s", url, result)
+            else:
+                refs.append(result)
+        return refs
+
+    def purge_expired(self):
+        """Borra los archivos más viejos que `ttl` (como mucho una vez por hora)."""
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        for path in self.root.rglob("*"):
+            try:
+                if path.is_file() and now - path.stat().st_mtime > self.ttl:
+                    path.unlink()
+            except OSError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'downloaded': self.downloaded,
+            'deduplicated': self.deduplicated,
+            'rejected': self.rejected,
+            'bytes_downloaded': self.bytes_downloaded,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,213 @@
+# outbound.py
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+LOGGER = logging.getLogger("outbound")
+
+TWILIO_API_URL = "https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+# Solo se reintenta lo que seguro no se entregó: 429/503 (Twilio no aceptó el mensaje) y errores
+# antes de enviar la petición. Un 500/502/504 o un timeout de lectura pueden llegar después de que
+# Twilio lo aceptó, y reintentar duplicaría el mensaje
+RETRYABLE_STATUSES = {429, 503}
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Espacio reservado para el prefijo "(n/m) " de cada parte
+PART_PREFIX_RESERVE = 8
+
+
+class TwilioSendError(RuntimeError):
+    """Twilio rechazó el mensaje (o se agotaron los reintentos)."""
+
+
+class TwilioDeliveryUnknownError(TwilioSendError):
+    """No se sabe si Twilio aceptó el mensaje (timeout de lectura, 5xx): no hay que reenviarlo."""
+
+
+def split_message(text: str, max_chars: int = 1600) -> List[str]:
+    """Divide una respuesta larga en partes ordenadas "(1/3) ...", cortando en párrafos, oraciones o palabras."""
+    if len(text) <= max_chars:
+        return [text]
+    size = max_chars - PART_PREFIX_RESERVE
+    parts = []
+    remaining = text
+    while len(remaining) > size:
+        cut = -1
+        for separator in ("\n", ". ", " "):
+            position = remaining.rfind(separator, 0, size)
+            # Solo cortes que no dejen partes demasiado cortas
+            if position >= size // 2:
+                cut = position + len(separator)
+                break
+        if cut == -1:
+            cut = size
+        parts.append(remaining[:cut].rstrip())
+        remaining = remaining[cut:].lstrip()
+    if remaining:
+        parts.append(remaining)
+    return [f"({i}/{len(parts)}) {part}" for i, part in enumerate(parts, 1)]
+
+
+class NumberPacer:
+    """Ritmo de envío por número de origen (mensajes/segundo); las esperas se atienden en orden de llegada."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot: Dict[str, float] = defaultdict(float)
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def wait(self, number: str) -> float:
+        """Espera el turno de `number` y devuelve los segundos esperados."""
+        if not self.interval:
+            return 0.0
+        async with self._locks[number]:
+            now = time.monotonic()
+            wait = max(self._next_slot[number] - now, 0.0)
+            self._next_slot[number] = max(now, self._next_slot[number]) + self.interval
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class TwilioOutbound:
+    """Envío asíncrono de mensajes de WhatsApp por la API REST de Twilio."""
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, rate_per_number: float = 1.0,
+                 max_retries: int = 3, max_chars: int = 1600, timeout: float = 15.0, max_connections: int = 20):
+        """Inicializar el emisor.
+
+        Args:
+            account_sid: SID de la cuenta de Twilio
+            auth_token: Token de la cuenta
+            from_number: Número de origen ("whatsapp:+...")
+            rate_per_number: Mensajes por segundo permitidos por número de origen
+            max_retries: Reintentos ante errores de conexión, 429 o 503
+            max_chars: Largo máximo de cada mensaje
+            timeout: Timeout de cada petición (segundos)
+            max_connections: Conexiones simultáneas del cliente HTTP
+        """
+        self.url = TWILIO_API_URL.format(account_sid=account_sid)
+        self.auth = (account_sid, auth_token)
+        self.from_number = from_number
+        self.max_retries = max_retries
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.pacer = NumberPacer(rate_per_number)
+        self._client: Optional[httpx.AsyncClient] = None
+        # Una respuesta a la vez por destinatario: las partes nunca se intercalan.
+        # destinatario -> [lock, usos]; la entrada se borra cuando nadie la usa
+        self._recipient_locks: Dict[str, List] = {}
+
+        self.sent = 0
+        self.parts_sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_pacing_wait = 0.0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                auth=self.auth,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _recipient_lock(self, to: str):
+        entry = self._recipient_locks.get(to)
+        if entry is None:
+            entry = self._recipient_locks[to] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._recipient_locks[to]
+
+    async def _post(self, to: str, body: str) -> str:
+        """Envía una parte, con backoff exponencial con jitter (respeta Retry-After).
+
+        Raises:
+            TwilioDeliveryUnknownError: No se sabe si el mensaje se entregó (no se reintenta)
+            TwilioSendError: Twilio lo rechazó o se agotaron los reintentos
+        """
+        for attempt in range(self.max_retries + 1):
+            self.total_pacing_wait += await self.pacer.wait(self.from_number)
+            retry_after = None
+            try:
+                response = await self._get_client().post(
+                    self.url, data={"From": self.from_number, "To": to, "Body": body}
+                )
+                if response.status_code < 400:
+                    return response.json().get("sid", "")
+                if response.status_code >= 500 and response.status_code not in RETRYABLE_STATUSES:
+                    raise TwilioDeliveryUnknownError(f"HTTP {response.status_code}: {response.text[:200]}")
+                if response.status_code not in RETRYABLE_STATUSES:
+                    raise TwilioSendError(f"HTTP {response.status_code}: {response.text[:200]}")
+                error = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except RETRYABLE_ERRORS as e:
+                error = f"{type(e).__name__}: {e}"
+            except httpx.TransportError as e:
+                raise TwilioDeliveryUnknownError(f"{type(e).__name__}: {e}") from e
+            if attempt == self.max_retries:
+                raise TwilioSendError(f"Se agotaron los reintentos ({error})")
+            delay = random.uniform(0, min(10.0, 0.5 * 2 ** attempt))
+            if retry_after:
+                try:
+                    delay = min(float(retry_after), 30.0)
+                except ValueError:
+                    pass
+            self.retries += 1
+            LOGGER.warning(f"⚠️ Envío a Twilio falló ({error}); reintento {attempt + 1} en {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def send(self, to: str, text: str) -> List[str]:
+        """Envía `text` a `to` (dividido en partes si es largo) y devuelve los SID de Twilio."""
+        parts = split_message(text, self.max_chars)
+        start = time.monotonic()
+        sids = []
+        async with self._recipient_lock(to):
+            try:
+                for part in parts:
+                    sids.append(await self._post(to, part))
+                    self.parts_sent += 1
+            except Exception:
+                self.failed += 1
+                raise
+        latency = time.monotonic() - start
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if len(parts) > 1:
+            LOGGER.info(f"📨 Respuesta enviada en {len(parts)} partes a {to}")
+        return sids
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'sent': self.sent,
+            'parts_sent': self.parts_sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'recipient_locks': len(self._recipient_locks),
+            'avg_latency_ms': round(1000 * self.total_latency / self.sent, 1) if self.sent else 0.0,
+            'max_latency_ms': round(1000 * self.max_latency, 1),
+            'avg_pacing_wait_ms': round(1000 * self.total_pacing_wait / self.parts_sent, 1) if self.parts_sent else 0.0,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,80 @@
+# priority.py
+import re
+import unicodedata
+from typing import Mapping, Tuple
+
+# Clases de prioridad de la cola (menor = se atiende antes)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HEAVY = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_HEAVY: "heavy",
+}
+
+# Palabras clave por dominio (las mismas familias que usa el fallback del router)
+DOMAIN_KEYWORDS = {
+    'weather': ("clima", "tiempo", "temperatura", "lluvia", "pronostico", "calidad del aire", "amanecer", "atardecer"),
+    'tasks': ("tarea", "task", "pendiente"),
+    'drive': ("archivo", "drive", "carpeta", "documento", "subir", "descargar"),
+    'gmail': ("email", "mail", "correo", "gmail", "bandeja", "etiqueta"),
+    'calendar': ("evento", "calendario", "reunion", "cita", "agenda"),
+}
+# Operaciones que suelen implicar varios pasos o muchas llamadas
+HEAVY_KEYWORDS = (
+    "resum", "todos", "todas", "ultimos", "ultimas", "cada", "analiz", "compar", "reenvi",
+    "mandaselo", "mandaselos", "enviaselo", "enviaselos", "organiz", "limpi", "borra todo",
+)
+# Saludos y agradecimientos: se responden sin herramientas
+SMALL_TALK = ("hola", "gracias", "buenas", "buen dia", "buenos dias", "buenas tardes", "buenas noches", "ok", "dale", "chau")
+
+_WORDS = re.compile(r"\w+")
+_NUMBERS = re.compile(r"\b(\d{1,4})\b")
+_ACTION_SEPARATORS = re.compile(r"\b(y luego|y despues|despues|ademas|tambien)\b|[;\n]")
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas y sin tildes (así 'reunión' y 'reunion' coinciden)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def estimate_cost(body: str, num_media: int = 0) -> Tuple[int, int]:
+    """Estimación barata del costo de un turno, sin LLM.
+
+    Returns:
+        Tuple[int, int]: (puntaje, clase de prioridad)
+    """
+    text = _normalize(body or "")
+    words = _WORDS.findall(text)
+
+    if not words and not num_media:
+        return 0, PRIORITY_INTERACTIVE
+    if len(words) <= 4 and not num_media and any(text.strip(" !.?").startswith(s) for s in SMALL_TALK):
+        return 0, PRIORITY_INTERACTIVE
+
+    domains = [name for name, keywords in DOMAIN_KEYWORDS.items() if any(k in text for k in keywords)]
+    # Cada dominio extra suele ser un paso más del plan (y más llamadas al LLM)
+    score = max(len(domains), 1)
+    score += sum(2 for k in HEAVY_KEYWORDS if k in text)
+    score += len(_ACTION_SEPARATORS.findall(text))
+    # "los últimos 20 correos": listas largas
+    if any(int(n) > 5 for n in _NUMBERS.findall(text)):
+        score += 2
+    if len(words) > 40:
+        score += 1
+    # La media se descarga y suele terminar en Drive
+    score += 2 * num_media
+
+    if score <= 1 and domains in ([], ['weather']):
+        return score, PRIORITY_INTERACTIVE
+    if score >= 4:
+        return score, PRIORITY_HEAVY
+    return score, PRIORITY_NORMAL
+
+
+def classify_form(form: Mapping[str, str]) -> int:
+    """Clase de prioridad de un webhook de Twilio (o de un payload ya combinado)."""
+    num_media = int(form.get("NumMedia", "0") or 0)
+    return estimate_cost(form.get("Body", ""), num_media)[1]
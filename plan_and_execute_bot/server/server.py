@@ -1,15 +1,26 @@
 # server.py
 import logging
 import asyncio
-from urllib.parse import parse_qs
-
-from fastapi import FastAPI, Request, Response, HTTPException, BackgroundTasks
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import Message
-from twilio.request_validator import RequestValidator
-
-from server.channel import WhatsAppAgentTwilio
-from server.config import TWILIO_AUTH_TOKEN, DEBUG, LOG_LEVEL
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.responses import JSONResponse
+
+from server.channel import WhatsAppAgentTwilio, merge_twilio_messages
+from server.config import (
+    TWILIO_AUTH_TOKEN, DEBUG, LOG_LEVEL,
+    JOBQUEUE_PATH, JOBQUEUE_WORKERS, JOBQUEUE_VISIBILITY_TIMEOUT, JOBQUEUE_MAX_ATTEMPTS,
+    JOBQUEUE_MAX_DEPTH, JOBQUEUE_DRAIN_TIMEOUT, JOBQUEUE_PRIORITY_AGING,
+    JOBQUEUE_STICKY, JOBQUEUE_HEARTBEAT_TTL, JOBQUEUE_STICKY_MAX_WAIT,
+    WHATSAPP_DEDUPE_TTL, WHATSAPP_DEDUPE_MAX_KEYS, WHATSAPP_COALESCE_WINDOW, WHATSAPP_COALESCE_MAX_WAIT,
+    ADMISSION_ENABLED, ADMISSION_SENDER_RATE, ADMISSION_SENDER_BURST, ADMISSION_MAX_PENDING,
+    ADMISSION_NOTIFY_COOLDOWN, ADMISSION_BUSY_MESSAGE, SERVER_PROCESSES,
+)
+from server.admission import EMPTY_TWIML, AdmissionController, busy_twiml
+from server.ingress import InboundMessage, TwilioIngressMiddleware, get_inbound
+from server.jobqueue import JobQueue, JobRejectedError, QueueFullError, WorkerPool
+from server.priority import PRIORITY_INTERACTIVE, PRIORITY_NAMES, classify_form
+from server.warmup import WARMUP_STATE, run_warmup, shutdown_resources
 
 # Configurar logging
 logging.basicConfig(
@@ -18,10 +29,28 @@ logging.basicConfig(
 )
 
 LOGGER = logging.getLogger("server")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranca el warm-up y los workers de la cola; al apagar drena la cola y libera recursos."""
+    warmup_task = asyncio.create_task(run_warmup())
+    WORKERS.start()
+    yield
+    if not warmup_task.done():
+        warmup_task.cancel()
+    await WORKERS.stop(drain_timeout=JOBQUEUE_DRAIN_TIMEOUT)
+    JOB_QUEUE.close()
+    await WSP_AGENT.outbound.close()
+    await WSP_AGENT.media.close()
+    await shutdown_resources()
+
+
 APP = FastAPI(
     title="Plan & Execute Bot - WhatsApp API",
     description="API para bot conversacional con WhatsApp via Twilio",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Inicializar el agente de WhatsApp
@@ -33,41 +62,43 @@ except Exception as e:
     raise
 
 
-class TwilioMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, path: str = "/whatsapp"):
-        super().__init__(app)
-        self.path = path
-        self.validator = RequestValidator(TWILIO_AUTH_TOKEN)
-
-    async def dispatch(self, request: Request, call_next):
-        # Only guard the WhatsApp webhook
-        if request.url.path == self.path and request.method == "POST":
-            body = await request.body()
-
-            # Signature check
-            form_dict = parse_qs(body.decode(), keep_blank_values=True)
-            flat_form_dict = {k: v[0] if isinstance(v, list) and v else v for k, v in form_dict.items()}
-            
-            proto = request.headers.get("x-forwarded-proto", request.url.scheme)
-            host  = request.headers.get("x-forwarded-host", request.headers.get("host"))
-            url   = f"{proto}://{host}{request.url.path}"
-            sig   = request.headers.get("X-Twilio-Signature", "")
-
-            if not self.validator.validate(url, flat_form_dict, sig):
-                LOGGER.warning("Invalid Twilio signature for %s", url)
-                return Response(status_code=401, content="Invalid Twilio signature")
-
-            # Rewind: body and receive channel
-            async def _replay() -> Message:
-                return {"type": "http.request", "body": body, "more_body": False}
+async def process_whatsapp_job(form_data: dict, last_attempt: bool = True):
+    """Procesa un mensaje de la cola; si lanza una excepción, la cola lo reintenta."""
+    LOGGER.info("Processing WhatsApp message from queue")
+    await WSP_AGENT.handle_message_async(form_data, last_attempt=last_attempt)
+    LOGGER.info("Successfully processed WhatsApp message from queue")
+
+
+# Cola durable de mensajes entrantes y workers que la consumen
+JOB_QUEUE = JobQueue(
+    JOBQUEUE_PATH,
+    visibility_timeout=JOBQUEUE_VISIBILITY_TIMEOUT,
+    max_attempts=JOBQUEUE_MAX_ATTEMPTS,
+    max_depth=JOBQUEUE_MAX_DEPTH,
+    dedupe_ttl=WHATSAPP_DEDUPE_TTL,
+    dedupe_max_keys=WHATSAPP_DEDUPE_MAX_KEYS,
+    priority_aging=JOBQUEUE_PRIORITY_AGING,
+    sticky=JOBQUEUE_STICKY,
+    heartbeat_ttl=JOBQUEUE_HEARTBEAT_TTL,
+    sticky_max_wait=JOBQUEUE_STICKY_MAX_WAIT
+)
+WORKERS = WorkerPool(JOB_QUEUE, process_whatsapp_job, concurrency=JOBQUEUE_WORKERS)
 
-            request._body = body
-            request._receive = _replay  # type: ignore[attr-defined]
 
-        return await call_next(request)
+# Cupo por remitente y techo global de trabajos pendientes, al crear cada turno nuevo
+ADMISSION = AdmissionController(
+    # El cupo por remitente es por proceso: se reparte entre los procesos del servidor
+    sender_rate=ADMISSION_SENDER_RATE / SERVER_PROCESSES,
+    sender_burst=max(ADMISSION_SENDER_BURST / SERVER_PROCESSES, 1),
+    max_pending=ADMISSION_MAX_PENDING,
+    notify_cooldown=ADMISSION_NOTIFY_COOLDOWN,
+    enabled=ADMISSION_ENABLED
+)
 
 
-APP.add_middleware(TwilioMiddleware, path="/whatsapp")
+# El webhook se parsea una sola vez: la firma, la ruta y el handler de prueba usan el mismo InboundMessage
+APP.add_middleware(TwilioIngressMiddleware, auth_token=TWILIO_AUTH_TOKEN,
+                   paths=("/whatsapp",), unsigned_paths=("/whatsapp-test",))
 
 
 @APP.get("/")
@@ -88,41 +119,84 @@ async def health_check():
         "timestamp": "2024-01-01T00:00:00Z"
     }
 
+@APP.get("/ready")
+async def readiness_check():
+    """Readiness para el balanceador: 503 hasta que termine el warm-up."""
+    report = WARMUP_STATE.report()
+    if not WARMUP_STATE.ready:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+@APP.get("/metrics")
+async def metrics():
+    """Métricas de la cola de mensajes y de las herramientas (pools, cuotas y circuitos)."""
+    from bot.memory import memory
+    from bot.tools.circuit import circuit_metrics
+    from bot.tools.pools import pool_metrics
+    from bot.tools.ratelimit import rate_limit_metrics
+    return {
+        "queue": await asyncio.to_thread(WORKERS.metrics),
+        "admission": ADMISSION.metrics(),
+        "outbound": WSP_AGENT.outbound.metrics(),
+        "media": WSP_AGENT.media.metrics(),
+        "sessions": memory.cache_metrics(),
+        "pools": pool_metrics(),
+        "rate_limits": rate_limit_metrics(),
+        "circuits": circuit_metrics(),
+    }
+
 @APP.post("/whatsapp")
-async def whatsapp_reply_twilio(request: Request, background_tasks: BackgroundTasks):
+async def whatsapp_reply_twilio(request: Request):
     """Endpoint principal para recibir mensajes de WhatsApp via Twilio."""
     try:
         LOGGER.info("Received WhatsApp message")
         
-        # Parsear los datos del formulario inmediatamente
-        # porque el request body se consume y no se puede leer de nuevo
-        form_data = await request.form()
-        form_dict = dict(form_data)
+        # El middleware ya parseó y validó el formulario
+        message = get_inbound(request) or InboundMessage.from_form(await request.form())
+        
+        # Turnos cortos (clima, saludos) antes que los largos; el envejecimiento evita que estos se posterguen
+        payload = message.as_form()
+        priority = classify_form(payload)
+        # Los turnos interactivos no esperan la ventana de agrupación: la latencia es lo que más se nota
+        # en un saludo o una consulta corta. Si el remitente ya tiene un turno esperando, igual se combina
+        delay = 0 if priority == PRIORITY_INTERACTIVE else WHATSAPP_COALESCE_WINDOW
+        
+        # Persistir el mensaje en la cola durable; los workers lo procesan con concurrencia acotada.
+        # Los reintentos de Twilio (mismo MessageSid) se confirman sin reprocesar, y los mensajes
+        # seguidos del mismo remitente dentro de la ventana se agrupan en un solo turno.
+        # Solo los turnos nuevos pasan por el control de admisión; lo que excede el cupo recibe
+        # una respuesta fija, sin pasar por el LLM.
+        try:
+            job_id = await WORKERS.submit(
+                payload,
+                delay=delay,
+                dedupe_key=message.message_sid or None,
+                coalesce_key=(message.sender or None) if WHATSAPP_COALESCE_WINDOW > 0 else None,
+                merge=merge_twilio_messages,
+                max_delay=WHATSAPP_COALESCE_MAX_WAIT,
+                priority=priority,
+                sticky_key=message.sender or None,
+                admit=lambda pending: ADMISSION.admit(message.sender, pending)
+            )
+        except JobRejectedError:
+            content = busy_twiml(ADMISSION_BUSY_MESSAGE) if ADMISSION.should_notify(message.sender) else EMPTY_TWIML
+            return Response(content=content, media_type="application/xml")
+        if job_id is None:
+            LOGGER.info(f"Duplicate webhook ignored: {message.message_sid}")
+        else:
+            LOGGER.info(f"Message queued as job {job_id} (priority: {PRIORITY_NAMES[priority]})")
         
         # Responder inmediatamente a Twilio con TwiML vacío
         # Esto evita el timeout de 15 segundos
-        background_tasks.add_task(process_whatsapp_message_background, form_dict)
-        
-        # Respuesta inmediata vacía - Twilio sabrá que recibimos el mensaje
-        return Response(
-            content='<?xml version="1.0" encoding="UTF-8"?><Response></Response>',
-            media_type="application/xml"
-        )
+        return Response(content=EMPTY_TWIML, media_type="application/xml")
         
+    except QueueFullError as e:
+        LOGGER.warning(f"Cola llena, mensaje rechazado: {e}")
+        raise HTTPException(status_code=503, detail="Server busy")
     except Exception as e:
-        LOGGER.exception("Error setting up background task for WhatsApp message")
+        LOGGER.exception("Error enqueuing WhatsApp message")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-async def process_whatsapp_message_background(form_data: dict):
-    """Procesa el mensaje de WhatsApp en segundo plano y envía la respuesta."""
-    try:
-        LOGGER.info("Processing WhatsApp message in background")
-        # Procesar el mensaje y enviar respuesta usando API de Twilio
-        await WSP_AGENT.handle_message_async(form_data)
-        LOGGER.info("Successfully processed WhatsApp message in background")
-    except Exception as e:
-        LOGGER.exception("Error processing WhatsApp message in background")
-
 @APP.post("/whatsapp-test")
 async def whatsapp_test(request: Request):
     """Endpoint de prueba sin validación de firma."""
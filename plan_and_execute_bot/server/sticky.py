@@ -0,0 +1,41 @@
+# sticky.py
+import bisect
+import hashlib
+import os
+import socket
+from typing import Iterable, List, Optional, Tuple
+
+
+def default_worker_id() -> str:
+    """Identificador de este proceso: <host>:<pid>."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Hashing consistente: cada clave va siempre al mismo nodo y, si cambia la lista de nodos,
+    solo se reasignan las claves del nodo que entró o salió."""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        """
+        Args:
+            nodes: Nodos iniciales (workers)
+            replicas: Puntos virtuales por nodo (reparten la carga de forma pareja)
+        """
+        self.replicas = replicas
+        self.nodes = frozenset(nodes)
+        points: List[Tuple[int, str]] = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._hashes = [point[0] for point in points]
+        self._owners = [point[1] for point in points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        """Nodo dueño de `key` (None si el anillo está vacío)."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
@@ -0,0 +1,153 @@
+# warmup.py
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+# Agregar el directorio del bot al path para importar los módulos
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+LOGGER = logging.getLogger("warmup")
+
+# Desactivar con SERVER_WARMUP=false (el servidor queda listo de inmediato)
+SERVER_WARMUP = os.getenv("SERVER_WARMUP", "true").lower() in ("true", "1", "yes")
+# Tiempo máximo de cada paso de calentamiento (segundos)
+WARMUP_STEP_TIMEOUT = float(os.getenv("WARMUP_STEP_TIMEOUT", "30"))
+# APIs de Google a calentar (token OAuth + conexiones keep-alive)
+WARMUP_GOOGLE_APIS = [api.strip() for api in os.getenv("WARMUP_GOOGLE_APIS", "gmail,calendar,tasks,drive").split(",") if api.strip()]
+# Ciudad para la consulta de prueba a OpenWeather
+WARMUP_WEATHER_LOCATION = os.getenv("WARMUP_WEATHER_LOCATION", "Buenos Aires")
+# Ping opcional al LLM (abre la conexión TLS con Azure OpenAI; consume tokens)
+WARMUP_LLM_PING = os.getenv("WARMUP_LLM_PING", "false").lower() in ("true", "1", "yes")
+
+# Petición más barata de cada API de Google: (módulo de herramientas, cliente, ruta, parámetros)
+GOOGLE_PING_REQUESTS = {
+    'gmail': ('bot.tools.gmail', 'gmail_api', 'profile', {}),
+    'calendar': ('bot.tools.calendar', 'calendar_api', 'users/me/calendarList', {'maxResults': 1}),
+    'tasks': ('bot.tools.tasks', 'tasks_api', 'users/@me/lists', {'maxResults': 1}),
+    'drive': ('bot.tools.drive', 'drive_api', 'about', {'fields': 'user'}),
+}
+
+
+class WarmupState:
+    """Estado del calentamiento; el servidor se reporta listo solo cuando termina."""
+
+    def __init__(self):
+        self.status = "pending"  # pending | running | ready
+        self.started_at = None
+        self.finished_at = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def report(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at is not None:
+            duration = round(((self.finished_at or time.monotonic()) - self.started_at) * 1000)
+        return {
+            "status": self.status,
+            "duration_ms": duration,
+            "steps": self.steps,
+        }
+
+
+WARMUP_STATE = WarmupState()
+
+
+async def _run_step(name: str, step: Callable[[], Awaitable[Any]]):
+    """Ejecuta un paso con timeout; un paso fallido se registra pero no bloquea el arranque."""
+    start = time.monotonic()
+    try:
+        await asyncio.wait_for(step(), timeout=WARMUP_STEP_TIMEOUT)
+        WARMUP_STATE.steps[name] = {"ok": True, "ms": round((time.monotonic() - start) * 1000)}
+        LOGGER.info(f"🔥 Warm-up '{name}' completado en {WARMUP_STATE.steps[name]['ms']} ms")
+    except Exception as e:
+        WARMUP_STATE.steps[name] = {"ok": False, "ms": round((time.monotonic() - start) * 1000), "error": str(e) or type(e).__name__}
+        LOGGER.warning(f"⚠️ Warm-up '{name}' falló: {e}")
+
+
+async def _warm_executors():
+    """Importa las herramientas y construye los agentes (todos, o los de EXECUTOR_WARMUP)."""
+    from bot.executors import EXECUTOR_MAP, warm_up_executors
+    from bot.executors.specialized_executor import EXECUTOR_WARMUP
+    names = None if EXECUTOR_WARMUP else list(EXECUTOR_MAP)
+    await asyncio.to_thread(warm_up_executors, names)
+
+
+def _google_ping(api: str) -> Callable[[], Awaitable[Any]]:
+    """Refresca el token OAuth y abre las conexiones del cliente httpx de este event loop."""
+    async def step():
+        import importlib
+        from bot.tools.credentials import credential_manager
+        module_name, client_name, path, params = GOOGLE_PING_REQUESTS[api]
+        client = getattr(importlib.import_module(module_name), client_name)
+        # Sin token guardado no se calienta: el flujo OAuth interactivo bloquearía el arranque
+        if not credential_manager.is_linked(api):
+            raise FileNotFoundError(f"No hay token de {api} para el usuario por defecto")
+        await client.get(path, **params)
+    return step
+
+
+async def _weather_ping():
+    """Consulta de geocoding barata: abre la sesión HTTP del pool de clima."""
+    from bot.tools.pools import run_in_pool
+    from bot.tools.weather import API_KEY, BASE_URL_GEOCODE, _get
+    await run_in_pool('weather', _get, BASE_URL_GEOCODE, {"q": WARMUP_WEATHER_LOCATION, "limit": 1, "appid": API_KEY})
+
+
+async def _drive_content_refresh():
+    """Arranca en segundo plano la indexación del contenido de Drive (no demora el arranque)."""
+    from bot.tools.credentials import credential_manager
+    from bot.tools.drive_content_index import drive_content_index
+    if not credential_manager.is_linked('drive'):
+        raise FileNotFoundError("No hay token de drive para el usuario por defecto")
+    drive_content_index.refresh_in_background()
+
+
+async def _llm_ping():
+    from bot.config import LLM_EXECUTOR
+    await LLM_EXECUTOR.ainvoke("ping")
+
+
+async def run_warmup():
+    """Calienta el servidor: agentes, tokens y conexiones de Google, OpenWeather y (opcional) el LLM."""
+    if not SERVER_WARMUP:
+        WARMUP_STATE.status = "ready"
+        LOGGER.info("✅ Warm-up desactivado, servidor listo")
+        return
+
+    WARMUP_STATE.status = "running"
+    WARMUP_STATE.started_at = time.monotonic()
+    LOGGER.info("🔥 Iniciando warm-up del servidor...")
+
+    # Los agentes primero: importan los módulos de herramientas que usan los pasos siguientes
+    await _run_step("executors", _warm_executors)
+
+    steps = [_run_step(f"google:{api}", _google_ping(api)) for api in WARMUP_GOOGLE_APIS if api in GOOGLE_PING_REQUESTS]
+    steps.append(_run_step("weather", _weather_ping))
+    if 'drive' in WARMUP_GOOGLE_APIS:
+        steps.append(_run_step("drive_content", _drive_content_refresh))
+    if WARMUP_LLM_PING:
+        steps.append(_run_step("llm", _llm_ping))
+    await asyncio.gather(*steps)
+
+    WARMUP_STATE.finished_at = time.monotonic()
+    WARMUP_STATE.status = "ready"
+    failed = [name for name, step in WARMUP_STATE.steps.items() if not step["ok"]]
+    duration = WARMUP_STATE.report()["duration_ms"]
+    if failed:
+        LOGGER.warning(f"✅ Warm-up terminado en {duration} ms con pasos fallidos: {', '.join(failed)}")
+    else:
+        LOGGER.info(f"✅ Warm-up terminado en {duration} ms, servidor listo")
+
+
+async def shutdown_resources():
+    """Libera conexiones e hilos de las herramientas al apagar el servidor."""
+    from bot.tools.google_async import close_http_clients
+    from bot.tools.pools import shutdown_pools
+    await close_http_clients()
+    shutdown_pools(wait=False)
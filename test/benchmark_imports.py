@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark del tiempo de importación del bot (para detectar regresiones en el arranque).
+
+Cada medición corre en un proceso nuevo, así no influyen los módulos ya cargados.
+Con IMPORT_BUDGET_MS definido, termina con código 1 si el grafo tarda más que eso.
+
+Uso: python test/benchmark_imports.py [repeticiones]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plan_and_execute_bot')
+
+# Nombre -> código a medir
+CASES = {
+    "bot": "import bot",
+    "bot.executors": "import bot.executors",
+    "bot.graph": "import bot.graph",
+    "graph + weather_executor": "import bot.graph; from bot.executors import EXECUTOR_MAP; EXECUTOR_MAP['weather_executor']",
+    "graph + todos los ejecutores": "import bot.graph; from bot.executors import EXECUTOR_MAP; [EXECUTOR_MAP[n] for n in EXECUTOR_MAP]",
+}
+
+TIMER = (
+    "import time, sys; sys.path.insert(0, {bot_dir!r}); t = time.perf_counter(); {code}; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def measure(code: str) -> float:
+    """Milisegundos que tarda `code` en un intérprete limpio."""
+    env = {**os.environ, "EXECUTOR_WARMUP": ""}
+    result = subprocess.run(
+        [sys.executable, "-c", TIMER.format(bot_dir=BOT_DIR, code=code)],
+        capture_output=True, text=True, env=env
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget = os.getenv("IMPORT_BUDGET_MS")
+    print(f"⏱️ Midiendo tiempos de importación ({repetitions} repeticiones)...\n")
+
+    medians = {}
+    for name, code in CASES.items():
+        try:
+            samples = [measure(code) for _ in range(repetitions)]
+        except RuntimeError as e:
+            print(f"❌ {name}: {e}")
+            continue
+        medians[name] = statistics.median(samples)
+        print(f"✅ {name:<30} mediana {medians[name]:8.1f} ms  (mín {min(samples):.1f}, máx {max(samples):.1f})")
+
+    if budget and "bot.graph" in medians and medians["bot.graph"] > float(budget):
+        print(f"\n❌ bot.graph tarda {medians['bot.graph']:.1f} ms, por encima del presupuesto de {budget} ms")
+        sys.exit(1)
+    print("\n🎉 Benchmark completado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Pruebas del control de admisión del webhook."""
+import os
+import sys
+import tempfile
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from server.admission import AdmissionController, busy_twiml
+from server.jobqueue import JobQueue, JobRejectedError
+
+SENDER = "whatsapp:+5491100000000"
+
+
+def _merge(previous, new):
+    return {'Body': f"{previous['Body']}\n{new['Body']}"}
+
+
+def test_sender_quota():
+    """Un remitente agota su ráfaga y queda rechazado; los demás siguen entrando."""
+    admission = AdmissionController(sender_rate=0.001, sender_burst=2, max_pending=0)
+    assert admission.admit(SENDER, 0) is None
+    assert admission.admit(SENDER, 0) is None
+    assert admission.admit(SENDER, 0) == "sender"
+    assert admission.admit("whatsapp:+5491122222222", 0) is None
+    metrics = admission.metrics()
+    assert metrics['admitted'] == 3 and metrics['shed_sender'] == 1
+    print("✅ Cupo por remitente")
+
+
+def test_global_limit_first():
+    """Con la cola llena se rechaza sin gastar el cupo del remitente."""
+    admission = AdmissionController(sender_rate=0.001, sender_burst=1, max_pending=10)
+    assert admission.admit(SENDER, 10) == "global"
+    assert admission.admit(SENDER, 9) is None
+    assert admission.metrics()['shed_global'] == 1
+    print("✅ Límite global")
+
+
+def test_notify_cooldown():
+    """El aviso de "estoy ocupado" se manda como mucho una vez por cooldown."""
+    admission = AdmissionController(sender_rate=0.001, sender_burst=1, notify_cooldown=60)
+    admission.admit(SENDER, 0)
+    assert admission.should_notify(SENDER)
+    assert not admission.should_notify(SENDER)
+    assert "&lt;b&gt;" in busy_twiml("<b>Ocupado</b>")
+    print("✅ Aviso con cooldown")
+
+
+def test_rejected_job_keeps_no_key():
+    """Un trabajo rechazado no guarda su clave: el reintento de Twilio puede entrar después."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"))
+        try:
+            queue.enqueue({'Body': 'hola'}, dedupe_key='SM1', admit=lambda pending: 'sender')
+            raise AssertionError("Se esperaba JobRejectedError")
+        except JobRejectedError as e:
+            assert e.reason == 'sender'
+        assert queue.depth()['queued'] == 0
+        assert queue.enqueue({'Body': 'hola'}, dedupe_key='SM1', admit=lambda pending: None) is not None
+        queue.close()
+    print("✅ Rechazo sin clave de duplicados")
+
+
+def test_coalesced_message_not_charged():
+    """Un mensaje que se combina con uno pendiente no gasta otro turno del remitente."""
+    charged = []
+
+    def admit(pending):
+        charged.append(pending)
+        return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"))
+        queue.enqueue({'Body': 'uno'}, delay=10, coalesce_key=SENDER, merge=_merge, admit=admit)
+        queue.enqueue({'Body': 'dos'}, delay=10, coalesce_key=SENDER, merge=_merge, admit=admit)
+        assert len(charged) == 1 and queue.coalesced == 1
+        queue.close()
+    print("✅ Mensajes combinados sin cobrar")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas del control de admisión\n")
+    tests = [
+        test_sender_quota, test_global_limit_first, test_notify_cooldown,
+        test_rejected_job_keeps_no_key, test_coalesced_message_not_charged,
+    ]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
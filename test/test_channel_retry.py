@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Pruebas de los reintentos de la cola para un turno de WhatsApp (sin Twilio ni LLM)."""
+import asyncio
+import os
+import sys
+import tempfile
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+# No se habla con Twilio ni se toca el archivo real de sesiones
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "AC-prueba")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "token-de-prueba")
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(tempfile.mkdtemp(), "sessions.sqlite3"))
+
+from server.channel import REPLY_CHECKPOINT_KEY, WhatsAppAgentTwilio
+from server.jobqueue import JobQueue
+from server.outbound import TwilioSendError
+
+FORM = {'From': 'whatsapp:+5491100000000', 'Body': 'mandale un correo a Ana', 'MessageSid': 'SM1', 'NumMedia': '0'}
+
+
+class _FakeAgent:
+    """Cuenta las ejecuciones del grafo (cada una podría enviar un correo)."""
+
+    def __init__(self):
+        self.runs = 0
+
+    async def invoke(self, id, user_message, media=None, raise_errors=False):
+        self.runs += 1
+        return "✅ Correo enviado a Ana"
+
+
+def _channel(send_failures: int):
+    channel = WhatsAppAgentTwilio.__new__(WhatsAppAgentTwilio)
+    channel.agent = _FakeAgent()
+    channel.sent = []
+
+    async def collect_media(message):
+        return []
+
+    async def send(to_number, message):
+        if send_failures > len(channel.sent):
+            channel.sent.append(None)
+            raise TwilioSendError("Twilio respondió 503")
+        channel.sent.append(message)
+
+    channel._collect_media = collect_media
+    channel.send_whatsapp_message = send
+    return channel
+
+
+async def _run_once(queue: JobQueue, channel) -> bool:
+    """Un ciclo del worker: True si el trabajo terminó bien."""
+    job = queue.dequeue()
+    try:
+        await channel.handle_message_async(job.payload, last_attempt=job.attempts >= queue.max_attempts)
+    except Exception as e:
+        queue.nack(job, str(e))
+        return False
+    queue.ack(job)
+    return True
+
+
+def test_send_retry_does_not_rerun_graph():
+    """Si falla el envío, el reintento reenvía la misma respuesta sin volver a ejecutar el grafo."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"), retry_delay=0)
+        queue.enqueue(dict(FORM))
+        channel = _channel(send_failures=1)
+
+        assert not asyncio.run(_run_once(queue, channel))
+        assert asyncio.run(_run_once(queue, channel))
+
+        assert channel.agent.runs == 1, f"el grafo corrió {channel.agent.runs} veces"
+        assert channel.sent == [None, "✅ Correo enviado a Ana"]
+        assert queue.depth() == {'queued': 0, 'processing': 0, 'failed': 0}
+        queue.close()
+    print("✅ Reintento de envío sin repetir el turno")
+
+
+def test_checkpoint_saved_by_nack():
+    """La cola guarda el payload tal como lo dejó el handler."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"), retry_delay=0)
+        queue.enqueue(dict(FORM))
+        job = queue.dequeue()
+        job.payload[REPLY_CHECKPOINT_KEY] = "respuesta"
+        queue.nack(job, "error")
+        assert queue.dequeue().payload[REPLY_CHECKPOINT_KEY] == "respuesta"
+        queue.close()
+    print("✅ Avance guardado al reintentar")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de reintentos de WhatsApp\n")
+    tests = [test_send_retry_does_not_rerun_graph, test_checkpoint_saved_by_nack]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Pruebas de los circuit breakers por dependencia."""
+import sys
+import time
+from unittest import mock
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from bot.tools import circuit, weather
+from bot.tools.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from bot.tools.ratelimit import RateLimitExceeded
+
+
+def _fail(breaker: CircuitBreaker, error: Exception):
+    try:
+        with breaker.protect():
+            raise error
+    except type(error):
+        pass
+
+
+def test_state_machine():
+    """closed -> open tras el umbral -> half-open con una sola prueba -> closed u open."""
+    breaker = CircuitBreaker('prueba', failure_threshold=2, recovery_timeout=0.1)
+    _fail(breaker, TimeoutError())
+    assert breaker.state == CLOSED
+    _fail(breaker, TimeoutError())
+    assert breaker.state == OPEN and breaker.trips == 1
+    try:
+        breaker.check()
+        raise AssertionError("Se esperaba CircuitOpenError")
+    except CircuitOpenError:
+        pass
+
+    time.sleep(0.15)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and not breaker.allow(), "half-open admite una sola llamada de prueba"
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.trips == 2
+
+    time.sleep(0.15)
+    with breaker.protect():
+        pass
+    assert breaker.state == CLOSED and breaker.metrics()['consecutive_failures'] == 0
+    print("✅ Transiciones del circuito")
+
+
+def test_request_errors_do_not_trip():
+    """Los errores de la petición (cuenta sin vincular, 404) no abren el circuito."""
+    breaker = CircuitBreaker('prueba', failure_threshold=1, recovery_timeout=60)
+    _fail(breaker, FileNotFoundError("sin token"))
+    _fail(breaker, PermissionError("fuera de las carpetas"))
+    _fail(breaker, ValueError("argumento inválido"))
+    assert breaker.state == CLOSED
+    print("✅ Errores de petición no abren el circuito")
+
+
+def test_weather_probe_released_on_local_error():
+    """Si la llamada de prueba falla antes de llegar a OpenWeather, el circuito no queda trabado."""
+    breaker = CircuitBreaker('weather', failure_threshold=1, recovery_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    assert breaker.state == HALF_OPEN
+
+    def exhausted(*args, **kwargs):
+        raise RateLimitExceeded("Cuota de weather agotada")
+
+    with mock.patch.dict(circuit._BREAKERS, {'weather': breaker}), \
+            mock.patch.object(weather.rate_limiter, 'acquire', exhausted):
+        try:
+            weather._get(weather.BASE_URL_CURRENT, {'q': 'Madrid'})
+            raise AssertionError("Se esperaba RateLimitExceeded")
+        except RateLimitExceeded:
+            pass
+    assert not breaker.is_open(), "la llamada de prueba quedó tomada"
+    assert breaker.allow()
+    print("✅ Llamada de prueba liberada ante errores locales")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de circuit breakers\n")
+    tests = [test_state_machine, test_request_errors_do_not_trip, test_weather_probe_released_on_local_error]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
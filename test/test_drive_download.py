@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Pruebas de la descarga por rangos de Drive (sin llamar a Google)."""
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from bot.tools.drive import _stream_to_file
+
+DATA = bytes(range(256)) * 40
+
+
+class _Response(dict):
+    def __init__(self, status: int, headers: dict = None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class _Http:
+    """Servidor falso: responde rangos de DATA (o el archivo entero si `ignore_range`)."""
+
+    def __init__(self, ignore_range: bool = False):
+        self.ignore_range = ignore_range
+        self.ranges = []
+
+    def request(self, uri, method='GET', headers=None):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', headers['range']).groups())
+        self.ranges.append((start, end))
+        if self.ignore_range:
+            return _Response(200), DATA
+        if start >= len(DATA):
+            return _Response(416), b''
+        end = min(end, len(DATA) - 1)
+        return _Response(206, {'content-range': f'bytes {start}-{end}/{len(DATA)}'}), DATA[start:end + 1]
+
+
+class _Request:
+    def __init__(self, http: _Http):
+        self.http = http
+        self.uri = 'https://www.googleapis.com/drive/v3/files/abc?alt=media'
+        self.headers = {}
+
+
+def test_download_by_ranges():
+    """La descarga se hace en rangos del tamaño pedido y el archivo queda completo."""
+    with tempfile.TemporaryDirectory() as directory:
+        part = Path(directory) / "archivo.part"
+        http = _Http()
+        assert _stream_to_file(_Request(http), part, 4096) == len(DATA)
+        assert part.read_bytes() == DATA
+        assert http.ranges == [(0, 4095), (4096, 8191), (8192, 12287)]
+    print("✅ Descarga por rangos")
+
+
+def test_resume_from_partial():
+    """Con un parcial en disco se pide solo lo que falta."""
+    with tempfile.TemporaryDirectory() as directory:
+        part = Path(directory) / "archivo.part"
+        part.write_bytes(DATA[:5000])
+        http = _Http()
+        assert _stream_to_file(_Request(http), part, 4096) == len(DATA)
+        assert part.read_bytes() == DATA
+        assert http.ranges[0] == (5000, 9095)
+    print("✅ Reanudación desde el parcial")
+
+
+def test_complete_partial():
+    """Si el parcial ya estaba completo, el servidor responde 416 y no se reescribe."""
+    with tempfile.TemporaryDirectory() as directory:
+        part = Path(directory) / "archivo.part"
+        part.write_bytes(DATA)
+        assert _stream_to_file(_Request(_Http()), part, 4096) == len(DATA)
+        assert part.read_bytes() == DATA
+    print("✅ Parcial completo")
+
+
+def test_server_ignores_range():
+    """Si el servidor ignora el rango (exportaciones), el parcial se descarta en vez de duplicar bytes."""
+    with tempfile.TemporaryDirectory() as directory:
+        part = Path(directory) / "archivo.part"
+        part.write_bytes(DATA[:5000])
+        assert _stream_to_file(_Request(_Http(ignore_range=True)), part, 4096) == len(DATA)
+        assert part.read_bytes() == DATA
+    print("✅ Servidor sin soporte de rangos")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de descargas de Drive\n")
+    tests = [test_download_by_ranges, test_resume_from_partial, test_complete_partial, test_server_ignores_range]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
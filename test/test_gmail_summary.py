@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Pruebas del resumen map-reduce de correos (sin llamar a Gmail ni al LLM)."""
+import asyncio
+import sys
+from unittest import mock
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from bot.tools import circuit, gmail_summary
+from bot.tools.circuit import UNAVAILABLE_PREFIX, CircuitBreaker
+
+
+def _message(message_id: str) -> dict:
+    return {
+        'id': message_id,
+        'headers': {'From': f'{message_id}@example.com', 'Subject': f'Asunto {message_id}', 'Date': 'Mon, 1 Jan 2024'},
+        'digest': 'cuerpo',
+    }
+
+
+async def _fake_run_in_pool(api, func, *args):
+    return _message(args[0])
+
+
+async def _fake_summarize(message, semaphore):
+    if message['id'] == 'roto':
+        raise RuntimeError("timeout del LLM")
+    return f"Resumen de {message['id']}"
+
+
+def test_failed_summary_does_not_abort():
+    """Si el LLM falla en un mensaje, el resumen sigue con los demás y marca el fallido."""
+    with mock.patch.object(gmail_summary, 'run_in_pool', _fake_run_in_pool), \
+            mock.patch.object(gmail_summary, '_summarize_one', _fake_summarize):
+        result = asyncio.run(gmail_summary.summarize_messages.coroutine(message_ids="bueno,roto"))
+
+    assert not result.startswith("❌"), result
+    assert "Resumen de bueno" in result
+    assert "ID: roto\n  ⚠️ No se pudo resumir este mensaje" in result
+    assert "No se pudieron resumir 1 mensajes" in result
+    print("✅ Un resumen fallido no descarta los demás")
+
+
+def test_open_circuit_fails_fast():
+    """Con el circuito de Gmail abierto responde 'no disponible' sin tocar Gmail."""
+    breaker = CircuitBreaker('gmail', failure_threshold=1, recovery_timeout=60)
+    breaker.record_failure()
+
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("No debería llamar a Gmail con el circuito abierto")
+
+    with mock.patch.dict(circuit._BREAKERS, {'gmail': breaker}), \
+            mock.patch.object(gmail_summary, 'run_in_pool', unexpected):
+        result = asyncio.run(gmail_summary.summarize_messages.coroutine(query="in:inbox"))
+
+    assert result.startswith(UNAVAILABLE_PREFIX), result
+    print("✅ Circuito abierto: respuesta inmediata")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas del resumen de correos\n")
+    tests = [test_failed_summary_does_not_abort, test_open_circuit_fails_fast]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
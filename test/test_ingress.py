@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Pruebas de la validación de firmas del webhook de Twilio."""
+import sys
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from twilio.request_validator import RequestValidator
+
+from server.ingress import TwilioIngressMiddleware, get_inbound, public_url
+
+AUTH_TOKEN = "token-de-prueba"
+FORM = {'From': 'whatsapp:+5491100000000', 'Body': 'hola', 'MessageSid': 'SM1', 'NumMedia': '0'}
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(TwilioIngressMiddleware, auth_token=AUTH_TOKEN, paths=("/whatsapp",))
+
+    @app.post("/whatsapp")
+    async def whatsapp(request: Request):
+        return {'body': get_inbound(request).body}
+
+    return TestClient(app, base_url="https://bot.example.com")
+
+
+def test_public_url():
+    """La URL firmada incluye los parámetros solo si el webhook los tiene."""
+    assert public_url("https", "bot.example.com", "/whatsapp") == "https://bot.example.com/whatsapp"
+    assert public_url("https", "bot.example.com", "/whatsapp", "tenant=a&x=1") == \
+        "https://bot.example.com/whatsapp?tenant=a&x=1"
+    print("✅ URL pública")
+
+
+def test_signature_with_query_string():
+    """Un webhook configurado con parámetros valida con la URL completa, y la firma sin ellos no."""
+    validator = RequestValidator(AUTH_TOKEN)
+    client = _client()
+    url = "https://bot.example.com/whatsapp?tenant=a"
+
+    signature = validator.compute_signature(url, FORM)
+    response = client.post("/whatsapp?tenant=a", data=FORM, headers={'X-Twilio-Signature': signature})
+    assert response.status_code == 200 and response.json() == {'body': 'hola'}, response.text
+
+    signature = validator.compute_signature("https://bot.example.com/whatsapp", FORM)
+    response = client.post("/whatsapp?tenant=a", data=FORM, headers={'X-Twilio-Signature': signature})
+    assert response.status_code == 401
+    print("✅ Firma con parámetros en la URL")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas del webhook de Twilio\n")
+    tests = [test_public_url, test_signature_with_query_string]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Pruebas de la cola de trabajos."""
+import os
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from server.jobqueue import JobQueue
+from server.sticky import HashRing
+
+
+def _queue(directory: str, **options) -> JobQueue:
+    return JobQueue(os.path.join(directory, "jobs.sqlite3"), **options)
+
+
+def _merge(previous, new):
+    return {'Body': f"{previous['Body']}\n{new['Body']}"}
+
+
+def test_dedupe():
+    """Un reintento de Twilio con la misma clave no crea otro trabajo."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = _queue(directory)
+        first = queue.enqueue({'Body': 'hola'}, dedupe_key='SM1')
+        second = queue.enqueue({'Body': 'hola'}, dedupe_key='SM1')
+        assert first is not None and second is None
+        assert queue.duplicates == 1 and queue.depth()['queued'] == 1
+        queue.close()
+    print("✅ Duplicados descartados")
+
+
+def test_coalescing():
+    """Los mensajes seguidos del mismo remitente se combinan en un solo trabajo."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = _queue(directory)
+        first = queue.enqueue({'Body': 'uno'}, delay=10, coalesce_key='+54911', merge=_merge)
+        # max_delay=0: el trabajo combinado queda visible enseguida
+        second = queue.enqueue({'Body': 'dos'}, delay=10, coalesce_key='+54911', merge=_merge, max_delay=0)
+        assert first == second and queue.coalesced == 1
+        # Otro remitente no se combina
+        assert queue.enqueue({'Body': 'tres'}, delay=10, coalesce_key='+54922', merge=_merge) != first
+        job = queue.dequeue()
+        assert job is not None and job.payload == {'Body': 'uno\ndos'}
+        assert queue.dequeue() is None
+        queue.close()
+    print("✅ Mensajes combinados")
+
+
+def test_release():
+    """Un trabajo devuelto al apagar se retoma enseguida sin gastar un intento."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = _queue(directory)
+        queue.enqueue({'Body': 'hola'})
+        job = queue.dequeue()
+        assert job.attempts == 1
+        queue.release(job)
+        again = queue.dequeue()
+        assert again is not None and again.id == job.id and again.attempts == 1
+        queue.close()
+    print("✅ Trabajo liberado")
+
+
+def test_visibility_timeout():
+    """Si el worker muere sin ack, el trabajo reaparece al vencer el visibility timeout."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = _queue(directory, visibility_timeout=0.2)
+        queue.enqueue({'Body': 'hola'})
+        job = queue.dequeue()
+        assert queue.dequeue() is None
+        time.sleep(0.3)
+        again = queue.dequeue()
+        assert again is not None and again.id == job.id and again.attempts == 2
+        queue.ack(again)
+        assert queue.depth() == {'queued': 0, 'processing': 0, 'failed': 0}
+        queue.close()
+    print("✅ Reentrega por visibility timeout")
+
+
+def test_abandoned_job_fails_after_max_attempts():
+    """Un trabajo que tumba a su worker (sin ack ni nack) no se reentrega más allá de max_attempts."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = _queue(directory, visibility_timeout=0.1, max_attempts=2)
+        queue.enqueue({'Body': 'hola'})
+        assert queue.dequeue().attempts == 1
+        time.sleep(0.15)
+        assert queue.dequeue().attempts == 2
+        time.sleep(0.15)
+        assert queue.dequeue() is None
+        assert queue.depth() == {'queued': 0, 'processing': 0, 'failed': 1}
+        assert queue.failed == 1
+        queue.close()
+    print("✅ Trabajo abandonado marcado como fallido")
+
+
+def test_nack_until_failed():
+    """Los reintentos se agotan en max_attempts y el trabajo queda como fallido."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = _queue(directory, max_attempts=2, retry_delay=0)
+        queue.enqueue({'Body': 'hola'})
+        queue.nack(queue.dequeue(), "error 1")
+        job = queue.dequeue()
+        assert job.attempts == 2
+        queue.nack(job, "error 2")
+        assert queue.dequeue() is None and queue.depth()['failed'] == 1
+        queue.close()
+    print("✅ Reintentos agotados")
+
+
+def test_sticky_dispatch():
+    """Con varios procesos, cada remitente va a su worker; si ese worker se da de baja, lo toma otro."""
+    with tempfile.TemporaryDirectory() as directory:
+        first = _queue(directory, sticky=True, worker_id='w1')
+        second = _queue(directory, sticky=True, worker_id='w2')
+        first.heartbeat()
+        second.heartbeat()
+        first.heartbeat()
+        ring = HashRing({'w1', 'w2'})
+        sender = next(key for key in (f"+5491{i}" for i in range(100)) if ring.node_for(key) == 'w2')
+
+        first.enqueue({'Body': 'uno'}, sticky_key=sender)
+        assert first.dequeue() is None
+        second.ack(second.dequeue())
+
+        first.enqueue({'Body': 'dos'}, sticky_key=sender)
+        second.unregister()
+        job = first.dequeue()
+        assert job is not None and job.payload == {'Body': 'dos'}
+        first.close()
+        second.close()
+    print("✅ Despacho sticky entre procesos")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de la cola de trabajos\n")
+    tests = [
+        test_dedupe, test_coalescing, test_release, test_visibility_timeout,
+        test_abandoned_job_fails_after_max_attempts, test_nack_until_failed, test_sticky_dispatch,
+    ]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Pruebas del envío de respuestas por Twilio (sin red: transporte HTTP simulado)."""
+import asyncio
+import sys
+from urllib.parse import parse_qs
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+import httpx
+
+from server.outbound import TwilioDeliveryUnknownError, TwilioOutbound, TwilioSendError, split_message
+
+TO = "whatsapp:+5491100000000"
+
+
+def _outbound(statuses):
+    """Emisor cuyo cliente responde con `statuses` en orden (el último se repite)."""
+    outbound = TwilioOutbound("AC123", "token", "whatsapp:+14155238886", rate_per_number=0, max_retries=2)
+    outbound.bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        outbound.bodies.append(parse_qs(request.content.decode())['Body'][0])
+        status = statuses[min(len(outbound.bodies), len(statuses)) - 1]
+        return httpx.Response(status, json={'sid': f"SM{len(outbound.bodies)}"}, headers={'Retry-After': '0'})
+
+    outbound._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return outbound
+
+
+def test_split_message():
+    """Las respuestas largas se dividen en partes numeradas que entran en un mensaje."""
+    assert split_message("hola") == ["hola"]
+    text = ". ".join(f"Oración número {i}" for i in range(300))
+    parts = split_message(text, max_chars=200)
+    assert len(parts) > 1
+    assert all(len(part) <= 200 for part in parts)
+    assert parts[0].startswith(f"(1/{len(parts)}) ") and parts[-1].startswith(f"({len(parts)}/{len(parts)}) ")
+    # Sin separadores se corta en el tamaño máximo sin perder texto
+    parts = split_message("x" * 500, max_chars=100)
+    assert "".join(part.split(") ", 1)[1] for part in parts) == "x" * 500
+    print("✅ División de mensajes")
+
+
+def test_retries_only_when_not_accepted():
+    """503 se reintenta; un 500 no (Twilio pudo haberlo aceptado) y un 400 tampoco."""
+    outbound = _outbound([503, 201])
+    assert asyncio.run(outbound.send(TO, "hola")) == ["SM2"]
+    assert outbound.retries == 1
+
+    for status, error in ((500, TwilioDeliveryUnknownError), (400, TwilioSendError)):
+        outbound = _outbound([status])
+        try:
+            asyncio.run(outbound.send(TO, "hola"))
+            raise AssertionError(f"Se esperaba {error.__name__}")
+        except error:
+            pass
+        assert len(outbound.bodies) == 1 and outbound.retries == 0
+    print("✅ Reintentos solo si el mensaje no se aceptó")
+
+
+def test_parts_in_order_and_locks_evicted():
+    """Las partes salen en orden y el lock del destinatario se borra al terminar."""
+    outbound = _outbound([201])
+    outbound.max_chars = 200
+    text = ". ".join(f"Oración número {i}" for i in range(60))
+
+    async def main():
+        await asyncio.gather(outbound.send(TO, text), outbound.send("whatsapp:+5491122222222", "otra"))
+
+    asyncio.run(main())
+    numbered = [body for body in outbound.bodies if body != "otra"]
+    assert numbered == split_message(text, 200)
+    assert outbound.metrics()['recipient_locks'] == 0
+    print("✅ Partes en orden y locks liberados")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas del envío por Twilio\n")
+    tests = [test_split_message, test_retries_only_when_not_accepted, test_parts_in_order_and_locks_evicted]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
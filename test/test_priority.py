@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Pruebas de la prioridad de los turnos en la cola."""
+import os
+import sys
+import tempfile
+import time
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from server.jobqueue import JobQueue
+from server.priority import PRIORITY_HEAVY, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, classify_form, estimate_cost
+
+
+def _merge(previous, new):
+    return {'Body': f"{previous['Body']}\n{new['Body']}"}
+
+
+def test_estimate_cost():
+    """Saludos y consultas simples van primero; resúmenes y media, al final."""
+    assert estimate_cost("Hola!") == (0, PRIORITY_INTERACTIVE)
+    assert estimate_cost("") == (0, PRIORITY_INTERACTIVE)
+    assert estimate_cost("¿Qué tiempo hace en Madrid?")[1] == PRIORITY_INTERACTIVE
+    assert estimate_cost("Creá una tarea para mañana")[1] == PRIORITY_NORMAL
+    assert estimate_cost("Resumí los últimos 20 correos y mandaselos a Ana")[1] == PRIORITY_HEAVY
+    assert estimate_cost("", num_media=2)[1] == PRIORITY_HEAVY
+    assert classify_form({'Body': 'hola', 'NumMedia': '0'}) == PRIORITY_INTERACTIVE
+    print("✅ Estimación de costo")
+
+
+def test_priority_order():
+    """Sin envejecimiento apreciable, la cola atiende por clase de prioridad."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"), priority_aging=1000)
+        queue.enqueue({'Body': 'pesado'}, priority=PRIORITY_HEAVY)
+        queue.enqueue({'Body': 'normal'}, priority=PRIORITY_NORMAL)
+        queue.enqueue({'Body': 'hola'}, priority=PRIORITY_INTERACTIVE)
+        order = [queue.dequeue().payload['Body'] for _ in range(3)]
+        assert order == ['hola', 'normal', 'pesado'], order
+        queue.close()
+    print("✅ Orden por prioridad")
+
+
+def test_priority_aging():
+    """Un trabajo pesado que esperó lo suficiente pasa delante de uno interactivo nuevo."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"), priority_aging=0.05)
+        queue.enqueue({'Body': 'pesado'}, priority=PRIORITY_HEAVY)
+        time.sleep(0.2)
+        queue.enqueue({'Body': 'hola'}, priority=PRIORITY_INTERACTIVE)
+        assert queue.dequeue().payload['Body'] == 'pesado'
+        queue.close()
+    print("✅ Envejecimiento de prioridad")
+
+
+def test_coalesced_priority():
+    """Al combinar mensajes queda la prioridad más pesada."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue = JobQueue(os.path.join(directory, "jobs.sqlite3"))
+        queue.enqueue({'Body': 'hola'}, delay=10, coalesce_key='+54911', merge=_merge,
+                      priority=PRIORITY_INTERACTIVE)
+        queue.enqueue({'Body': 'resumí todo'}, delay=10, coalesce_key='+54911', merge=_merge, max_delay=0,
+                      priority=PRIORITY_HEAVY)
+        assert queue.coalesced == 1
+        assert queue.dequeue().priority == PRIORITY_HEAVY
+        queue.close()
+    print("✅ Prioridad al combinar")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de prioridad\n")
+    tests = [test_estimate_cost, test_priority_order, test_priority_aging, test_coalesced_priority]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Pruebas del planificador de cuotas (token buckets y backoff)."""
+import sys
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from bot.tools.ratelimit import (
+    RateLimiter, RateLimitExceeded, TokenBucket, backoff_delay, is_retryable_response, is_user_quota_error,
+)
+
+USER_QUOTA_BODY = b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'
+PROJECT_QUOTA_BODY = b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'
+
+
+def test_token_bucket_waits():
+    """Con la ráfaga agotada, cada reserva espera 1/rate más que la anterior."""
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket.reserve() == 0.0 and bucket.reserve() == 0.0
+    first, second = bucket.reserve(), bucket.reserve()
+    assert 0.05 < first <= 0.1 and 0.15 < second <= 0.2, (first, second)
+    assert bucket.metrics()['delayed'] == 2
+    print("✅ Token bucket")
+
+
+def test_user_quota_only_slows_that_user():
+    """Un userRateLimitExceeded frena solo a ese usuario; un 429 del proyecto frena a todos."""
+    limiter = RateLimiter()
+    limiter.throttled('drive', 'alice', 5.0, user_quota=is_user_quota_error(USER_QUOTA_BODY))
+    assert limiter._reserve('drive', 'bob') == 0.0
+    assert limiter._reserve('drive', 'alice') >= 4.0
+
+    limiter.throttled('drive', 'alice', 5.0, user_quota=is_user_quota_error(PROJECT_QUOTA_BODY))
+    assert limiter._reserve('drive', 'bob') >= 4.0
+    assert limiter.metrics()['drive']['throttled'] == 2
+    print("✅ Penalización por usuario o por proyecto")
+
+
+def test_max_wait_rejects():
+    """Si la espera superaría el máximo, la llamada se rechaza y se cuenta."""
+    limiter = RateLimiter()
+    limiter.throttled('tasks', None, 3600.0)
+    try:
+        limiter.acquire('tasks')
+        raise AssertionError("Se esperaba RateLimitExceeded")
+    except RateLimitExceeded:
+        pass
+    assert limiter.metrics()['tasks']['rejected'] == 1
+    print("✅ Rechazo por espera excesiva")
+
+
+def test_retry_classification():
+    """429/5xx y los 403 de cuota se reintentan; el resto de los 4xx no."""
+    assert is_retryable_response(429, b'') and is_retryable_response(503, None)
+    assert is_retryable_response(403, USER_QUOTA_BODY) and is_retryable_response(403, PROJECT_QUOTA_BODY)
+    assert not is_retryable_response(403, b'{"reason": "insufficientPermissions"}')
+    assert not is_retryable_response(404, b'')
+    assert is_user_quota_error(USER_QUOTA_BODY) and not is_user_quota_error(PROJECT_QUOTA_BODY)
+    assert not is_user_quota_error(None)
+    print("✅ Clasificación de respuestas")
+
+
+def test_backoff_delay():
+    """Retry-After manda; si no vino, backoff exponencial con jitter acotado."""
+    assert backoff_delay(0, "3") == 3.0
+    assert all(0 <= backoff_delay(attempt) <= 20 for attempt in range(10))
+    # Retry-After con fecha HTTP: se usa el backoff normal
+    assert backoff_delay(2, "Wed, 21 Oct 2015 07:28:00 GMT") <= 2.0
+    print("✅ Backoff")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas del planificador de cuotas\n")
+    tests = [
+        test_token_bucket_waits, test_user_quota_only_slows_that_user, test_max_wait_rejects,
+        test_retry_classification, test_backoff_delay,
+    ]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
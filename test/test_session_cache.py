@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Pruebas de la caché local de sesiones y del formato compacto de los mensajes."""
+import os
+import sys
+import tempfile
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+# La memoria global del módulo no debe tocar el archivo real de sesiones
+_TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("SESSION_BACKEND", "sqlite")
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(_TMP_DIR, "global.sqlite3"))
+os.environ.setdefault("SESSION_JSON_PATH", os.path.join(_TMP_DIR, "global.json"))
+
+from bot.memory import MessageRecord, SessionCache
+
+
+def test_message_record_roundtrip():
+    """El registro compacto conserva el formato público (timestamp ISO) al ida y vuelta."""
+    record = MessageRecord('user', 'hola', 1700000000)
+    data = record.to_dict()
+    assert data['role'] == 'user' and data['content'] == 'hola'
+    again = MessageRecord.from_dict(data)
+    assert again.ts == record.ts and again.content == 'hola'
+    assert MessageRecord.from_dict({'content': 'x', 'timestamp': 'no es fecha'}).ts == 0
+    print("✅ Mensajes compactos")
+
+
+def test_session_cache_eviction():
+    """La caché desaloja las sesiones menos usadas por cantidad y por tamaño."""
+    records = (MessageRecord('user', 'x' * 100, 0),)
+    cache = SessionCache(max_sessions=2, max_bytes=10 ** 6, idle_ttl=3600)
+    cache.put('a', records, 1)
+    cache.put('b', records, 1)
+    cache.get('a')
+    cache.put('c', records, 1)
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.evictions == 1
+
+    entry_size = cache.get('a').size
+    cache = SessionCache(max_sessions=100, max_bytes=2 * entry_size, idle_ttl=3600)
+    for session_id in ('a', 'b', 'c'):
+        cache.put(session_id, records, 1)
+    assert len(cache) == 2 and 'a' not in cache
+    assert cache.metrics()['bytes'] <= 2 * entry_size
+    cache.pop('b')
+    cache.pop('c')
+    assert cache.metrics()['bytes'] == 0
+    print("✅ Desalojo de la caché de sesiones")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de la caché de sesiones\n")
+    tests = [test_message_record_roundtrip, test_session_cache_eviction]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
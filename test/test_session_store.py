@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Pruebas del almacenamiento compartido de sesiones."""
+import os
+import sys
+import tempfile
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+# La memoria global del módulo no debe tocar el archivo real de sesiones
+_TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("SESSION_BACKEND", "sqlite")
+os.environ.setdefault("SESSION_DB_PATH", os.path.join(_TMP_DIR, "global.sqlite3"))
+os.environ.setdefault("SESSION_JSON_PATH", os.path.join(_TMP_DIR, "global.json"))
+
+from bot.memory import ConversationMemory, SessionCache
+from bot.session_store import SessionConflictError, SQLiteSessionStore
+
+
+def _message(content: str):
+    return {'role': 'user', 'content': content, 'timestamp': 0}
+
+
+def test_sqlite_cas():
+    """Dos procesos sobre el mismo archivo: solo gana quien escribe con la versión vigente."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.sqlite3")
+        first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+        assert first.save('s1', [_message('a')], 0) == 1
+        try:
+            second.save('s1', [_message('b')], 0)
+            raise AssertionError("Se esperaba SessionConflictError al crear una sesión existente")
+        except SessionConflictError:
+            pass
+        assert second.save('s1', [_message('a'), _message('b')], 1) == 2
+        try:
+            first.save('s1', [_message('c')], 1)
+            raise AssertionError("Se esperaba SessionConflictError con una versión vieja")
+        except SessionConflictError:
+            pass
+        messages, version = first.load('s1')
+        assert version == 2 and [m['content'] for m in messages] == ['a', 'b']
+        assert first.version('s1') == 2 and first.version('otra') is None
+        first.close()
+        second.close()
+    print("✅ Concurrencia optimista en SQLite")
+
+
+def test_memory_retries_conflicts():
+    """Con la copia local vieja, `add_message` choca, relee y reintenta sin perder mensajes."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.sqlite3")
+        first = ConversationMemory(store=SQLiteSessionStore(path), cache=SessionCache())
+        second = ConversationMemory(store=SQLiteSessionStore(path), cache=SessionCache())
+        first.add_message('s1', 'user', 'hola')
+        # `second` queda con la versión 1 en su caché (dentro de SESSION_CACHE_TTL)
+        assert len(second.get_conversation_history('s1')) == 1
+        first.add_message('s1', 'assistant', '¿en qué te ayudo?')
+        second.add_message('s1', 'user', 'el clima')
+        contents = [m['content'] for m in first.store.load('s1')[0]]
+        assert contents == ['hola', '¿en qué te ayudo?', 'el clima'], contents
+        first.store.close()
+        second.store.close()
+    print("✅ Reintento ante conflicto")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas de sesiones compartidas\n")
+    tests = [test_sqlite_cas, test_memory_retries_conflicts]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")
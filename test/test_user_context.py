@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Pruebas de la propagación del usuario de Google a los hilos de las herramientas."""
+import asyncio
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Agregar el directorio del bot al path
+sys.path.append('plan_and_execute_bot')
+
+from bot.tools import calendar, drive
+from bot.tools.context import current_user, user_context
+from bot.tools.pools import run_in_pool
+
+
+class _Request:
+    def __init__(self, response):
+        self._response = response
+
+    def execute(self):
+        return self._response
+
+
+class _CalendarList:
+    def list(self, **kwargs):
+        return _Request({'items': [{'id': f'cal{i}', 'summary': f'Calendario {i}'} for i in range(4)]})
+
+
+class _CalendarService:
+    def calendarList(self):
+        return _CalendarList()
+
+
+def test_run_in_pool_copies_user():
+    """Los pools por API ejecutan cada llamada con el usuario de quien la hizo."""
+    async def main():
+        with user_context("alice"):
+            return await run_in_pool('calendar', current_user.get)
+
+    assert asyncio.run(main()) == "alice"
+    print("✅ run_in_pool conserva el usuario")
+
+
+def test_search_all_calendars_uses_caller_account():
+    """Cada hilo de search_all_calendars consulta con las credenciales del usuario actual."""
+    seen = []
+
+    def fake_service():
+        seen.append(('service', current_user.get()))
+        return _CalendarService()
+
+    def fake_list(service, calendar_id, *args):
+        seen.append((calendar_id, current_user.get()))
+        return []
+
+    with mock.patch.object(calendar, 'get_calendar_service', fake_service), \
+            mock.patch.object(calendar, '_list_events_paginated', fake_list):
+        with user_context("alice"):
+            result = calendar.search_all_calendars.func(query="reunión")
+
+    assert "4 calendarios" in result, result
+    assert len(seen) == 1 + 2 * 4, seen
+    assert all(user == "alice" for _, user in seen), seen
+    print("✅ search_all_calendars usa la cuenta del usuario en todos los hilos")
+
+
+def test_upload_local_files_uses_caller_account():
+    """Cada hilo de upload_local_files sube con las credenciales del usuario actual."""
+    seen = []
+
+    def fake_upload(service, path, parent_folder_id=None):
+        seen.append(current_user.get())
+        return {'id': path, 'name': os.path.basename(path)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"archivo{i}.txt") for i in range(3)]
+        with mock.patch.object(drive, 'get_drive_service', lambda: seen.append(current_user.get())), \
+                mock.patch.object(drive, '_upload_path', fake_upload):
+            with user_context("alice"):
+                result = drive.upload_local_files.func(",".join(paths))
+
+    assert "Subidos 3/3" in result, result
+    assert seen == ["alice"] * 6, seen
+    print("✅ upload_local_files usa la cuenta del usuario en todos los hilos")
+
+
+if __name__ == "__main__":
+    print("🚀 Iniciando pruebas del usuario por petición\n")
+    tests = [
+        test_run_in_pool_copies_user, test_search_all_calendars_uses_caller_account,
+        test_upload_local_files_uses_caller_account,
+    ]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failures += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    if failures:
+        print(f"\n❌ {failures} pruebas fallaron")
+        sys.exit(1)
+    print("\n🎉 ¡Todas las pruebas completadas!")